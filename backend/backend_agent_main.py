@@ -1,12 +1,21 @@
+import difflib
+import hashlib
+import json
+import logging
 import os
 import shutil
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import Future
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict
 
 from deepagents import create_deep_agent
 from deepagents.backends import CompositeBackend
 from deepagents.backends.filesystem import FilesystemBackend
-from deepagents.backends.protocol import EditResult, WriteResult
+from deepagents.backends.protocol import EditResult, FileInfo, GrepMatch, WriteResult
 from deepagents.backends.sandbox import SandboxBackendProtocol
 from langchain.agents.middleware import (
     InterruptOnConfig,
@@ -15,29 +24,323 @@ from langchain.agents.middleware.types import AgentState
 from langchain.messages import ToolCall
 from langchain.tools import BaseTool
 from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import RunnableConfig
 from langgraph.checkpoint.memory import InMemorySaver
 from langgraph.pregel import Pregel
 from langgraph.runtime import Runtime
 
-from deepagents_cli.tools import fetch_url, http_request
+from deepagents_cli.tools import fetch_url, fetch_urls, http_request
 from deepagents_cli.agent_memory import AgentMemoryMiddleware
-from deepagents_cli.config import COLORS, config, console, get_default_coding_instructions, settings, create_model
+from deepagents_cli.context_window import ContextCompactionMiddleware
+from deepagents_cli.prompt_cache import PromptCachingMiddleware
+from deepagents_cli.config import COLORS, config, console, current_user_id, get_default_coding_instructions, settings, create_model
 # from deepagents_cli.integrations.sandbox_factory import get_default_working_dir
-from deepagents_cli.shell import ShellMiddleware
+from deepagents_cli.shell import ShellLimits, ShellMiddleware
+from deepagents_cli.shell_scheduler import ShellScheduler
 from deepagents_cli.skills import SkillsMiddleware
+from deepagents_cli.telemetry import TelemetryMiddleware
+from deepagents_cli.tool_concurrency import ToolConcurrencyMiddleware
+from deepagents_cli.tool_results import ToolResultSpilloverMiddleware
+from file_api.lazy_workspace import LazyWorkspace
+from file_api.user_utils import DEFAULT_USER_ID, validate_user_id
+
+
+logger = logging.getLogger(__name__)
+
+# files state に載せる内容: "full"（ファイル全文）または "ref"（パス・サイズ・ハッシュ・プレビューのみ）
+FILES_STATE_MODE = os.getenv("FILES_STATE_MODE", "full").lower()
+# ref モードで state に載せるプレビューの最大バイト数
+FILES_STATE_PREVIEW_BYTES = int(os.getenv("FILES_STATE_PREVIEW_BYTES", "2048"))
+# ref モードで edit の差分を state に載せる最大文字数
+FILES_STATE_DIFF_CHARS = int(os.getenv("FILES_STATE_DIFF_CHARS", "4000"))
+# システムプロンプトに載せるスキル数の上限（0 なら全スキルを掲載。超過分は search_skills ツールで検索）
+SKILLS_SHORTLIST_SIZE = int(os.getenv("SKILLS_SHORTLIST_SIZE", "0"))
+# プロンプトに載せる agent.md の最大文字数（超過分は先頭と末尾を残して省略。0 なら無制限）
+AGENT_MEMORY_MAX_CHARS = int(os.getenv("AGENT_MEMORY_MAX_CHARS", "40000"))
+# shell ツールをスレッドごとの常駐シェルで実行する（cd や export が次のコマンドに引き継がれる）
+SHELL_PERSISTENT_SESSION = os.getenv("SHELL_PERSISTENT_SESSION", "false").lower() == "true"
+# 出力が長すぎて省略された shell コマンドの全出力を ~/.deepagents/<user>/.shell_output/ に保存する
+# （同期対象の作業フォルダの外に置き、GCS への書き戻しやファイル一覧に出さない）
+SHELL_SPILL_OUTPUT = os.getenv("SHELL_SPILL_OUTPUT", "false").lower() == "true"
+# この文字数を超えるツール結果は ~/.deepagents/<user>/.tool_results/ に保存し、要約とパスだけを履歴に残す（0 なら無効）
+# （80000 を超える結果は deepagents 標準の /large_tool_results 退避が先に働くため、それ未満にする）
+TOOL_RESULT_MAX_CHARS = int(os.getenv("TOOL_RESULT_MAX_CHARS", "20000"))
+# コンテキストがこのトークン数を超えたら古いツール結果を要約に置き換える（0 なら無効）
+CONTEXT_COMPACT_TRIGGER_TOKENS = int(os.getenv("CONTEXT_COMPACT_TRIGGER_TOKENS", "100000"))
+# 置き換えはコンテキストがこのトークン数を下回るまで行う
+CONTEXT_COMPACT_TARGET_TOKENS = int(os.getenv("CONTEXT_COMPACT_TARGET_TOKENS", "60000"))
+# 直近何ターン分のツール結果をそのまま残すか
+CONTEXT_KEEP_RECENT_TURNS = int(os.getenv("CONTEXT_KEEP_RECENT_TURNS", "3"))
+# モデル呼び出し・ツール呼び出しごとの所要時間とトークン数をスレッド単位で記録する
+AGENT_TELEMETRY = os.getenv("AGENT_TELEMETRY", "true").lower() == "true"
+
+
+def _context_compaction() -> ContextCompactionMiddleware:
+    return ContextCompactionMiddleware(
+        trigger_tokens=CONTEXT_COMPACT_TRIGGER_TOKENS,
+        target_tokens=CONTEXT_COMPACT_TARGET_TOKENS,
+        keep_recent_turns=CONTEXT_KEEP_RECENT_TURNS,
+    )
+
+
+def _optional_int(name: str, scale: int = 1) -> int | None:
+    value = os.getenv(name)
+    return int(value) * scale if value else None
+
+
+# 1 ターン内の複数ツール呼び出しを並列実行する（false なら 1 件ずつ順番に実行）
+TOOL_PARALLEL = os.getenv("TOOL_PARALLEL", "true").lower() == "true"
+# 同時に実行する I/O 系ツール（ファイル読み込み・HTTP など）の上限
+TOOL_MAX_IO_CONCURRENCY = int(os.getenv("TOOL_MAX_IO_CONCURRENCY", "16"))
+# 同時に実行する CPU 系ツール（shell など）の上限（未設定なら CPU コア数）
+TOOL_MAX_CPU_CONCURRENCY = _optional_int("TOOL_MAX_CPU_CONCURRENCY")
+
+
+# shell コマンド 1 回ごとのリソース上限（未設定なら無制限）
+SHELL_LIMITS = ShellLimits(
+    cpu_seconds=_optional_int("SHELL_CPU_SECONDS"),
+    memory_bytes=_optional_int("SHELL_MEMORY_MB", 1024 * 1024),
+    max_processes=_optional_int("SHELL_MAX_PROCESSES"),
+    max_open_files=_optional_int("SHELL_MAX_OPEN_FILES"),
+    max_file_bytes=_optional_int("SHELL_MAX_FILE_MB", 1024 * 1024),
+    wall_seconds=float(os.getenv("SHELL_TIMEOUT_SECONDS", "120")),
+)
+# ユーザーごとの上限の上書き（JSON: {"user_id": {"cpu_seconds": 600, "memory_bytes": ...}}）
+SHELL_USER_LIMITS: dict[str, dict[str, Any]] = json.loads(os.getenv("SHELL_USER_LIMITS") or "{}")
+
+
+# 全ユーザー共通の shell 実行スケジューラ（同時実行数の上限とユーザー間のラウンドロビン）
+SHELL_SCHEDULER = ShellScheduler(
+    max_concurrency=int(os.getenv("SHELL_MAX_CONCURRENCY", "4")),
+    max_per_user=int(os.getenv("SHELL_MAX_CONCURRENCY_PER_USER", "2")),
+    max_job_concurrency=int(os.getenv("SHELL_MAX_JOB_CONCURRENCY", "4")),
+    max_running_jobs_per_user=int(os.getenv("SHELL_MAX_RUNNING_JOBS_PER_USER", "1")),
+    max_jobs_per_user=int(os.getenv("SHELL_MAX_JOBS_PER_USER", "8")),
+)
+# バックグラウンドジョブ用ツール（shell_job_start など）を有効にする
+SHELL_ENABLE_JOBS = os.getenv("SHELL_ENABLE_JOBS", "true").lower() == "true"
+# バックグラウンドジョブ 1 件の最大実行時間（秒）
+SHELL_JOB_TIMEOUT_SECONDS = float(os.getenv("SHELL_JOB_TIMEOUT_SECONDS", "3600"))
+# shell コマンドが実行枠の空きを待つ最大時間（秒）。超えたらエラーを返す
+SHELL_QUEUE_TIMEOUT_SECONDS = float(os.getenv("SHELL_QUEUE_TIMEOUT_SECONDS", "60"))
+# lazy ハイドレーション時、grep の前に取得する未取得ファイルの合計サイズの上限（超えた分は検索対象外）
+LAZY_GREP_HYDRATE_BYTES = int(os.getenv("LAZY_GREP_HYDRATE_BYTES", str(64 * 1024 * 1024)))
+
+
+def _shell_limits() -> ShellLimits:
+    """Return the shell resource limits of the current user."""
+    return SHELL_LIMITS.merged(SHELL_USER_LIMITS.get(current_user_id.get(), {}))
 
 
 class CustumFilesystemBackend(FilesystemBackend):
-    """files_updateを付与してLangGraph UIに内容を表示させるバックエンド。"""
+    """files_updateを付与してLangGraph UIに内容を表示させるバックエンド。
+
+    FILES_STATE_MODE=ref の場合はファイル全文ではなく参照（パス・サイズ・sha256・
+    先頭プレビュー・edit の差分）だけを state に載せ、全文は UI がファイル API から取得する。
+    """
+
+    def __init__(self, *args: Any, workdir: Path | None = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # グラフ構築時のユーザーの作業フォルダ（実行時のコンテキストに依存しないように固定）
+        self.workdir = workdir
+
+    def _workdir(self) -> Path:
+        return self.workdir if self.workdir is not None else _resolve_workdir()
 
     @staticmethod
     def _create_files_update(path: str, content: str) -> Dict[str, str]:
         return {path: content}
 
+    def _create_file_reference(self, file_path: str, diff: str | None = None) -> Dict[str, Any]:
+        """Build a compact files-state entry for a file on disk.
+
+        ``content`` holds only the first lines of the file so existing viewers
+        still render a preview; ``truncated`` tells the UI to fetch the rest from
+        the file API using ``workspace_path``.
+        """
+        resolved_path = self._resolve_path(file_path)
+        digest = hashlib.sha256()
+        size = 0
+        head = b""
+        with open(resolved_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                if len(head) < FILES_STATE_PREVIEW_BYTES:
+                    head += chunk[: FILES_STATE_PREVIEW_BYTES - len(head)]
+                digest.update(chunk)
+                size += len(chunk)
+
+        try:
+            workspace_path = resolved_path.resolve().relative_to(self._workdir()).as_posix()
+        except ValueError:
+            workspace_path = None
+
+        reference: Dict[str, Any] = {
+            "content": head.decode("utf-8", errors="ignore").splitlines(),
+            "path": file_path,
+            "workspace_path": workspace_path,
+            "size": size,
+            "sha256": digest.hexdigest(),
+            "truncated": size > len(head),
+            "modified_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if diff is not None:
+            reference["diff"] = diff
+        return reference
+
+    @staticmethod
+    def _create_edit_diff(file_path: str, old_string: str, new_string: str) -> str:
+        diff = "".join(
+            difflib.unified_diff(
+                old_string.splitlines(keepends=True),
+                new_string.splitlines(keepends=True),
+                fromfile=file_path,
+                tofile=file_path,
+            )
+        )
+        if len(diff) > FILES_STATE_DIFF_CHARS:
+            diff = diff[:FILES_STATE_DIFF_CHARS] + "\n... (diff truncated)"
+        return diff
+
+    def _lazy_workspace(self, path: Path) -> tuple[LazyWorkspace, str] | None:
+        """lazyハイドレーション時、ワークスペースとその中での相対パスを返す。"""
+        workdir = self._workdir()
+        try:
+            relative_path = path.resolve().relative_to(workdir.resolve()).as_posix()
+        except ValueError:
+            return None
+        lazy_workspace = LazyWorkspace.shared(workdir)
+        if lazy_workspace is None:
+            return None
+        return lazy_workspace, "" if relative_path == "." else relative_path
+
+    def _hydrate(self, file_path: str) -> None:
+        """lazyハイドレーション時、未取得のファイルをオブジェクトストレージから取得する。"""
+        resolved_path = self._resolve_path(file_path)
+        if resolved_path.exists():
+            return
+        lazy = self._lazy_workspace(resolved_path)
+        if lazy is not None:
+            lazy_workspace, relative_path = lazy
+            lazy_workspace.ensure_local(relative_path)
+
+    def ls_info(self, path: str) -> list[FileInfo]:
+        """ローカルのファイルに、lazyハイドレーション時は未取得のファイルも加えて一覧する。"""
+        results = super().ls_info(path)
+        dir_path = self._resolve_path(path)
+        lazy = self._lazy_workspace(dir_path)
+        if lazy is None:
+            return results
+        lazy_workspace, relative_dir = lazy
+
+        listed = {info["path"].rstrip("/") for info in results}
+        for item in lazy_workspace.list_dir(relative_dir):
+            child_path = str(dir_path / item["name"])
+            if child_path in listed:
+                continue
+            is_dir = item["type"] == "directory"
+            results.append(
+                {
+                    "path": f"{child_path}/" if is_dir else child_path,
+                    "is_dir": is_dir,
+                    "size": item["size"],
+                    "modified_at": datetime.fromtimestamp(item["modified"]).isoformat(),
+                }
+            )
+        results.sort(key=lambda x: x.get("path", ""))
+        return results
+
+    def glob_info(self, pattern: str, path: str = "/") -> list[FileInfo]:
+        """ローカルのファイルに、lazyハイドレーション時は未取得のファイルも加えて検索する。"""
+        results = super().glob_info(pattern, path)
+        search_path = self.cwd if path == "/" else self._resolve_path(path)
+        lazy = self._lazy_workspace(search_path)
+        if lazy is None:
+            return results
+        lazy_workspace, relative_dir = lazy
+
+        workdir = self._workdir()
+        listed = {info["path"] for info in results}
+        for name, meta in lazy_workspace.glob(pattern, relative_dir):
+            file_path = str(workdir / name)
+            if file_path in listed:
+                continue
+            results.append(
+                {
+                    "path": file_path,
+                    "is_dir": False,
+                    "size": meta["size"],
+                    "modified_at": datetime.fromtimestamp(meta["mtime"]).isoformat(),
+                }
+            )
+        results.sort(key=lambda x: x.get("path", ""))
+        return results
+
+    def grep_raw(
+        self,
+        pattern: str,
+        path: str | None = None,
+        glob: str | None = None,
+    ) -> list[GrepMatch] | str:
+        """lazyハイドレーション時、検索対象の未取得ファイルを先に取得してから検索する。
+
+        取得するのは合計 LAZY_GREP_HYDRATE_BYTES まで（新しいファイルから順）で、
+        それを超えた未取得ファイルは検索されない。
+        """
+        self._hydrate_for_grep(path or ".", glob)
+        return super().grep_raw(pattern, path, glob)
+
+    def _hydrate_for_grep(self, path: str, glob: str | None) -> None:
+        try:
+            search_path = self._resolve_path(path)
+        except ValueError:
+            return
+        if search_path.is_file():
+            return
+        lazy = self._lazy_workspace(search_path)
+        if lazy is None:
+            return
+        lazy_workspace, relative_path = lazy
+        if not lazy_workspace.is_dir(relative_path):
+            # 単一ファイルの検索
+            lazy_workspace.ensure_local(relative_path)
+            return
+
+        workdir = self._workdir()
+        missing = [
+            (name, meta)
+            for name, meta in lazy_workspace.glob(glob or "*", relative_path)
+            if meta["size"] <= self.max_file_size_bytes and not (workdir / name).exists()
+        ]
+        missing.sort(key=lambda item: item[1]["mtime"], reverse=True)
+        budget = LAZY_GREP_HYDRATE_BYTES
+        selected = []
+        for name, meta in missing:
+            if meta["size"] > budget:
+                continue
+            budget -= meta["size"]
+            selected.append(name)
+        if len(selected) < len(missing):
+            logger.warning(
+                "grep: %d remote files over the %d byte budget were not searched",
+                len(missing) - len(selected),
+                LAZY_GREP_HYDRATE_BYTES,
+            )
+        lazy_workspace.ensure_local_many(selected)
+
+    def read(self, file_path: str, offset: int = 0, limit: int = 2000) -> str:
+        self._hydrate(file_path)
+        return super().read(file_path=file_path, offset=offset, limit=limit)
+
     def write(self, file_path: str, content: str) -> WriteResult:
         result = super().write(file_path=file_path, content=content)
         if result.error:
             return result
+        if FILES_STATE_MODE == "ref":
+            try:
+                reference = self._create_file_reference(file_path)
+            except OSError as exc:
+                return WriteResult(error=f"Error reading written file '{file_path}': {exc}")
+            return WriteResult(path=result.path, files_update={file_path: reference})
         return WriteResult(path=result.path, files_update=self._create_files_update(file_path, content))
 
     def edit(
@@ -47,6 +350,7 @@ class CustumFilesystemBackend(FilesystemBackend):
         new_string: str,
         replace_all: bool = False,
     ) -> EditResult:
+        self._hydrate(file_path)
         result = super().edit(
             file_path=file_path,
             old_string=old_string,
@@ -56,6 +360,20 @@ class CustumFilesystemBackend(FilesystemBackend):
         if result.error:
             return result
 
+        if FILES_STATE_MODE == "ref":
+            # 全文を読み直さず、参照と置換箇所の差分だけを返す
+            try:
+                reference = self._create_file_reference(
+                    file_path, diff=self._create_edit_diff(file_path, old_string, new_string)
+                )
+            except OSError as exc:
+                return EditResult(error=f"Error reading updated file '{file_path}': {exc}")
+            return EditResult(
+                path=result.path,
+                files_update={file_path: reference},
+                occurrences=result.occurrences,
+            )
+
         resolved_path = self._resolve_path(file_path)
         try:
             with open(resolved_path, "r", encoding="utf-8") as f:
@@ -309,6 +627,21 @@ def _format_fetch_url_description(
     return f"URL: {url}\nTimeout: {timeout}s\n\n⚠️  Will fetch and convert web content to markdown"
 
 
+def _format_fetch_urls_description(
+    tool_call: ToolCall, _state: AgentState, _runtime: Runtime
+) -> str:
+    """Format fetch_urls tool call for approval prompt."""
+    args = tool_call["args"]
+    urls = args.get("urls") or []
+    timeout = args.get("timeout", 60)
+    url_lines = "\n".join(f"  - {url}" for url in urls) or "  (none)"
+
+    return (
+        f"URLs ({len(urls)}):\n{url_lines}\nTime budget: {timeout}s\n\n"
+        "⚠️  Will fetch and convert web content to markdown"
+    )
+
+
 def _format_task_description(tool_call: ToolCall, _state: AgentState, _runtime: Runtime) -> str:
     """Format task (subagent) tool call for approval prompt.
 
@@ -380,17 +713,24 @@ def _add_interrupt_on() -> dict[str, InterruptOnConfig]:
         "description": _format_fetch_url_description,
     }
 
+    fetch_urls_interrupt_config: InterruptOnConfig = {
+        "allowed_decisions": ["approve", "reject"],
+        "description": _format_fetch_urls_description,
+    }
+
     task_interrupt_config: InterruptOnConfig = {
         "allowed_decisions": ["approve", "reject"],
         "description": _format_task_description,
     }
     return {
         "shell": shell_interrupt_config,
+        "shell_job_start": shell_interrupt_config,
         "execute": execute_interrupt_config,
         "write_file": write_file_interrupt_config,
         "edit_file": edit_file_interrupt_config,
         "web_search": web_search_interrupt_config,
         "fetch_url": fetch_url_interrupt_config,
+        "fetch_urls": fetch_urls_interrupt_config,
         "task": task_interrupt_config,
     }
 
@@ -407,6 +747,7 @@ def create_cli_agent(
     enable_memory: bool = True,
     enable_skills: bool = True,
     enable_shell: bool = True,
+    on_close: list[Callable[[], None]] | None = None,
 ) -> tuple[Pregel, CompositeBackend]:
     """Create a CLI-configured agent with flexible options.
 
@@ -428,6 +769,9 @@ def create_cli_agent(
         enable_memory: Enable AgentMemoryMiddleware for persistent memory
         enable_skills: Enable SkillsMiddleware for custom agent skills
         enable_shell: Enable ShellMiddleware for local shell execution (only in local mode)
+        on_close: If given, callbacks releasing resources held by the agent (such as
+                  persistent shell sessions) are appended to it; call them when the
+                  agent is discarded.
 
     Returns:
         2-tuple of (agent_graph, composite_backend)
@@ -453,40 +797,74 @@ def create_cli_agent(
         project_skills_dir = settings.get_project_skills_dir()
 
     # Build middleware stack based on enabled features
-    agent_middleware = []
+    # Limit parallel tool calls per class. First of our middleware, so telemetry times only
+    # the execution (deepagents' FilesystemMiddleware and SubAgentMiddleware still wrap it)
+    agent_middleware = [
+        ToolConcurrencyMiddleware(
+            max_io=TOOL_MAX_IO_CONCURRENCY,
+            max_cpu=TOOL_MAX_CPU_CONCURRENCY,
+        )
+    ]
 
     # CONDITIONAL SETUP: Local vs Remote Sandbox
     if sandbox is None:
         # ========== LOCAL MODE ==========
         composite_backend = CompositeBackend(
-            default=CustumFilesystemBackend(),
+            default=CustumFilesystemBackend(workdir=_resolve_workdir()),
             # default=FilesystemBackend(),  # Current working directory
             routes={},  # No virtualization - use real paths
         )
 
-        # Add memory middleware
-        if enable_memory:
-            agent_middleware.append(
-                AgentMemoryMiddleware(settings=settings, assistant_id=assistant_id)
-            )
-
-        # Add skills middleware
+        # Add skills middleware (before memory: system prompt blocks go stable -> volatile)
         if enable_skills:
             agent_middleware.append(
                 SkillsMiddleware(
                     skills_dir=skills_dir,
                     assistant_id=assistant_id,
                     project_skills_dir=project_skills_dir,
+                    shortlist_size=SKILLS_SHORTLIST_SIZE or None,
                 )
             )
 
+        # Add memory middleware
+        if enable_memory:
+            agent_middleware.append(
+                AgentMemoryMiddleware(
+                    settings=settings,
+                    assistant_id=assistant_id,
+                    max_memory_chars=AGENT_MEMORY_MAX_CHARS or None,
+                )
+            )
+
+        # Replace stale tool results with stubs once the context grows too large
+        agent_middleware.append(_context_compaction())
+
         # Add shell middleware (only in local mode)
         if enable_shell:
+            shell_middleware = ShellMiddleware(
+                # workspace_root=str(Path.cwd()),
+                workspace_root=str(_resolve_workdir()),
+                env=os.environ,
+                persistent_session=SHELL_PERSISTENT_SESSION,
+                spill_dir=settings.user_deepagents_dir / ".shell_output" if SHELL_SPILL_OUTPUT else None,
+                limits=_shell_limits(),
+                scheduler=SHELL_SCHEDULER,
+                user_id=current_user_id.get(),
+                enable_jobs=SHELL_ENABLE_JOBS,
+                job_timeout=SHELL_JOB_TIMEOUT_SECONDS,
+                queue_timeout=SHELL_QUEUE_TIMEOUT_SECONDS,
+            )
+            agent_middleware.append(shell_middleware)
+            if on_close is not None:
+                on_close.append(shell_middleware.close)
+
+        # Move oversized tool results out of the message history into files
+        # (outside the synced workspace, so they are not written back or listed)
+        if TOOL_RESULT_MAX_CHARS > 0:
             agent_middleware.append(
-                ShellMiddleware(
-                    # workspace_root=str(Path.cwd()),
-                    workspace_root=str(_resolve_workdir()),
-                    env=os.environ,
+                ToolResultSpilloverMiddleware(
+                    spill_dir=settings.user_deepagents_dir / ".tool_results",
+                    max_chars=TOOL_RESULT_MAX_CHARS,
                 )
             )
     else:
@@ -496,25 +874,40 @@ def create_cli_agent(
             routes={},  # No virtualization
         )
 
-        # Add memory middleware
-        if enable_memory:
-            agent_middleware.append(
-                AgentMemoryMiddleware(settings=settings, assistant_id=assistant_id)
-            )
-
-        # Add skills middleware
+        # Add skills middleware (before memory: system prompt blocks go stable -> volatile)
         if enable_skills:
             agent_middleware.append(
                 SkillsMiddleware(
                     skills_dir=skills_dir,
                     assistant_id=assistant_id,
                     project_skills_dir=project_skills_dir,
+                    shortlist_size=SKILLS_SHORTLIST_SIZE or None,
+                )
+            )
+
+        # Add memory middleware
+        if enable_memory:
+            agent_middleware.append(
+                AgentMemoryMiddleware(
+                    settings=settings,
+                    assistant_id=assistant_id,
+                    max_memory_chars=AGENT_MEMORY_MAX_CHARS or None,
                 )
             )
 
+        # Replace stale tool results with stubs once the context grows too large
+        agent_middleware.append(_context_compaction())
+
         # Note: Shell middleware not used in sandbox mode
         # File operations and execute tool are provided by the sandbox backend
 
+    # Record model/tool latency and token usage per step (innermost, to time only the calls)
+    if AGENT_TELEMETRY:
+        agent_middleware.append(TelemetryMiddleware())
+
+    # Mark provider cache breakpoints on the assembled system prompt (must be last)
+    agent_middleware.append(PromptCachingMiddleware())
+
     # Get or use custom system prompt
     if system_prompt is None:
         system_prompt = get_system_prompt(assistant_id=assistant_id, sandbox_type=sandbox_type)
@@ -536,7 +929,7 @@ def create_cli_agent(
         middleware=agent_middleware,
         interrupt_on=interrupt_on,
         # checkpointer=InMemorySaver(),
-    ).with_config(config)
+    ).with_config(config if TOOL_PARALLEL else {**config, "max_concurrency": 1})
     return agent, composite_backend
 
 
@@ -546,21 +939,100 @@ def create_cli_agent(
 from dotenv import load_dotenv
 load_dotenv()
 
-# モデルインスタンスの作成
+# モデルインスタンスの作成（全ユーザーで共有）
 model = create_model()
 
 # tool の設定
-tools = [http_request, fetch_url]
-
-# agentインスタンスの作成
-agent, _ = create_cli_agent(
-    model=model,
-    tools=tools,
-    assistant_id="agent",
-    auto_approve=True,
-    enable_memory=True,
-    enable_skills=True,
-    enable_shell=True,
-)
+tools = [http_request, fetch_url, fetch_urls]
+
+# ユーザーごとのグラフキャッシュの最大数（超えたら最も古く使われたものを破棄）
+AGENT_GRAPH_CACHE_SIZE = int(os.getenv("AGENT_GRAPH_CACHE_SIZE", "32"))
+
+# キー -> (グラフ, 破棄時に呼ぶ後始末（シェルセッションの終了など）)
+_agent_cache: OrderedDict[tuple[str, str], tuple[Pregel, list[Callable[[], None]]]] = OrderedDict()
+_agent_cache_lock = threading.Lock()
+# 構築中のグラフ（同じキーの同時リクエストは1回の構築を待つ）
+_agent_builds: dict[tuple[str, str], Future] = {}
+
+
+def get_agent(user_id: str, assistant_id: str = "agent") -> Pregel:
+    """Return the compiled agent graph for a user, building it on first use.
+
+    Graphs are cached per (user_id, assistant_id) with LRU eviction, so
+    middleware, backends and prompts are built once per user rather than per run.
+    The graph is built outside the cache lock, so a cold build for one user does
+    not block other users; concurrent requests for the same key share one build.
 
-# print(agent)
\ No newline at end of file
+    Args:
+        user_id: User ID whose workspace and ~/.deepagents directory the graph uses
+        assistant_id: Agent identifier
+
+    Returns:
+        Compiled agent graph bound to the user's directories
+    """
+    key = (user_id, assistant_id)
+    with _agent_cache_lock:
+        cached = _agent_cache.get(key)
+        if cached is not None:
+            _agent_cache.move_to_end(key)
+            return cached[0]
+        # 同じキーの構築中ジョブがあればそれを待つ（ロックは構築中に保持しない）
+        build = _agent_builds.get(key)
+        owner = build is None
+        if owner:
+            build = _agent_builds[key] = Future()
+    if not owner:
+        return build.result()
+
+    # 構築中はユーザーのコンテキストでパスを解決する
+    token = current_user_id.set(user_id)
+    on_close: list[Callable[[], None]] = []
+    try:
+        graph, _ = create_cli_agent(
+            model=model,
+            tools=tools,
+            assistant_id=assistant_id,
+            auto_approve=True,
+            enable_memory=True,
+            enable_skills=True,
+            enable_shell=True,
+            on_close=on_close,
+        )
+    except BaseException as e:
+        with _agent_cache_lock:
+            del _agent_builds[key]
+        build.set_exception(e)
+        raise
+    finally:
+        current_user_id.reset(token)
+
+    evicted = []
+    with _agent_cache_lock:
+        _agent_cache[key] = (graph, on_close)
+        while len(_agent_cache) > AGENT_GRAPH_CACHE_SIZE:
+            evicted.append(_agent_cache.popitem(last=False)[1])
+        del _agent_builds[key]
+    build.set_result(graph)
+    # 破棄したグラフのシェルセッションを終了（残すとユーザーごとに bash プロセスがリークする）
+    for _, callbacks in evicted:
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Failed to release an evicted agent graph: {e}")
+    return graph
+
+
+def make_agent(config: RunnableConfig) -> Pregel:
+    """Graph factory referenced from langgraph.json.
+
+    The user ID comes from the ``x-user-id`` header, which the file API proxy
+    sets and langgraph.json exposes through ``configurable_headers``.
+    """
+    configurable = config.get("configurable", {})
+    user_id = configurable.get("x-user-id") or configurable.get("user_id")
+    if not user_id or not validate_user_id(user_id):
+        user_id = DEFAULT_USER_ID
+    # 実行中に参照される処理のためにコンテキストにも設定
+    current_user_id.set(user_id)
+    return get_agent(user_id)
@@ -0,0 +1,131 @@
+"""Benchmark: repeated requests to one host, unpooled vs the shared client.
+
+Starts a local keep-alive HTTP server (or uses --url) and times N GET requests:
+
+- ``requests.get`` without a session (a new connection per call)
+- ``http_client.request_sync`` one after another (pooled, keep-alive)
+- ``http_client.request`` gathered concurrently (pooled, per-host limit)
+
+On loopback, connection setup is nearly free, so the local server delays every
+new connection by --connect-latency ms to stand in for the DNS, TCP and TLS
+round trips to a remote host (0 disables it). Use --url to measure a real host.
+
+The protocol each pooled variant negotiated is printed after its timing. The
+local server speaks HTTP/1.1 only; HTTP/2 is negotiated (via TLS ALPN) with an
+https --url that supports it.
+
+Usage (from backend/):
+    uv run python -m benchmarks.http_client --requests 200 --connect-latency 30
+    uv run python -m benchmarks.http_client --url https://example.com/ --requests 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from deepagents_cli import http_client
+
+_BODY = b"<html><body>" + b"<p>hello</p>" * 200 + b"</body></html>"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True
+    connect_latency = 0.0
+
+    def setup(self) -> None:
+        # Runs once per connection: simulated handshake cost
+        time.sleep(self.connect_latency)
+        super().setup()
+
+    def do_GET(self) -> None:  # noqa: N802
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(_BODY)))
+        self.end_headers()
+        self.wfile.write(_BODY)
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+def _timed(label: str, n: int, run: Callable[[], list[float]]) -> None:
+    started = time.perf_counter()
+    latencies = run()
+    total = time.perf_counter() - started
+    print(
+        f"{label:<34} total {total * 1000:8.1f} ms   "
+        f"p50 {statistics.median(latencies) * 1000:6.2f} ms   {n / total:8.1f} req/s"
+    )
+
+
+def _one(call: Callable[[], object]) -> float:
+    started = time.perf_counter()
+    call()
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="requests per variant")
+    parser.add_argument("--url", help="benchmark a remote URL instead of the local server")
+    parser.add_argument(
+        "--connect-latency", type=float, default=30.0, help="simulated setup cost per connection (ms)"
+    )
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        _Handler.connect_latency = args.connect_latency / 1000
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/"
+
+    n = args.requests
+    print(f"{n} GET requests to {url}")
+    versions: Counter[str] = Counter()
+
+    def pooled(response: http_client.HttpResponse) -> None:
+        versions[response.http_version] += 1
+
+    _timed(
+        "requests.get (no session)",
+        n,
+        lambda: [_one(lambda: requests.get(url, timeout=30).content) for _ in range(n)],
+    )
+    _timed(
+        "http_client.request_sync",
+        n,
+        lambda: [_one(lambda: pooled(http_client.request_sync("GET", url))) for _ in range(n)],
+    )
+
+    async def gathered() -> list[float]:
+        async def timed_request() -> float:
+            started = time.perf_counter()
+            pooled(await http_client.request("GET", url))
+            return time.perf_counter() - started
+
+        try:
+            return await asyncio.gather(*(timed_request() for _ in range(n)))
+        finally:
+            await http_client.aclose()
+
+    _timed("http_client.request (concurrent)", n, lambda: asyncio.run(gathered()))
+    print("pooled protocols: " + ", ".join(f"{v} x{c}" for v, c in versions.most_common()))
+
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
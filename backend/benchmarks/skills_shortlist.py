@@ -0,0 +1,123 @@
+"""Benchmark: prompt size and recall of BM25 skill shortlisting.
+
+Builds a synthetic skills library (optionally plus a real skills directory),
+then for each skill asks a query made of a few words from its description and
+compares:
+
+- tokens of the full skills section (every skill listed) vs the shortlisted one
+- recall@k: how often the target skill is in the shortlist
+- index build and query latency
+
+Usage (from backend/):
+    uv run python -m benchmarks.skills_shortlist --skills 200 --k 8
+    uv run python -m benchmarks.skills_shortlist --skills-dir ../agent_config/.deepagents/agent/skills
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from deepagents_cli.skills.load import list_skills
+from deepagents_cli.skills.middleware import SkillsMiddleware
+from deepagents_cli.skills.search import SkillIndex
+
+DOMAINS = [
+    "pdf", "excel", "slides", "docker", "kubernetes", "terraform", "bigquery", "postgres",
+    "react", "nextjs", "fastapi", "django", "pandas", "numpy", "matplotlib", "pytorch",
+    "scraping", "research", "translation", "summarization", "invoice", "contract", "email",
+    "calendar", "image", "audio", "video", "security", "testing", "profiling", "logging",
+    "monitoring", "billing", "survey", "interview", "ethnography", "brainstorming", "roadmap",
+]
+ACTIONS = [
+    "create", "review", "analyze", "convert", "deploy", "debug", "optimize", "migrate",
+    "document", "visualize", "validate", "generate", "extract", "compare", "audit",
+]
+OBJECTS = [
+    "reports", "pipelines", "dashboards", "schemas", "templates", "notebooks", "configs",
+    "datasets", "workflows", "checklists", "diagrams", "queries", "tests", "releases",
+]
+
+
+def _estimate_tokens(text: str) -> int:
+    try:
+        import tiktoken
+
+        return len(tiktoken.get_encoding("cl100k_base").encode(text))
+    except ImportError:
+        # Rough heuristic (~4 characters per token for English text)
+        return len(text) // 4
+
+
+def _write_synthetic_skills(root: Path, count: int, rng: random.Random) -> None:
+    for i in range(count):
+        domain = DOMAINS[i % len(DOMAINS)]
+        action, obj = rng.choice(ACTIONS), rng.choice(OBJECTS)
+        name = f"{domain}-{action}-{obj}-{i}"
+        description = (
+            f"{action.capitalize()} {domain} {obj} with repeatable steps, "
+            f"{rng.choice(ACTIONS)} results and {rng.choice(OBJECTS)}"
+        )
+        skill_dir = root / name
+        skill_dir.mkdir(parents=True)
+        (skill_dir / "SKILL.md").write_text(
+            f"---\nname: {name}\ndescription: {description}\n---\n\n"
+            f"# {domain.capitalize()} {obj}\n\n## When to use\n\n## {action.capitalize()} workflow\n",
+            encoding="utf-8",
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--skills", type=int, default=200, help="number of synthetic skills")
+    parser.add_argument("--skills-dir", type=Path, help="additional real skills directory")
+    parser.add_argument("--k", type=int, default=8, help="shortlist size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        synthetic_dir = Path(tmp) / "skills"
+        synthetic_dir.mkdir()
+        _write_synthetic_skills(synthetic_dir, args.skills, rng)
+        skills = list_skills(user_skills_dir=synthetic_dir, project_skills_dir=args.skills_dir)
+
+        middleware = SkillsMiddleware(
+            skills_dir=synthetic_dir, assistant_id="agent", shortlist_size=args.k
+        )
+
+        started = time.perf_counter()
+        index = SkillIndex(skills)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        full_tokens = _estimate_tokens(middleware._skills_section(skills))
+        shortlist_tokens: list[int] = []
+        query_ms: list[float] = []
+        hits = 0
+        for skill in skills:
+            words = skill["description"].split()
+            query = " ".join(rng.sample(words, k=min(3, len(words))))
+            started = time.perf_counter()
+            listed = index.search(query, limit=args.k)
+            query_ms.append((time.perf_counter() - started) * 1000)
+            hits += skill in listed
+            section = middleware._skills_section(listed, hidden=len(skills) - len(listed))
+            shortlist_tokens.append(_estimate_tokens(section))
+
+    mean_shortlist = statistics.mean(shortlist_tokens)
+    print(f"skills:                 {len(skills)}")
+    print(f"shortlist size (k):     {args.k}")
+    print(f"full section tokens:    {full_tokens}")
+    print(f"shortlist tokens (avg): {mean_shortlist:.0f}")
+    print(f"prompt token reduction: {1 - mean_shortlist / full_tokens:.1%}")
+    print(f"recall@{args.k}:              {hits / len(skills):.1%}")
+    print(f"index build:            {build_ms:.1f} ms")
+    print(f"query p50 / max:        {statistics.median(query_ms):.2f} / {max(query_ms):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
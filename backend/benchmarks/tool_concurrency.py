@@ -0,0 +1,149 @@
+"""Benchmark: one model turn with many tool calls, sequential vs concurrent.
+
+A scripted model answers with a single message holding many tool calls:
+
+- --reads ``read_file``-like calls (I/O-bound, sleep --latency ms)
+- --cpu ``shell``-like calls (CPU-bound, spin --latency ms)
+- --writes ``write_file`` calls, alternating between two paths (sleep --latency ms)
+
+The turn is run through a LangChain agent graph three ways:
+
+- sequential (``max_concurrency=1``: one tool call after another)
+- concurrent without limits
+- concurrent with ``ToolConcurrencyMiddleware`` (I/O, CPU and per-path classes)
+
+For each variant the wall time, the largest number of simultaneous writers to
+one path and whether the tool results came back in tool-call order are shown.
+
+Usage (from backend/):
+    uv run python -m benchmarks.tool_concurrency --reads 8 --cpu 4 --writes 4 --latency 100
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import threading
+import time
+from collections import Counter
+from typing import Any
+
+from langchain.agents import create_agent
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import tool
+
+from deepagents_cli.tool_concurrency import ToolConcurrencyMiddleware
+
+_latency = 0.1
+_writers: Counter[str] = Counter()
+_max_writers: Counter[str] = Counter()
+_writers_lock = threading.Lock()
+
+
+@tool
+def read_file(file_path: str) -> str:
+    """Read a file (stub: waits for the configured latency)."""
+    time.sleep(_latency)
+    return f"contents of {file_path}"
+
+
+@tool
+def shell(command: str) -> str:
+    """Run a command (stub: spins the CPU for the configured latency)."""
+    deadline = time.perf_counter() + _latency
+    while time.perf_counter() < deadline:
+        pass
+    return f"ran {command}"
+
+
+@tool
+def write_file(file_path: str, content: str) -> str:
+    """Write a file (stub: counts concurrent writers per path)."""
+    with _writers_lock:
+        _writers[file_path] += 1
+        _max_writers[file_path] = max(_max_writers[file_path], _writers[file_path])
+    try:
+        time.sleep(_latency)
+    finally:
+        with _writers_lock:
+            _writers[file_path] -= 1
+    return f"wrote {len(content)} characters to {file_path}"
+
+
+class _ScriptedModel(GenericFakeChatModel):
+    def bind_tools(self, tools: Any, **kwargs: Any) -> _ScriptedModel:
+        return self
+
+
+def _tool_calls(reads: int, cpu: int, writes: int) -> list[dict[str, Any]]:
+    calls = [("read_file", {"file_path": f"/src/module_{i}.py"}) for i in range(reads)]
+    calls += [("shell", {"command": f"job {i}"}) for i in range(cpu)]
+    calls += [
+        ("write_file", {"file_path": f"/out/result_{i % 2}.txt", "content": "x" * 100})
+        for i in range(writes)
+    ]
+    return [{"name": name, "args": args, "id": f"call_{i}"} for i, (name, args) in enumerate(calls)]
+
+
+def _run(
+    label: str,
+    calls: list[dict[str, Any]],
+    middleware: list[Any],
+    config: dict[str, Any],
+    use_async: bool,
+) -> None:
+    model = _ScriptedModel(
+        messages=iter([AIMessage(content="", tool_calls=calls), AIMessage(content="done")])
+    )
+    agent = create_agent(model, tools=[read_file, shell, write_file], middleware=middleware)
+    _max_writers.clear()
+    inputs = {"messages": [{"role": "user", "content": "go"}]}
+
+    started = time.perf_counter()
+    if use_async:
+        result = asyncio.run(agent.ainvoke(inputs, config))
+    else:
+        result = agent.invoke(inputs, config)
+    elapsed = time.perf_counter() - started
+
+    result_ids = [m.tool_call_id for m in result["messages"] if isinstance(m, ToolMessage)]
+    in_order = result_ids == [call["id"] for call in calls]
+    print(
+        f"{label:<46} {elapsed * 1000:8.1f} ms   "
+        f"max writers/path {max(_max_writers.values(), default=0)}   "
+        f"ordered {'yes' if in_order else 'NO'}"
+    )
+
+
+def main() -> None:
+    global _latency
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reads", type=int, default=8, help="I/O-bound tool calls")
+    parser.add_argument("--cpu", type=int, default=4, help="CPU-bound tool calls")
+    parser.add_argument("--writes", type=int, default=4, help="write_file calls (two paths)")
+    parser.add_argument("--latency", type=float, default=100.0, help="per-call latency (ms)")
+    parser.add_argument("--max-cpu", type=int, default=2, help="CPU-bound calls at once")
+    args = parser.parse_args()
+    _latency = args.latency / 1000
+
+    calls = _tool_calls(args.reads, args.cpu, args.writes)
+    print(
+        f"{len(calls)} tool calls in one turn ({args.reads} read, {args.cpu} cpu, "
+        f"{args.writes} write), {args.latency:.0f} ms each"
+    )
+    for use_async in (False, True):
+        mode = "async" if use_async else "sync"
+        _run(f"sequential ({mode})", calls, [], {"max_concurrency": 1}, use_async)
+        _run(f"concurrent, no limits ({mode})", calls, [], {}, use_async)
+        _run(
+            f"concurrent, ToolConcurrencyMiddleware ({mode})",
+            calls,
+            [ToolConcurrencyMiddleware(max_cpu=args.max_cpu)],
+            {},
+            use_async,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -22,9 +22,14 @@ from langgraph.runtime import Runtime
 
 from deepagents_cli.agent_memory import AgentMemoryMiddleware
 from deepagents_cli.config import COLORS, config, console, get_default_coding_instructions, settings
+from deepagents_cli.context_window import ContextCompactionMiddleware
 # from deepagents_cli.integrations.sandbox_factory import get_default_working_dir
+from deepagents_cli.prompt_cache import PromptCachingMiddleware
 from deepagents_cli.shell import ShellMiddleware
 from deepagents_cli.skills import SkillsMiddleware
+from deepagents_cli.telemetry import TelemetryMiddleware
+from deepagents_cli.tool_concurrency import ToolConcurrencyMiddleware
+from deepagents_cli.tool_results import ToolResultSpilloverMiddleware
 
 def list_agents() -> None:
     """List all available agents."""
@@ -238,6 +243,21 @@ def _format_fetch_url_description(
     return f"URL: {url}\nTimeout: {timeout}s\n\n⚠️  Will fetch and convert web content to markdown"
 
 
+def _format_fetch_urls_description(
+    tool_call: ToolCall, _state: AgentState, _runtime: Runtime
+) -> str:
+    """Format fetch_urls tool call for approval prompt."""
+    args = tool_call["args"]
+    urls = args.get("urls") or []
+    timeout = args.get("timeout", 60)
+    url_lines = "\n".join(f"  - {url}" for url in urls) or "  (none)"
+
+    return (
+        f"URLs ({len(urls)}):\n{url_lines}\nTime budget: {timeout}s\n\n"
+        "⚠️  Will fetch and convert web content to markdown"
+    )
+
+
 def _format_task_description(tool_call: ToolCall, _state: AgentState, _runtime: Runtime) -> str:
     """Format task (subagent) tool call for approval prompt.
 
@@ -309,6 +329,11 @@ def _add_interrupt_on() -> dict[str, InterruptOnConfig]:
         "description": _format_fetch_url_description,
     }
 
+    fetch_urls_interrupt_config: InterruptOnConfig = {
+        "allowed_decisions": ["approve", "reject"],
+        "description": _format_fetch_urls_description,
+    }
+
     task_interrupt_config: InterruptOnConfig = {
         "allowed_decisions": ["approve", "reject"],
         "description": _format_task_description,
@@ -320,6 +345,7 @@ def _add_interrupt_on() -> dict[str, InterruptOnConfig]:
         "edit_file": edit_file_interrupt_config,
         "web_search": web_search_interrupt_config,
         "fetch_url": fetch_url_interrupt_config,
+        "fetch_urls": fetch_urls_interrupt_config,
         "task": task_interrupt_config,
     }
 
@@ -382,7 +408,9 @@ def create_cli_agent(
         project_skills_dir = settings.get_project_skills_dir()
 
     # Build middleware stack based on enabled features
-    agent_middleware = []
+    # Limit parallel tool calls per class. First of our middleware, so telemetry times only
+    # the execution (deepagents' FilesystemMiddleware and SubAgentMiddleware still wrap it)
+    agent_middleware = [ToolConcurrencyMiddleware()]
 
     # CONDITIONAL SETUP: Local vs Remote Sandbox
     if sandbox is None:
@@ -392,13 +420,7 @@ def create_cli_agent(
             routes={},  # No virtualization - use real paths
         )
 
-        # Add memory middleware
-        if enable_memory:
-            agent_middleware.append(
-                AgentMemoryMiddleware(settings=settings, assistant_id=assistant_id)
-            )
-
-        # Add skills middleware
+        # Add skills middleware (before memory: system prompt blocks go stable -> volatile)
         if enable_skills:
             agent_middleware.append(
                 SkillsMiddleware(
@@ -408,6 +430,15 @@ def create_cli_agent(
                 )
             )
 
+        # Add memory middleware
+        if enable_memory:
+            agent_middleware.append(
+                AgentMemoryMiddleware(settings=settings, assistant_id=assistant_id)
+            )
+
+        # Replace stale tool results with stubs once the context grows too large
+        agent_middleware.append(ContextCompactionMiddleware())
+
         # Add shell middleware (only in local mode)
         if enable_shell:
             agent_middleware.append(
@@ -416,6 +447,13 @@ def create_cli_agent(
                     env=os.environ,
                 )
             )
+
+        # Move oversized tool results out of the message history into files
+        agent_middleware.append(
+            ToolResultSpilloverMiddleware(
+                spill_dir=settings.ensure_agent_dir(assistant_id) / "tool_results"
+            )
+        )
     else:
         # ========== REMOTE SANDBOX MODE ==========
         composite_backend = CompositeBackend(
@@ -423,13 +461,7 @@ def create_cli_agent(
             routes={},  # No virtualization
         )
 
-        # Add memory middleware
-        if enable_memory:
-            agent_middleware.append(
-                AgentMemoryMiddleware(settings=settings, assistant_id=assistant_id)
-            )
-
-        # Add skills middleware
+        # Add skills middleware (before memory: system prompt blocks go stable -> volatile)
         if enable_skills:
             agent_middleware.append(
                 SkillsMiddleware(
@@ -439,9 +471,24 @@ def create_cli_agent(
                 )
             )
 
+        # Add memory middleware
+        if enable_memory:
+            agent_middleware.append(
+                AgentMemoryMiddleware(settings=settings, assistant_id=assistant_id)
+            )
+
+        # Replace stale tool results with stubs once the context grows too large
+        agent_middleware.append(ContextCompactionMiddleware())
+
         # Note: Shell middleware not used in sandbox mode
         # File operations and execute tool are provided by the sandbox backend
 
+    # Record model/tool latency and token usage per step (innermost, to time only the calls)
+    agent_middleware.append(TelemetryMiddleware())
+
+    # Mark provider cache breakpoints on the assembled system prompt (must be last)
+    agent_middleware.append(PromptCachingMiddleware())
+
     # Get or use custom system prompt
     if system_prompt is None:
         system_prompt = get_system_prompt(assistant_id=assistant_id, sandbox_type=sandbox_type)
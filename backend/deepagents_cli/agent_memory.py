@@ -1,8 +1,11 @@
 """Middleware for loading agent-specific long-term memory into the system prompt."""
 
-import contextlib
+import threading
 from collections.abc import Awaitable, Callable
-from typing import NotRequired, TypedDict, cast
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import NotRequired, TypedDict
 
 from langchain.agents.middleware.types import (
     AgentMiddleware,
@@ -13,26 +16,118 @@ from langchain.agents.middleware.types import (
 from langgraph.runtime import Runtime
 
 from deepagents_cli.config import Settings
+from deepagents_cli.prompt_cache import append_system_blocks
 
 
 class AgentMemoryState(AgentState):
-    """State for the agent memory middleware."""
+    """State for the agent memory middleware.
 
-    user_memory: NotRequired[str]
-    """Personal preferences from ~/.deepagents/{agent}/ (applies everywhere)."""
+    Only version ids are stored; the memory text lives in a process-wide cache
+    so it is not duplicated into every thread's checkpoint.
+    """
+
+    user_memory_version: NotRequired[str]
+    """Version of ~/.deepagents/{agent}/agent.md seen at the start of the run ("" if missing)."""
 
-    project_memory: NotRequired[str]
-    """Project-specific context (loaded from project root)."""
+    project_memory_version: NotRequired[str]
+    """Version of the project agent.md seen at the start of the run ("" if missing)."""
 
 
 class AgentMemoryStateUpdate(TypedDict):
     """A state update for the agent memory middleware."""
 
-    user_memory: NotRequired[str]
-    """Personal preferences from ~/.deepagents/{agent}/ (applies everywhere)."""
+    user_memory_version: NotRequired[str]
+    """Version of ~/.deepagents/{agent}/agent.md seen at the start of the run ("" if missing)."""
+
+    project_memory_version: NotRequired[str]
+    """Version of the project agent.md seen at the start of the run ("" if missing)."""
+
+
+# Default maximum number of characters of each agent.md injected into the prompt
+DEFAULT_MAX_MEMORY_CHARS = 40_000
+
+# Share of the character budget kept from the start of an oversized file (rest from the end)
+_TRUNCATE_HEAD_RATIO = 0.8
+
+# Maximum number of memory files kept in the process-wide cache
+_MAX_CACHED_MEMORY_FILES = 1024
+
+
+@dataclass(frozen=True)
+class MemoryFile:
+    """A loaded (and possibly truncated) agent.md file."""
+
+    path: str
+    text: str
+    """Text injected into the prompt."""
+    version: str
+    """Changes whenever the file's mtime or size changes."""
+    original_chars: int
+    truncated: bool
+
+
+_memory_cache: dict[tuple[str, int | None], tuple[int, int, MemoryFile]] = {}
+_memory_cache_lock = threading.Lock()
+
+
+def _truncate_memory(text: str, max_chars: int, path: str) -> str:
+    """Keep the head and tail of an oversized memory file, cut at line boundaries."""
+    head_budget = int(max_chars * _TRUNCATE_HEAD_RATIO)
+    tail_budget = max_chars - head_budget
+    head = text[:head_budget]
+    head = head[: head.rfind("\n") + 1] or head
+    tail = text[-tail_budget:] if tail_budget else ""
+    tail = tail[tail.find("\n") + 1 :] if "\n" in tail else tail
+    omitted = len(text) - len(head) - len(tail)
+    return (
+        f"{head}\n[... {omitted:,} characters of this agent.md omitted "
+        f"(showing {len(head) + len(tail):,} of {len(text):,}). Read `{path}` for the full "
+        f"file and consider condensing it. ...]\n\n{tail}"
+    )
+
+
+def load_memory_file(path: Path, max_chars: int | None = DEFAULT_MAX_MEMORY_CHARS) -> MemoryFile | None:
+    """Load an agent.md file through the process-wide cache.
+
+    The file is only re-read when its mtime or size changed, so calling this on
+    every model call costs a single ``stat``.
 
-    project_memory: NotRequired[str]
-    """Project-specific context (loaded from project root)."""
+    Args:
+        path: Path to the agent.md file.
+        max_chars: Maximum number of characters to keep, or None for no limit.
+
+    Returns:
+        The loaded memory file, or None if it does not exist or cannot be read.
+    """
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+
+    key = (str(path), max_chars)
+    with _memory_cache_lock:
+        cached = _memory_cache.get(key)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+
+    try:
+        text = path.read_text()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+    truncated = max_chars is not None and len(text) > max_chars
+    memory = MemoryFile(
+        path=str(path),
+        text=_truncate_memory(text, max_chars, str(path)) if truncated else text,
+        version=f"{stat.st_mtime_ns:x}-{stat.st_size:x}",
+        original_chars=len(text),
+        truncated=truncated,
+    )
+    with _memory_cache_lock:
+        if key not in _memory_cache and len(_memory_cache) >= _MAX_CACHED_MEMORY_FILES:
+            _memory_cache.pop(next(iter(_memory_cache)))
+        _memory_cache[key] = (stat.st_mtime_ns, stat.st_size, memory)
+    return memory
 
 
 # Long-term Memory Documentation
@@ -168,12 +263,62 @@ DEFAULT_MEMORY_SNIPPET = """<user_memory>
 </project_memory>"""
 
 
+@lru_cache(maxsize=128)
+def _memory_prompt_sections(
+    template: str,
+    user_memory: str | None,
+    project_memory: str | None,
+    agent_dir_absolute: str,
+    agent_dir_display: str,
+    project_root: str | None,
+) -> tuple[str, str]:
+    """Format the long-term memory instructions and the memory contents.
+
+    Cached on all inputs; strings cache their own hash, so lookups for the
+    same cached memory texts are cheap.
+
+    Returns:
+        (instructions, memory) sections. The instructions only depend on paths
+        and are stable; the memory section changes whenever agent.md changes.
+    """
+    # Build project memory info for documentation
+    if project_root and project_memory:
+        project_memory_info = f"`{project_root}` (detected)"
+    elif project_root:
+        project_memory_info = f"`{project_root}` (no agent.md found)"
+    else:
+        project_memory_info = "None (not in a git project)"
+
+    # Build project deepagents directory path
+    if project_root:
+        project_deepagents_dir = f"{project_root}/.deepagents"
+    else:
+        project_deepagents_dir = "[project-root]/.deepagents (not in a project)"
+
+    instructions = LONGTERM_MEMORY_SYSTEM_PROMPT.format(
+        agent_dir_absolute=agent_dir_absolute,
+        agent_dir_display=agent_dir_display,
+        project_memory_info=project_memory_info,
+        project_deepagents_dir=project_deepagents_dir,
+    )
+
+    # Format memory section with both memories
+    memory_section = template.format(
+        user_memory=user_memory if user_memory else "(No user agent.md)",
+        project_memory=project_memory if project_memory else "(No project agent.md)",
+    )
+
+    return instructions, memory_section
+
+
 class AgentMemoryMiddleware(AgentMiddleware):
     """Middleware for loading agent-specific long-term memory.
 
     This middleware loads the agent's long-term memory from a file (agent.md)
-    and injects it into the system prompt. The memory is loaded once at the
-    start of the conversation and stored in state.
+    and injects it into the system prompt. Files are read through a process-wide
+    cache keyed by path and mtime, so edits (including ones the agent makes
+    mid-thread) are picked up on the next model call. State only records the
+    version ids of the files.
     """
 
     state_schema = AgentMemoryState
@@ -184,6 +329,7 @@ class AgentMemoryMiddleware(AgentMiddleware):
         settings: Settings,
         assistant_id: str,
         system_prompt_template: str | None = None,
+        max_memory_chars: int | None = DEFAULT_MAX_MEMORY_CHARS,
     ) -> None:
         """Initialize the agent memory middleware.
 
@@ -192,6 +338,8 @@ class AgentMemoryMiddleware(AgentMiddleware):
             assistant_id: The agent identifier.
             system_prompt_template: Optional custom template for injecting
                 agent memory into system prompt.
+            max_memory_chars: Maximum characters of each agent.md injected into
+                the prompt (head and tail are kept), or None for no limit.
         """
         self.settings = settings
         self.assistant_id = assistant_id
@@ -205,93 +353,77 @@ class AgentMemoryMiddleware(AgentMiddleware):
         # Project paths (from settings)
         self.project_root = settings.project_root
 
+        # agent_dir is resolved for the user the middleware was built for
+        self.user_memory_path = self.agent_dir / "agent.md"
+        self.project_memory_path = settings.get_project_agent_md_path()
+        self.max_memory_chars = max_memory_chars
+
         self.system_prompt_template = system_prompt_template or DEFAULT_MEMORY_SNIPPET
 
+    def _load_memories(self) -> tuple[MemoryFile | None, MemoryFile | None]:
+        user_memory = load_memory_file(self.user_memory_path, self.max_memory_chars)
+        project_memory = (
+            load_memory_file(self.project_memory_path, self.max_memory_chars)
+            if self.project_memory_path
+            else None
+        )
+        return user_memory, project_memory
+
     def before_agent(
         self,
         state: AgentMemoryState,
         runtime: Runtime,
     ) -> AgentMemoryStateUpdate:
-        """Load agent memory from file before agent execution.
-
-        Loads both user agent.md and project-specific agent.md if available.
-        Only loads if not already present in state.
+        """Record the versions of the memory files at the start of a run.
 
-        Dynamically checks for file existence on every call to catch user updates.
+        Checks user agent.md and project-specific agent.md on every invocation.
+        Only the version ids are written to state (and only when they changed);
+        the text itself is injected per model call from the shared cache.
 
         Args:
             state: Current agent state.
             runtime: Runtime context.
 
         Returns:
-            Updated state with user_memory and project_memory populated.
+            Updated state with user_memory_version and project_memory_version.
         """
+        user_memory, project_memory = self._load_memories()
         result: AgentMemoryStateUpdate = {}
 
-        # Load user memory if not already in state
-        if "user_memory" not in state:
-            user_path = self.settings.get_user_agent_md_path(self.assistant_id)
-            if user_path.exists():
-                with contextlib.suppress(OSError, UnicodeDecodeError):
-                    result["user_memory"] = user_path.read_text()
+        user_version = user_memory.version if user_memory else ""
+        if state.get("user_memory_version") != user_version:
+            result["user_memory_version"] = user_version
 
-        # Load project memory if not already in state
-        if "project_memory" not in state:
-            project_path = self.settings.get_project_agent_md_path()
-            if project_path and project_path.exists():
-                with contextlib.suppress(OSError, UnicodeDecodeError):
-                    result["project_memory"] = project_path.read_text()
+        project_version = project_memory.version if project_memory else ""
+        if state.get("project_memory_version") != project_version:
+            result["project_memory_version"] = project_version
 
         return result
 
-    def _build_system_prompt(self, request: ModelRequest) -> str:
-        """Build the complete system prompt with memory sections.
+    def _apply_memory(self, request: ModelRequest) -> ModelRequest:
+        """Append the memory sections to the system prompt.
+
+        The instructions and the memory contents are appended as separate
+        system blocks after the base prompt (stable first, agent.md last) so
+        provider prompt caching can reuse the prefix. Sections are memoized on
+        their inputs, so repeated model calls within a run reuse the same strings.
 
         Args:
             request: The model request containing state and base system prompt.
 
         Returns:
-            Complete system prompt with memory sections injected.
+            Model request with memory sections injected.
         """
-        # Extract memory from state
-        state = cast("AgentMemoryState", request.state)
-        user_memory = state.get("user_memory")
-        project_memory = state.get("project_memory")
-        base_system_prompt = request.system_prompt
-
-        # Build project memory info for documentation
-        if self.project_root and project_memory:
-            project_memory_info = f"`{self.project_root}` (detected)"
-        elif self.project_root:
-            project_memory_info = f"`{self.project_root}` (no agent.md found)"
-        else:
-            project_memory_info = "None (not in a git project)"
-
-        # Build project deepagents directory path
-        if self.project_root:
-            project_deepagents_dir = str(self.project_root / ".deepagents")
-        else:
-            project_deepagents_dir = "[project-root]/.deepagents (not in a project)"
-
-        # Format memory section with both memories
-        memory_section = self.system_prompt_template.format(
-            user_memory=user_memory if user_memory else "(No user agent.md)",
-            project_memory=project_memory if project_memory else "(No project agent.md)",
-        )
-
-        system_prompt = memory_section
-
-        if base_system_prompt:
-            system_prompt += "\n\n" + base_system_prompt
-
-        system_prompt += "\n\n" + LONGTERM_MEMORY_SYSTEM_PROMPT.format(
-            agent_dir_absolute=self.agent_dir_absolute,
-            agent_dir_display=self.agent_dir_display,
-            project_memory_info=project_memory_info,
-            project_deepagents_dir=project_deepagents_dir,
+        user_memory, project_memory = self._load_memories()
+        instructions, memory_section = _memory_prompt_sections(
+            self.system_prompt_template,
+            user_memory.text if user_memory else None,
+            project_memory.text if project_memory else None,
+            self.agent_dir_absolute,
+            self.agent_dir_display,
+            str(self.project_root) if self.project_root else None,
         )
-
-        return system_prompt
+        return append_system_blocks(request, instructions, memory_section)
 
     def wrap_model_call(
         self,
@@ -307,8 +439,7 @@ class AgentMemoryMiddleware(AgentMiddleware):
         Returns:
             The model response from the handler.
         """
-        system_prompt = self._build_system_prompt(request)
-        return handler(request.override(system_prompt=system_prompt))
+        return handler(self._apply_memory(request))
 
     async def awrap_model_call(
         self,
@@ -324,5 +455,4 @@ class AgentMemoryMiddleware(AgentMiddleware):
         Returns:
             The model response from the handler.
         """
-        system_prompt = self._build_system_prompt(request)
-        return await handler(request.override(system_prompt=system_prompt))
\ No newline at end of file
+        return await handler(self._apply_memory(request))
\ No newline at end of file
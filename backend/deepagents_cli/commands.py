@@ -6,10 +6,13 @@ from pathlib import Path
 from langgraph.checkpoint.memory import InMemorySaver
 
 from .config import COLORS, DEEP_AGENTS_ASCII, console
-from .ui import TokenTracker, show_interactive_help
+from .telemetry import read_telemetry, summarize
+from .ui import TokenTracker, render_run_stats, show_interactive_help
 
 
-def handle_command(command: str, agent, token_tracker: TokenTracker) -> str | bool:
+def handle_command(
+    command: str, agent, token_tracker: TokenTracker, thread_id: str | None = None
+) -> str | bool:
     """Handle slash commands. Returns 'exit' to exit, True if handled, False to pass to agent."""
     cmd = command.lower().strip().lstrip("/")
 
@@ -41,6 +44,10 @@ def handle_command(command: str, agent, token_tracker: TokenTracker) -> str | bo
         token_tracker.display_session()
         return True
 
+    if cmd == "stats":
+        render_run_stats(summarize(read_telemetry(thread_id)) if thread_id else None)
+        return True
+
     console.print()
     console.print(f"[yellow]Unknown command: /{cmd}[/yellow]")
     console.print("[dim]Type /help for available commands.[/dim]")
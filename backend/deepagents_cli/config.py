@@ -50,6 +50,7 @@ COMMANDS = {
     "clear": "Clear screen and reset conversation",
     "help": "Show help information",
     "tokens": "Show token usage for current session",
+    "stats": "Show model and tool timings for current session",
     "quit": "Exit the CLI",
     "exit": "Exit the CLI",
 }
@@ -0,0 +1,216 @@
+"""Middleware that keeps the message history within a token budget.
+
+File reads, shell output and web pages pile up in long runs, and every model
+call resends all of them. ``ContextCompactionMiddleware`` tracks the size of
+the context (from the ``usage_metadata`` of the last model response, plus an
+estimate for the messages added since) and, once it passes a trigger, replaces
+old tool results with short stubs until it is back under a target. The most
+recent turns are never touched.
+
+Compacted messages are replaced in state (same message ids), so the shorter
+history is what later calls and provider prompt caches see. Every compaction
+is appended to the ``context_compactions`` state key and logged, so savings
+can be measured per thread.
+"""
+
+import logging
+import operator
+import time
+from typing import Annotated, Any, NotRequired, TypedDict
+
+from langchain.agents.middleware.types import AgentMiddleware, AgentState
+from langchain_core.messages import AIMessage, AnyMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langgraph.runtime import Runtime
+
+logger = logging.getLogger(__name__)
+
+# Marker in additional_kwargs of compacted tool messages (value: original length in characters)
+COMPACTED_KEY = "compacted_chars"
+
+
+class CompactionEvent(TypedDict):
+    """One compaction of the message history."""
+
+    at: float
+    """Unix time of the compaction."""
+    tokens_before: int
+    tokens_after: int
+    """Estimated context size after the compaction."""
+    message_count: NotRequired[int]
+    """Number of messages in the history that ``tokens_after`` covers."""
+    token_source: str
+    """"usage" if ``tokens_before`` comes from the model's usage metadata, else "estimate"."""
+    messages_compacted: int
+    chars_removed: int
+    duration_ms: float
+    usage_message_id: str | None
+    """Id of the AI message whose usage ``tokens_before`` is based on."""
+
+
+class ContextCompactionState(AgentState):
+    """State for the context compaction middleware."""
+
+    context_compactions: NotRequired[Annotated[list[CompactionEvent], operator.add]]
+    """Compactions done in the thread, oldest first."""
+
+
+def _last_usage(messages: list[AnyMessage]) -> tuple[int, AIMessage] | None:
+    for index in range(len(messages) - 1, -1, -1):
+        message = messages[index]
+        if isinstance(message, AIMessage) and message.usage_metadata:
+            return index, message
+    return None
+
+
+def _stub(message: ToolMessage, content: str, stub_chars: int) -> str:
+    head = content[:stub_chars].rstrip()
+    if len(head) < len(content):
+        head += " ..."
+    return (
+        f"[Earlier {message.name or 'tool'} result ({len(content):,} characters) was compacted "
+        "to save context. Run the tool again if you need the full result.]\n"
+        f"{head}"
+    )
+
+
+class ContextCompactionMiddleware(AgentMiddleware):
+    """Replace stale tool results with stubs when the context grows too large."""
+
+    state_schema = ContextCompactionState
+
+    def __init__(
+        self,
+        *,
+        trigger_tokens: int = 100_000,
+        target_tokens: int = 60_000,
+        keep_recent_turns: int = 3,
+        min_result_chars: int = 2_000,
+        stub_chars: int = 300,
+    ) -> None:
+        """Initialize the context compaction middleware.
+
+        Args:
+            trigger_tokens: Compact when the context exceeds this many tokens.
+            target_tokens: Compact old tool results until the context is
+                estimated to be below this many tokens.
+            keep_recent_turns: Tool results of the last this many model turns
+                are kept verbatim.
+            min_result_chars: Tool results shorter than this are left alone.
+            stub_chars: Characters of a compacted result kept in its stub.
+        """
+        super().__init__()
+        self.trigger_tokens = trigger_tokens
+        self.target_tokens = min(target_tokens, trigger_tokens)
+        self.keep_recent_turns = keep_recent_turns
+        self.min_result_chars = min_result_chars
+        self.stub_chars = stub_chars
+
+    def _context_tokens(
+        self, messages: list[AnyMessage], events: list[CompactionEvent]
+    ) -> tuple[int, str, str | None]:
+        """Return the current context size, its source and the usage message id."""
+        usage = _last_usage(messages)
+        if usage is None:
+            return count_tokens_approximately(messages), "estimate", None
+
+        index, message = usage
+        counted = index + 1
+        if events and events[-1]["usage_message_id"] == message.id:
+            # Already compacted since that response: its usage is out of date, and the
+            # compacted estimate already covers the messages up to the compaction
+            base = events[-1]["tokens_after"]
+            counted = events[-1].get("message_count", counted)
+        else:
+            base = message.usage_metadata.get("input_tokens", 0) + message.usage_metadata.get(
+                "output_tokens", 0
+            )
+        return base + count_tokens_approximately(messages[counted:]), "usage", message.id
+
+    def _protected_from(self, messages: list[AnyMessage]) -> int:
+        """Return the index of the first message of the recent turns."""
+        turns = 0
+        for index in range(len(messages) - 1, -1, -1):
+            if isinstance(messages[index], AIMessage):
+                turns += 1
+                if turns >= self.keep_recent_turns:
+                    return index
+        return 0
+
+    def before_model(
+        self, state: ContextCompactionState, runtime: Runtime
+    ) -> dict[str, Any] | None:
+        """Compact stale tool results if the context is over the trigger.
+
+        Args:
+            state: Current agent state.
+            runtime: Runtime context.
+
+        Returns:
+            The compacted messages (replacing the originals by id) and the
+            compaction event, or None if nothing was compacted.
+        """
+        if self.trigger_tokens <= 0:
+            return None
+        started = time.perf_counter()
+        messages = state["messages"]
+        events = state.get("context_compactions") or []
+        tokens_before, source, usage_message_id = self._context_tokens(messages, events)
+        if tokens_before <= self.trigger_tokens:
+            return None
+
+        tokens = tokens_before
+        compacted: list[ToolMessage] = []
+        chars_removed = 0
+        for message in messages[: self._protected_from(messages)]:
+            if tokens <= self.target_tokens:
+                break
+            if (
+                not isinstance(message, ToolMessage)
+                or not isinstance(message.content, str)
+                or len(message.content) < self.min_result_chars
+                or COMPACTED_KEY in message.additional_kwargs
+            ):
+                continue
+            stub = _stub(message, message.content, self.stub_chars)
+            replacement = message.model_copy(
+                update={
+                    "content": stub,
+                    "additional_kwargs": {
+                        **message.additional_kwargs,
+                        COMPACTED_KEY: len(message.content),
+                    },
+                }
+            )
+            tokens -= count_tokens_approximately([message]) - count_tokens_approximately(
+                [replacement]
+            )
+            chars_removed += len(message.content) - len(stub)
+            compacted.append(replacement)
+
+        if not compacted:
+            return None
+
+        event: CompactionEvent = {
+            "at": time.time(),
+            "tokens_before": tokens_before,
+            "tokens_after": tokens,
+            "message_count": len(messages),
+            "token_source": source,
+            "messages_compacted": len(compacted),
+            "chars_removed": chars_removed,
+            "duration_ms": (time.perf_counter() - started) * 1000,
+            "usage_message_id": usage_message_id,
+        }
+        logger.info(
+            "Compacted %d tool results: ~%d -> ~%d tokens (%s) in %.1f ms",
+            len(compacted),
+            tokens_before,
+            tokens,
+            source,
+            event["duration_ms"],
+        )
+        return {"messages": compacted, "context_compactions": [event]}
+
+
+__all__ = ["CompactionEvent", "ContextCompactionMiddleware"]
@@ -0,0 +1,132 @@
+"""Main-content extraction for ``fetch_url``.
+
+Web pages are mostly navigation, scripts, cookie banners and footers. Before
+converting a page to markdown, the main content (``<main>``, ``role="main"`` or
+``<article>``, else ``<body>``) is picked and only it is converted, with the
+boilerplate inside it removed, which keeps the result (and the tokens the agent
+spends on it) small. The main element and its ancestors are never removed, so a
+layout wrapper whose class looks like chrome (``has-sidebar``) cannot drop the
+article.
+"""
+
+from __future__ import annotations
+
+import re
+
+from bs4 import BeautifulSoup, Tag
+from markdownify import MarkdownConverter
+
+# Elements that never carry readable content
+_STRIP_TAGS = (
+    "script",
+    "style",
+    "noscript",
+    "template",
+    "svg",
+    "canvas",
+    "iframe",
+    "button",
+    "input",
+    "select",
+    "textarea",
+    "nav",
+    "aside",
+)
+
+# Page-level chrome; kept inside <article>/<main> where they hold titles and bylines
+_PAGE_CHROME_TAGS = ("header", "footer")
+
+_BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search"}
+
+# class/id words of typical page chrome
+_BOILERPLATE_PATTERN = re.compile(
+    r"(^|[-_\s])(nav|navbar|menu|sidebar|breadcrumbs?|cookie|consent|banner|footer|"
+    r"social|share|advert|ads|popup|modal|newsletter|subscribe|related|comments?)($|[-_\s])",
+    re.IGNORECASE,
+)
+
+# A main-content candidate shorter than this (in characters) is ignored
+_MIN_MAIN_TEXT = 200
+
+# Inside the main content, an element that looks like chrome is only removed if its
+# text is shorter than this or mostly link text
+_MAX_BOILERPLATE_TEXT = 200
+_MIN_LINK_DENSITY = 0.5
+
+_converter = MarkdownConverter(heading_style="ATX", bullets="-")
+
+
+def _is_boilerplate(tag: Tag) -> bool:
+    if tag.name in {"html", "body", "main", "article"}:
+        return False
+    if tag.get("role") in _BOILERPLATE_ROLES:
+        return True
+    if tag.has_attr("hidden") or tag.get("aria-hidden") == "true":
+        return True
+    names = " ".join(tag.get("class") or []) + " " + (tag.get("id") or "")
+    return bool(_BOILERPLATE_PATTERN.search(names))
+
+
+def _is_short_or_links(tag: Tag) -> bool:
+    text = len(tag.get_text(strip=True))
+    if text < _MAX_BOILERPLATE_TEXT:
+        return True
+    links = sum(len(a.get_text(strip=True)) for a in tag.find_all("a"))
+    return links / text >= _MIN_LINK_DENSITY
+
+
+def _main_content(soup: BeautifulSoup) -> Tag:
+    for candidate in (
+        soup.find("main"),
+        soup.find(attrs={"role": "main"}),
+        soup.find("article"),
+    ):
+        if candidate is not None and len(candidate.get_text(strip=True)) >= _MIN_MAIN_TEXT:
+            return candidate
+    return soup.body or soup
+
+
+def html_to_markdown(html: str) -> str:
+    """Convert the main content of an HTML page to markdown.
+
+    The page ``<title>`` becomes the top heading if the content has none.
+
+    Args:
+        html: Page source.
+
+    Returns:
+        Markdown of the main content.
+
+    Example:
+        >>> article = "<p>" + "text " * 50 + "</p>"
+        >>> page = f'<title>T</title><div class="wrapper has-sidebar"><main>{article}</main></div>'
+        >>> html_to_markdown(page).split()[:4]
+        ['#', 'T', 'text', 'text']
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.get_text(strip=True) if soup.title else None
+
+    for tag in soup.find_all(_STRIP_TAGS):
+        tag.decompose()
+
+    # Only descendants of the main content are removed below, never it or its ancestors
+    main = _main_content(soup)
+    for tag in main.find_all(_PAGE_CHROME_TAGS):
+        if not tag.decomposed and tag.find_parent(("article", "main")) is None:
+            tag.decompose()
+    for tag in main.find_all(True):
+        # Children of removed elements are already detached
+        if tag.decomposed:
+            continue
+        if _is_boilerplate(tag) and _is_short_or_links(tag):
+            tag.decompose()
+
+    markdown = _converter.convert_soup(main)
+    markdown = re.sub(r"[ \t]+\n", "\n", markdown)
+    markdown = re.sub(r"\n{3,}", "\n\n", markdown).strip()
+    if title and main.find("h1") is None:
+        markdown = f"# {title}\n\n{markdown}"
+    return markdown
+
+
+__all__ = ["html_to_markdown"]
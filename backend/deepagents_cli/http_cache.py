@@ -0,0 +1,419 @@
+"""Persistent HTTP cache for ``fetch_url``.
+
+Pages are stored in a SQLite database keyed by URL, together with the markdown
+converted from them, so a page fetched again (by any thread or user) is served
+without downloading or converting it again. Caching follows RFC 9111 for a
+shared cache:
+
+- responses marked ``no-store`` or ``private``, with ``Set-Cookie`` or
+  ``Vary: *``, and anything but complete ``200`` responses are not stored
+- freshness comes from ``s-maxage``, ``max-age``, ``Expires`` or, failing those,
+  10% of the time since ``Last-Modified`` (at most a day)
+- stale entries (and ``no-cache`` ones) are revalidated with ``If-None-Match`` /
+  ``If-Modified-Since``; a ``304`` refreshes the entry without a download
+
+The database is bounded in size; least recently used entries are evicted first.
+Hit/miss counters are kept in the database so other processes (e.g. the file
+API server) can report them.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from deepagents_cli import http_client
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = Path.home() / ".deepagents" / ".cache" / "http_cache.sqlite"
+DEFAULT_MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+# Upper bound of the heuristic freshness lifetime (RFC 9111 4.2.2)
+_MAX_HEURISTIC_LIFETIME = 24 * 60 * 60
+
+# Response headers kept with an entry
+_STORED_HEADERS = (
+    "content-type",
+    "etag",
+    "last-modified",
+    "cache-control",
+    "date",
+    "expires",
+    "age",
+)
+
+_COUNTERS = ("hits", "revalidated", "misses", "stores", "evictions", "bypassed")
+
+
+def _parse_cache_control(value: str | None) -> dict[str, str | None]:
+    directives: dict[str, str | None] = {}
+    for part in (value or "").split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else None
+    return directives
+
+
+def _parse_date(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _int_directive(directives: dict[str, str | None], name: str) -> int | None:
+    value = directives.get(name)
+    if value is None or not value.isdigit():
+        return None
+    return int(value)
+
+
+def is_storable(response: http_client.HttpResponse) -> bool:
+    """Whether a shared cache may store the response."""
+    if response.status_code != 200 or response.truncated:
+        return False
+    directives = _parse_cache_control(response.headers.get("cache-control"))
+    if "no-store" in directives or "private" in directives:
+        return False
+    if "set-cookie" in response.headers:
+        return False
+    return response.headers.get("vary", "").strip() != "*"
+
+
+def freshness_lifetime(headers: httpx.Headers | dict[str, str], now: float) -> float:
+    """Seconds the response stays fresh from ``now`` (0 means revalidate before use)."""
+    directives = _parse_cache_control(headers.get("cache-control"))
+    if "no-cache" in directives:
+        return 0.0
+
+    age_header = headers.get("age", "")
+    age = float(age_header) if age_header.isdigit() else 0.0
+    date = _parse_date(headers.get("date")) or now
+
+    lifetime: float | None = _int_directive(directives, "s-maxage")
+    if lifetime is None:
+        lifetime = _int_directive(directives, "max-age")
+    if lifetime is None:
+        expires = _parse_date(headers.get("expires"))
+        if expires is not None:
+            lifetime = max(0.0, expires - date)
+    if lifetime is None:
+        last_modified = _parse_date(headers.get("last-modified"))
+        if last_modified is not None and last_modified < date:
+            lifetime = min(0.1 * (date - last_modified), _MAX_HEURISTIC_LIFETIME)
+    return max(0.0, (lifetime or 0.0) - age)
+
+
+@dataclass
+class CacheEntry:
+    """A stored response."""
+
+    url: str
+    final_url: str
+    headers: dict[str, str]
+    body: bytes
+    encoding: str | None
+    expires_at: float
+    markdown: str | None
+    markdown_version: int | None
+
+    @property
+    def fresh(self) -> bool:
+        """Whether the entry can be used without revalidation."""
+        return time.time() < self.expires_at
+
+    @property
+    def text(self) -> str:
+        """Body decoded with the stored charset (UTF-8 if unknown)."""
+        return self.body.decode(self.encoding or "utf-8", errors="replace")
+
+    def validators(self) -> dict[str, str]:
+        """Conditional request headers for revalidation."""
+        headers = {}
+        if "etag" in self.headers:
+            headers["If-None-Match"] = self.headers["etag"]
+        if "last-modified" in self.headers:
+            headers["If-Modified-Since"] = self.headers["last-modified"]
+        return headers
+
+
+class HttpCache:
+    """SQLite-backed, size-bounded LRU cache of HTTP responses."""
+
+    def __init__(self, path: Path, max_bytes: int = DEFAULT_MAX_CACHE_BYTES) -> None:
+        """Open (or create) the cache database.
+
+        Args:
+            path: Database file.
+            max_bytes: Maximum total size of stored bodies and markdown.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                final_url TEXT NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                encoding TEXT,
+                expires_at REAL NOT NULL,
+                markdown TEXT,
+                markdown_version INTEGER,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+            CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            """
+        )
+        self._db.commit()
+
+    # ---- entries ----
+
+    def get(self, url: str) -> CacheEntry | None:
+        """Return the entry for a URL (fresh or stale) and mark it as used."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT final_url, headers, body, encoding, expires_at, markdown, markdown_version"
+                " FROM entries WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE entries SET last_access = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+        final_url, headers, body, encoding, expires_at, markdown, markdown_version = row
+        return CacheEntry(
+            url=url,
+            final_url=final_url,
+            headers=json.loads(headers),
+            body=body,
+            encoding=encoding,
+            expires_at=expires_at,
+            markdown=markdown,
+            markdown_version=markdown_version,
+        )
+
+    def put(self, url: str, response: http_client.HttpResponse) -> CacheEntry | None:
+        """Store a response if it is storable; returns the new entry."""
+        if not is_storable(response):
+            return None
+        now = time.time()
+        headers = {name: response.headers[name] for name in _STORED_HEADERS if name in response.headers}
+        entry = CacheEntry(
+            url=url,
+            final_url=response.url,
+            headers=headers,
+            body=response.content,
+            encoding=response.encoding,
+            expires_at=now + freshness_lifetime(response.headers, now),
+            markdown=None,
+            markdown_version=None,
+        )
+        if not entry.validators() and entry.expires_at <= now:
+            # Neither fresh nor revalidatable: storing it would never help
+            return None
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, NULL, NULL, ?, ?)",
+                (
+                    url,
+                    entry.final_url,
+                    json.dumps(headers),
+                    entry.body,
+                    entry.encoding,
+                    entry.expires_at,
+                    len(entry.body),
+                    now,
+                ),
+            )
+            self._count("stores")
+            self._evict()
+            self._db.commit()
+        return entry
+
+    def refresh(self, entry: CacheEntry, not_modified: http_client.HttpResponse) -> None:
+        """Update an entry's headers and freshness from a 304 response."""
+        now = time.time()
+        for name in _STORED_HEADERS:
+            if name in not_modified.headers:
+                entry.headers[name] = not_modified.headers[name]
+        entry.expires_at = now + freshness_lifetime(entry.headers, now)
+        with self._lock:
+            self._db.execute(
+                "UPDATE entries SET headers = ?, expires_at = ?, last_access = ? WHERE url = ?",
+                (json.dumps(entry.headers), entry.expires_at, now, entry.url),
+            )
+            self._db.commit()
+
+    def set_markdown(self, url: str, markdown: str, version: int) -> None:
+        """Attach converted markdown to an entry."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE entries SET markdown = ?, markdown_version = ?,"
+                " size = length(body) + ? WHERE url = ?",
+                (markdown, version, len(markdown.encode()), url),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        # Called with the lock held
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for url, size in self._db.execute(
+            "SELECT url, size FROM entries ORDER BY last_access"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM entries WHERE url = ?", (url,))
+            total -= size
+            evicted += 1
+        self._count("evictions", evicted)
+
+    # ---- statistics ----
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        # Called with the lock held
+        self._db.execute(
+            "INSERT INTO counters VALUES (?, ?)"
+            " ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def record(self, name: str) -> None:
+        """Increment a counter (hits, revalidated, misses, bypassed)."""
+        with self._lock:
+            self._count(name)
+            self._db.commit()
+
+    def stats(self) -> dict[str, Any]:
+        """Return counters, hit rate and current size of the cache."""
+        with self._lock:
+            counters = dict(self._db.execute("SELECT name, value FROM counters").fetchall())
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        stats: dict[str, Any] = {name: counters.get(name, 0) for name in _COUNTERS}
+        lookups = sum(stats[name] for name in ("hits", "revalidated", "misses", "bypassed"))
+        stats["hit_rate"] = (stats["hits"] + stats["revalidated"]) / lookups if lookups else 0.0
+        stats["entries"] = entries
+        stats["size_bytes"] = size
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+_cache: HttpCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_http_cache() -> HttpCache | None:
+    """Return the process-wide cache (None if disabled with DEEPAGENTS_HTTP_CACHE=off)."""
+    global _cache
+    setting = os.environ.get("DEEPAGENTS_HTTP_CACHE", "")
+    if setting.lower() in {"off", "0", "false"}:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            max_mb = os.environ.get("DEEPAGENTS_HTTP_CACHE_MAX_MB")
+            _cache = HttpCache(
+                Path(setting).expanduser() if setting else DEFAULT_CACHE_PATH,
+                max_bytes=int(max_mb) * 1024 * 1024 if max_mb else DEFAULT_MAX_CACHE_BYTES,
+            )
+        return _cache
+
+
+@dataclass
+class CachedFetch:
+    """Result of ``cached_get``: a cache entry or an uncached response."""
+
+    status: str
+    """"hit", "revalidated", "miss" (fetched and stored) or "bypassed" (not storable)."""
+    status_code: int
+    url: str
+    text: str
+    truncated: bool
+    content_type: str = ""
+    entry: CacheEntry | None = None
+
+
+async def cached_get(
+    url: str, *, timeout: float = 30.0, max_bytes: int = http_client.DEFAULT_MAX_RESPONSE_BYTES
+) -> CachedFetch:
+    """GET a URL through the shared cache.
+
+    Raises:
+        TimeoutError: If the request did not complete within ``timeout``.
+        httpx.HTTPError: On connection or protocol errors.
+    """
+    cache = get_http_cache()
+    entry = await asyncio.to_thread(cache.get, url) if cache else None
+    if entry is not None and entry.fresh:
+        await asyncio.to_thread(cache.record, "hits")
+        return CachedFetch(
+            "hit", 200, entry.final_url, entry.text, False, entry.headers.get("content-type", ""), entry
+        )
+
+    headers = entry.validators() if entry is not None else None
+    response = await http_client.request(
+        "GET", url, headers=headers, timeout=timeout, max_bytes=max_bytes
+    )
+
+    if cache is None:
+        return CachedFetch(
+            "bypassed",
+            response.status_code,
+            response.url,
+            response.text,
+            response.truncated,
+            response.headers.get("content-type", ""),
+        )
+    if entry is not None and response.status_code == 304:
+        await asyncio.to_thread(cache.refresh, entry, response)
+        await asyncio.to_thread(cache.record, "revalidated")
+        return CachedFetch(
+            "revalidated",
+            200,
+            entry.final_url,
+            entry.text,
+            False,
+            entry.headers.get("content-type", ""),
+            entry,
+        )
+
+    stored = await asyncio.to_thread(cache.put, url, response)
+    await asyncio.to_thread(cache.record, "misses" if stored else "bypassed")
+    logger.debug("HTTP cache %s for %s", "store" if stored else "bypass", url)
+    return CachedFetch(
+        "miss" if stored else "bypassed",
+        response.status_code,
+        response.url,
+        response.text,
+        response.truncated,
+        response.headers.get("content-type", ""),
+        stored,
+    )
+
+
+__all__ = ["CachedFetch", "HttpCache", "cached_get", "get_http_cache"]
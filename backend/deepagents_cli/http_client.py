@@ -0,0 +1,203 @@
+"""Shared, pooled HTTP client for the web tools.
+
+``http_request`` and ``fetch_url`` go through one ``httpx.AsyncClient`` per
+event loop, so DNS, TCP and TLS setup is paid once per host and connections are
+kept alive (over HTTP/2 when the server supports it, via ``httpx[http2]``).
+Requests to the same host share a small concurrency limit, and response bodies
+are streamed with a byte cap so an oversized response is cut off instead of
+being loaded into memory.
+
+Synchronous callers (the CLI) use ``request_sync``, which runs the request on a
+background event loop so they share one pooled client as well.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import weakref
+from collections.abc import Coroutine
+from dataclasses import dataclass
+from typing import Any, TypeVar
+from urllib.parse import urlsplit
+
+import httpx
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (compatible; DeepAgents/1.0)"
+
+# Response bodies beyond this size are truncated while streaming
+DEFAULT_MAX_RESPONSE_BYTES = 5 * 1024 * 1024
+
+# Concurrent requests per host (similar to browsers)
+MAX_CONNECTIONS_PER_HOST = 6
+
+_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0)
+
+T = TypeVar("T")
+
+
+@dataclass
+class HttpResponse:
+    """A fully read (possibly truncated) HTTP response."""
+
+    status_code: int
+    url: str
+    headers: httpx.Headers
+    content: bytes
+    truncated: bool
+    """True if the body was cut off at ``max_bytes``."""
+    encoding: str | None = None
+    http_version: str = "HTTP/1.1"
+
+    @property
+    def text(self) -> str:
+        """Body decoded with the response charset (UTF-8 if unknown)."""
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self) -> Any:
+        """Body parsed as JSON."""
+        return json.loads(self.text)
+
+
+class _LoopClient:
+    """The client and per-host limits of one event loop."""
+
+    def __init__(self) -> None:
+        self.client = httpx.AsyncClient(
+            http2=True,
+            limits=_LIMITS,
+            follow_redirects=True,
+            headers={"User-Agent": DEFAULT_USER_AGENT},
+        )
+        self.host_limits: dict[str, asyncio.Semaphore] = {}
+
+    def host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc.lower()
+        semaphore = self.host_limits.get(host)
+        if semaphore is None:
+            semaphore = self.host_limits[host] = asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST)
+        return semaphore
+
+
+# httpx clients are bound to the event loop they were first used on
+_loop_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopClient] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _current_client() -> _LoopClient:
+    loop = asyncio.get_running_loop()
+    state = _loop_clients.get(loop)
+    if state is None:
+        state = _loop_clients[loop] = _LoopClient()
+    return state
+
+
+async def request(
+    method: str,
+    url: str,
+    *,
+    headers: dict[str, str] | None = None,
+    params: dict[str, str] | None = None,
+    json: Any = None,
+    content: str | bytes | None = None,
+    timeout: float = 30.0,
+    max_bytes: int = DEFAULT_MAX_RESPONSE_BYTES,
+) -> HttpResponse:
+    """Send a request with the shared client and read the body up to ``max_bytes``.
+
+    Args:
+        method: HTTP method.
+        url: Target URL.
+        headers: Extra request headers.
+        params: URL query parameters.
+        json: JSON body.
+        content: Raw body.
+        timeout: Total time budget in seconds (connect, wait and download).
+        max_bytes: Maximum number of body bytes to read.
+
+    Returns:
+        The response; ``truncated`` tells whether the body was cut off.
+
+    Raises:
+        TimeoutError: If the request did not complete within ``timeout``.
+        httpx.HTTPError: On connection or protocol errors.
+    """
+    state = _current_client()
+    async with asyncio.timeout(timeout), state.host_limit(url):
+        async with state.client.stream(
+            method.upper(),
+            url,
+            headers=headers,
+            params=params,
+            json=json,
+            content=content,
+            timeout=timeout,
+        ) as response:
+            chunks: list[bytes] = []
+            size = 0
+            truncated = False
+            async for chunk in response.aiter_bytes():
+                if size + len(chunk) > max_bytes:
+                    chunks.append(chunk[: max_bytes - size])
+                    truncated = True
+                    break
+                chunks.append(chunk)
+                size += len(chunk)
+
+            return HttpResponse(
+                status_code=response.status_code,
+                url=str(response.url),
+                headers=response.headers,
+                content=b"".join(chunks),
+                truncated=truncated,
+                encoding=response.charset_encoding,
+                http_version=response.http_version,
+            )
+
+
+async def aclose() -> None:
+    """Close the shared client of the running event loop."""
+    state = _loop_clients.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state.client.aclose()
+
+
+# ---- sync wrapper ----
+
+_background_loop: asyncio.AbstractEventLoop | None = None
+_background_lock = threading.Lock()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    global _background_loop
+    with _background_lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="http-client", daemon=True).start()
+            _background_loop = loop
+        return _background_loop
+
+
+def run_sync(coroutine: Coroutine[Any, Any, T]) -> T:
+    """Run a coroutine on the shared background loop and wait for its result.
+
+    Must not be called from the background loop itself.
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, _get_background_loop()).result()
+
+
+def request_sync(method: str, url: str, **kwargs: Any) -> HttpResponse:
+    """Blocking version of ``request`` (same arguments)."""
+    return run_sync(request(method, url, **kwargs))
+
+
+__all__ = [
+    "DEFAULT_MAX_RESPONSE_BYTES",
+    "HttpResponse",
+    "aclose",
+    "request",
+    "request_sync",
+    "run_sync",
+]
@@ -25,7 +25,8 @@ from deepagents_cli.input import create_prompt_session
 #     get_default_working_dir,
 # )
 from deepagents_cli.skills import execute_skills_command, setup_skills_parser
-from deepagents_cli.tools import fetch_url, http_request, web_search
+from deepagents_cli.token_utils import ContextBreakdown, agent_tools, calculate_context_breakdown
+from deepagents_cli.tools import fetch_url, fetch_urls, http_request, web_search
 from deepagents_cli.ui import TokenTracker, show_help
 
 
@@ -39,9 +40,9 @@ def check_cli_dependencies() -> None:
         missing.append("rich")
 
     try:
-        import requests
+        import httpx
     except ImportError:
-        missing.append("requests")
+        missing.append("httpx")
 
     try:
         import dotenv
@@ -134,7 +135,7 @@ async def simple_cli(
     agent,
     assistant_id: str | None,
     session_state,
-    baseline_tokens: int = 0,
+    baseline: ContextBreakdown | None = None,
     backend=None,
     sandbox_type: str | None = None,
     setup_script_path: str | None = None,
@@ -225,7 +226,8 @@ async def simple_cli(
     # Create prompt session and token tracker
     session = create_prompt_session(assistant_id, session_state)
     token_tracker = TokenTracker()
-    token_tracker.set_baseline(baseline_tokens)
+    if baseline is not None:
+        token_tracker.set_baseline(baseline)
 
     while True:
         try:
@@ -246,7 +248,9 @@ async def simple_cli(
 
         # Check for slash commands first
         if user_input.startswith("/"):
-            result = handle_command(user_input, agent, token_tracker)
+            result = handle_command(
+                user_input, agent, token_tracker, thread_id=session_state.thread_id
+            )
             if result == "exit":
                 console.print("\nGoodbye!", style=COLORS["primary"])
                 break
@@ -290,7 +294,7 @@ async def _run_agent_session(
         setup_script_path: Path to setup script that was run (if any)
     """
     # Create agent with conditional tools
-    tools = [http_request, fetch_url]
+    tools = [http_request, fetch_url, fetch_urls]
     if settings.has_tavily:
         tools.append(web_search)
 
@@ -303,19 +307,19 @@ async def _run_agent_session(
         auto_approve=session_state.auto_approve,
     )
 
-    # Calculate baseline token count for accurate token tracking
+    # Count the baseline context per component (cached by content hash)
     from .agent import get_system_prompt
-    from .token_utils import calculate_baseline_tokens
 
-    agent_dir = settings.get_agent_dir(assistant_id)
     system_prompt = get_system_prompt(assistant_id=assistant_id, sandbox_type=sandbox_type)
-    baseline_tokens = calculate_baseline_tokens(model, agent_dir, system_prompt, assistant_id)
+    baseline = calculate_context_breakdown(
+        model, assistant_id, system_prompt, agent_tools(agent) or tools
+    )
 
     await simple_cli(
         agent,
         assistant_id,
         session_state,
-        baseline_tokens,
+        baseline,
         backend=composite_backend,
         sandbox_type=sandbox_type,
         setup_script_path=setup_script_path,
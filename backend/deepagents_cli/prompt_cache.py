@@ -0,0 +1,134 @@
+"""Provider prompt caching for the system prompt.
+
+Middleware that contribute to the system prompt append their sections as
+separate content blocks, ordered from stable to volatile:
+
+1. base prompt (``get_system_prompt``) and deepagents' built-in sections
+2. skills list
+3. long-term memory instructions
+4. agent.md memory contents
+
+``PromptCachingMiddleware`` runs innermost. For Anthropic models it marks
+cache breakpoints (``cache_control``) on the last blocks so the whole prefix is
+served from the provider cache on subsequent calls. Other providers (OpenAI,
+Gemini) cache identical prefixes implicitly, so the blocks are joined back into
+a single string. The cached tokens of every call are recorded per thread by
+``TelemetryMiddleware`` (see ``deepagents_cli.telemetry``).
+"""
+
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from langchain.agents.middleware.types import (
+    AgentMiddleware,
+    ModelRequest,
+    ModelResponse,
+)
+from langchain_core.messages import SystemMessage
+
+
+def system_prompt_blocks(request: ModelRequest) -> list[dict[str, Any]]:
+    """Return the request's system prompt as a list of text content blocks.
+
+    Args:
+        request: The model request.
+
+    Returns:
+        Copies of the content blocks (a plain string becomes a single block).
+    """
+    message = request.system_message
+    if message is None:
+        return []
+    content = message.content
+    if isinstance(content, str):
+        return [{"type": "text", "text": content}] if content else []
+    return [
+        dict(block) if isinstance(block, dict) else {"type": "text", "text": str(block)}
+        for block in content
+    ]
+
+
+def append_system_blocks(request: ModelRequest, *texts: str) -> ModelRequest:
+    """Return a request whose system prompt has ``texts`` appended as new blocks.
+
+    Args:
+        request: The model request.
+        *texts: Sections to append, most stable first. Empty sections are skipped.
+
+    Returns:
+        Overridden model request.
+    """
+    blocks = system_prompt_blocks(request)
+    blocks.extend({"type": "text", "text": text} for text in texts if text)
+    return request.override(system_message=SystemMessage(content=blocks))
+
+
+def _is_anthropic(model: Any) -> bool:
+    # ChatAnthropic -> "anthropic-chat", ChatAnthropicVertex -> "anthropic-chat-vertexai"
+    return "anthropic" in getattr(model, "_llm_type", "")
+
+
+class PromptCachingMiddleware(AgentMiddleware):
+    """Mark system prompt cache breakpoints.
+
+    Add this middleware last so it sees the fully assembled system prompt.
+    """
+
+    def __init__(self, *, breakpoints: int = 2, ttl: str = "5m") -> None:
+        """Initialize the prompt caching middleware.
+
+        Args:
+            breakpoints: Number of trailing system blocks to mark with
+                ``cache_control`` (Anthropic allows at most 4 per request).
+            ttl: Anthropic cache TTL ("5m" or "1h").
+        """
+        self.breakpoints = breakpoints
+        self.ttl = ttl
+
+    def _prepare(self, request: ModelRequest) -> ModelRequest:
+        blocks = system_prompt_blocks(request)
+        if not blocks:
+            return request
+
+        if not _is_anthropic(request.model):
+            # Implicit prefix caching: keep the prompt a single, stable string
+            if len(blocks) == 1 and not isinstance(request.system_message.content, list):
+                return request
+            text = "\n\n".join(block.get("text", "") for block in blocks)
+            return request.override(system_message=SystemMessage(content=text))
+
+        for block in blocks[-self.breakpoints :] if self.breakpoints else []:
+            block["cache_control"] = {"type": "ephemeral", "ttl": self.ttl}
+        return request.override(system_message=SystemMessage(content=blocks))
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], ModelResponse],
+    ) -> ModelResponse:
+        """Apply cache breakpoints to the system prompt.
+
+        Args:
+            request: The model request being processed.
+            handler: The handler function to call with the modified request.
+
+        Returns:
+            The model response from the handler.
+        """
+        return handler(self._prepare(request))
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
+    ) -> ModelResponse:
+        """(async) Apply cache breakpoints to the system prompt.
+
+        Args:
+            request: The model request being processed.
+            handler: The handler function to call with the modified request.
+
+        Returns:
+            The model response from the handler.
+        """
+        return await handler(self._prepare(request))
@@ -2,21 +2,496 @@
 
 from __future__ import annotations
 
+import asyncio
+import codecs
 import os
+import signal
 import subprocess
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable, Mapping
+from concurrent.futures import CancelledError
+from contextlib import AbstractAsyncContextManager, AbstractContextManager, nullcontext
+from dataclasses import dataclass, fields, replace
+from pathlib import Path
 from typing import Any
 
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None  # type: ignore[assignment]
+
 from langchain.agents.middleware.types import AgentMiddleware, AgentState
-from langchain.tools import ToolRuntime, tool
+from langchain.tools import ToolRuntime
 from langchain_core.messages import ToolMessage
+from langchain_core.tools import StructuredTool
 from langchain_core.tools.base import ToolException
 
+from deepagents_cli.shell_scheduler import (
+    CANCELLED,
+    COMPLETED,
+    FAILED,
+    QUEUED,
+    RUNNING,
+    TIMED_OUT,
+    ShellJob,
+    ShellScheduler,
+    SlotTimeoutError,
+)
+
+# Custom stream event emitted for batches of command output (see _LiveOutput)
+SHELL_OUTPUT_EVENT = "shell_output"
+
+# Read size for streaming output
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Minimum seconds between two live output events of the same stream
+_LIVE_OUTPUT_INTERVAL = 0.25
+
+_LIVE_OUTPUT_TRUNCATED = "\n… output truncated (the full result is shown when the command finishes)\n"
+
+# Share of the output budget kept from the start of the output (the rest comes from the end)
+_HEAD_FRACTION = 0.25
+
+
+@dataclass(frozen=True)
+class ShellLimits:
+    """Resource limits applied to every shell command (``None`` means unlimited).
+
+    Limits are applied by a small ``bash`` wrapper that runs ``ulimit`` and then
+    ``exec``s the command (``preexec_fn`` is not safe in the threaded server), so
+    they apply to each process the command starts.
+
+    ``max_processes`` (``RLIMIT_NPROC``) is the exception: Linux counts it across
+    all processes and threads of the same real user id. Every command runs as the
+    server's user, so the count includes the server itself and every other user's
+    commands; set it well above the server's own thread count, or a busy server
+    makes ``fork`` fail in every command.
+    """
+
+    cpu_seconds: int | None = None
+    """CPU time per process; exceeding it kills the process with SIGXCPU."""
+    memory_bytes: int | None = None
+    """Address space per process; allocations beyond it fail."""
+    max_processes: int | None = None
+    """Maximum number of processes/threads of the user id (including the server)."""
+    max_open_files: int | None = None
+    """Maximum number of open file descriptors per process."""
+    max_file_bytes: int | None = None
+    """Maximum size of a file written by the command; exceeding it raises SIGXFSZ."""
+    wall_seconds: float | None = None
+    """Wall-clock timeout; overrides the middleware ``timeout`` when set."""
+
+    @classmethod
+    def from_mapping(cls, data: Mapping[str, Any]) -> ShellLimits:
+        """Build limits from a mapping, ignoring unknown keys."""
+        return cls().merged(data)
+
+    def merged(self, overrides: Mapping[str, Any]) -> ShellLimits:
+        """Return a copy with the given fields replaced (unknown keys are ignored)."""
+        names = {f.name for f in fields(self)}
+        return replace(self, **{k: v for k, v in overrides.items() if k in names})
+
+    def _ulimit_script(self) -> str:
+        """Return the ``ulimit`` commands for the configured limits (empty if none)."""
+        if resource is None:
+            return ""
+        # (resource, bash ulimit flag, bytes per ulimit unit, value)
+        specs = [
+            (resource.RLIMIT_CPU, "t", 1, self.cpu_seconds),
+            (resource.RLIMIT_AS, "v", 1024, self.memory_bytes),
+            (resource.RLIMIT_NPROC, "u", 1, self.max_processes),
+            (resource.RLIMIT_NOFILE, "n", 1, self.max_open_files),
+            (resource.RLIMIT_FSIZE, "f", 1024, self.max_file_bytes),
+        ]
+        commands = []
+        for res, flag, unit, value in specs:
+            if value is None:
+                continue
+            value = int(value)
+            # CPU: SIGXCPU at the soft limit, SIGKILL one second later at the hard limit
+            limit = value + 1 if res == resource.RLIMIT_CPU else value
+            # Children inherit the server's limits; an unprivileged process cannot raise the hard one
+            _, hard = resource.getrlimit(res)
+            if hard != resource.RLIM_INFINITY:
+                value, limit = min(value, hard), min(limit, hard)
+            # Soft first: the hard limit cannot drop below the current soft one
+            commands.append(f"ulimit -S -{flag} {-(-value // unit)}")
+            commands.append(f"ulimit -H -{flag} {-(-limit // unit)}")
+        return " && ".join(commands)
+
+    def wrap(self, argv: list[str]) -> list[str]:
+        """Return ``argv`` prefixed with a wrapper that applies the limits and ``exec``s it.
+
+        If a limit cannot be set, the wrapper exits with status 1 without running
+        the command.
+        """
+        script = self._ulimit_script()
+        if not script:
+            return argv
+        return ["/bin/bash", "--noprofile", "--norc", "-c", f'{script} && exec "$@"', "bash", *argv]
+
+
+# Signals sent by the kernel when a resource limit is exceeded
+_LIMIT_SIGNALS = {
+    signal.SIGXCPU: "CPU time limit exceeded",
+    signal.SIGXFSZ: "file size limit exceeded",
+}
+
+
+def _describe_exit(returncode: int) -> str:
+    """Explain exit codes caused by resource limits (direct or via ``sh -c``)."""
+    signum = -returncode if returncode < 0 else returncode - 128
+    reason = _LIMIT_SIGNALS.get(signum) if signum > 0 else None
+    return f" ({signal.Signals(signum).name}: {reason})" if reason else ""
+
+
+def _kill_process_group(pid: int) -> None:
+    """Kill a command together with every process it started."""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _trim_middle(data: bytes, limit: int, head_bytes: int) -> tuple[bytes, bytes, int]:
+    """Split data into (head, tail, omitted) so that head + tail fits in limit."""
+    if len(data) <= limit:
+        return data, b"", 0
+    head = data[:head_bytes]
+    tail = data[len(data) - (limit - head_bytes) :] if limit > head_bytes else b""
+    return head, tail, len(data) - len(head) - len(tail)
+
+
+def _omitted_marker(omitted: int) -> bytes:
+    return f"\n... [{omitted} bytes omitted] ...\n".encode()
+
+
+class _SpillFile:
+    """Full command output written to disk while it streams (up to a size limit)."""
+
+    def __init__(self, path: Path, max_bytes: int) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.complete = True
+        self.referenced = False
+        """Whether the tool result points the agent to this file."""
+        self._file = path.open("wb")
+        self._lock = threading.Lock()
+
+    def write(self, data: bytes) -> None:
+        with self._lock:
+            if self.size >= self.max_bytes:
+                self.complete = False
+                return
+            kept = data[: self.max_bytes - self.size]
+            self._file.write(kept)
+            self.size += len(kept)
+            if len(kept) < len(data):
+                self.complete = False
+
+    def close(self, *, keep: bool) -> None:
+        with self._lock:
+            self._file.close()
+        if not keep:
+            self.path.unlink(missing_ok=True)
+
+
+class _LiveOutput:
+    """Forward a stream to the UI: decoded incrementally, batched and capped.
+
+    Chunks are sent at most every ``_LIVE_OUTPUT_INTERVAL`` seconds, and after
+    ``max_bytes`` a truncation marker is sent instead of more output, so a
+    runaway command cannot flood the client.
+    """
+
+    def __init__(self, name: str, emit: Callable[[str, str], None], max_bytes: int) -> None:
+        self.name = name
+        self.max_bytes = max_bytes
+        self._emit = emit
+        # Multibyte characters may be split across chunks
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._pending: list[str] = []
+        self._sent = 0
+        self._last_emit = 0.0
+        self._timer: asyncio.TimerHandle | None = None
+        self._done = False
+
+    def feed(self, data: bytes) -> None:
+        if self._done:
+            return
+        kept = data[: self.max_bytes - self._sent]
+        self._sent += len(kept)
+        self._pending.append(self._decoder.decode(kept))
+        if len(kept) < len(data):
+            self._pending.append(self._decoder.decode(b"", final=True) + _LIVE_OUTPUT_TRUNCATED)
+            self._done = True
+            self._flush()
+            return
+
+        wait = self._last_emit + _LIVE_OUTPUT_INTERVAL - time.monotonic()
+        if wait <= 0:
+            self._flush()
+        elif self._timer is None:
+            # Send what is pending even if the command goes quiet
+            try:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._flush)
+            except RuntimeError:
+                pass
+
+    def close(self) -> None:
+        if not self._done:
+            self._pending.append(self._decoder.decode(b"", final=True))
+            self._done = True
+        self._flush()
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        text = "".join(self._pending)
+        self._pending.clear()
+        self._last_emit = time.monotonic()
+        if text:
+            self._emit(self.name, text)
+
+
+class _OutputCollector:
+    """Capture a stream in bounded memory: a fixed head buffer plus a tail ring buffer.
+
+    Every chunk is also forwarded to the UI (``live``) and to the spill file, if any.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        head_bytes: int,
+        tail_bytes: int,
+        live: _LiveOutput | None = None,
+        spill: _SpillFile | None = None,
+    ) -> None:
+        self.name = name
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.total = 0
+        self._live = live
+        self._spill = spill
+        self._head = bytearray()
+        self._tail = bytearray()
+
+    @property
+    def omitted(self) -> int:
+        """Number of bytes dropped between the head and the tail."""
+        return self.total - len(self._head) - len(self._tail)
+
+    def feed(self, data: bytes) -> None:
+        if not data:
+            return
+        self.total += len(data)
+        if self._spill is not None:
+            self._spill.write(data)
+        if self._live is not None:
+            self._live.feed(data)
+
+        room = self.head_bytes - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+            data = data[room:]
+        if data and self.tail_bytes:
+            self._tail += data[-self.tail_bytes :]
+            overflow = len(self._tail) - self.tail_bytes
+            if overflow > 0:
+                del self._tail[:overflow]
+
+    def close_live(self) -> None:
+        """Send the output still pending for the UI."""
+        if self._live is not None:
+            self._live.close()
+
+    def last(self, max_bytes: int) -> bytes:
+        """Return (up to) the last ``max_bytes`` bytes of the output."""
+        if self.omitted or len(self._tail) >= max_bytes:
+            return bytes(self._tail[-max_bytes:])
+        return bytes(self._head + self._tail)[-max_bytes:]
+
+    def content(self) -> bytes:
+        """Retained output, with a marker where bytes were omitted."""
+        if not self.omitted:
+            return bytes(self._head + self._tail)
+        return bytes(self._head) + _omitted_marker(self.omitted) + bytes(self._tail)
+
+
+def _format_output(
+    stdout: _OutputCollector,
+    stderr: _OutputCollector,
+    returncode: int | None,
+    max_output_bytes: int,
+    spill: _SpillFile | None = None,
+) -> tuple[str, str]:
+    """Combine stdout/stderr into the tool result.
+
+    Returns:
+        (output, status) where status is "success" or "error".
+    """
+    output_parts = []
+    stdout_text = stdout.content().decode("utf-8", errors="replace")
+    stderr_text = stderr.content().decode("utf-8", errors="replace")
+    if stdout_text:
+        output_parts.append(stdout_text)
+    if stderr_text:
+        stderr_lines = stderr_text.strip().split("\n")
+        for line in stderr_lines:
+            output_parts.append(f"[stderr] {line}")
+
+    output = "\n".join(output_parts) if output_parts else "<no output>"
+
+    # Keep the start and (mostly) the end of the output: errors usually come last
+    encoded = output.encode()
+    head, tail, trimmed = _trim_middle(
+        encoded, max_output_bytes, int(max_output_bytes * _HEAD_FRACTION)
+    )
+    omitted = stdout.omitted + stderr.omitted + trimmed
+    if trimmed:
+        # One marker for everything dropped (it replaces the per-stream markers it cut)
+        output = (head + _omitted_marker(omitted) + tail).decode("utf-8", errors="replace")
+
+    if omitted:
+        total = stdout.total + stderr.total
+        output += f"\n\n... Output truncated: {omitted} of {total} bytes omitted."
+        if spill is not None:
+            spill.referenced = True
+            saved = "Full output" if spill.complete else f"First {spill.size} bytes of output"
+            output += (
+                f" {saved} saved to {spill.path} (use read_file with offset/limit to page through it)."
+            )
+
+    # Add exit code info if non-zero
+    if returncode != 0:
+        return (
+            f"{output.rstrip()}\n\nExit code: {returncode}{_describe_exit(returncode)}",
+            "error",
+        )
+    return output, "success"
+
+
+class ShellSession:
+    """A long-lived bash process that keeps cwd, exported variables and venvs.
+
+    Each command is written to the shell's stdin followed by a unique sentinel
+    that is echoed (with the exit code) on both stdout and stderr, which marks
+    the end of the command's output.
+    """
+
+    def __init__(
+        self, workspace_root: str, env: dict[str, str], limits: ShellLimits | None = None
+    ) -> None:
+        self._workspace_root = workspace_root
+        self._env = env
+        self._limits = limits or ShellLimits()
+        self._process: asyncio.subprocess.Process | None = None
+        self.lock = asyncio.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    async def _start(self) -> asyncio.subprocess.Process:
+        self._process = await asyncio.create_subprocess_exec(
+            *self._limits.wrap(["/bin/bash", "--noprofile", "--norc"]),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=self._workspace_root,
+            env=self._env,
+            start_new_session=True,
+        )
+        return self._process
+
+    async def run(
+        self, command: str, stdout: _OutputCollector, stderr: _OutputCollector
+    ) -> int:
+        """Run a command in the session and return its exit code.
+
+        Raises:
+            EOFError: If the shell exited (e.g. the command ran ``exit``).
+        """
+        process = self._process if self.alive else await self._start()
+        sentinel = f"__DEEPAGENTS_DONE_{uuid.uuid4().hex}__"
+        # The command runs in the current shell (not a subshell) so cd/export persist.
+        # stdin is detached so commands cannot consume the following input.
+        script = (
+            f"{{\n{command}\n}} < /dev/null\n"
+            f"__deepagents_rc=$?\n"
+            f"printf '\\n{sentinel}%s\\n' \"$__deepagents_rc\"\n"
+            f"printf '\\n{sentinel}%s\\n' \"$__deepagents_rc\" >&2\n"
+        )
+        process.stdin.write(script.encode())
+        await process.stdin.drain()
+
+        _, returncode = await asyncio.gather(
+            self._read_until_sentinel(process.stderr, sentinel, stderr),
+            self._read_until_sentinel(process.stdout, sentinel, stdout),
+        )
+        return returncode
+
+    @staticmethod
+    async def _read_until_sentinel(
+        stream: asyncio.StreamReader, sentinel: str, collector: _OutputCollector
+    ) -> int:
+        marker = f"\n{sentinel}".encode()
+        buffer = b""
+        while True:
+            data = await stream.read(_STREAM_CHUNK_SIZE)
+            if not data:
+                raise EOFError("shell session exited")
+            buffer += data
+            index = buffer.find(marker)
+            if index != -1:
+                collector.feed(buffer[:index])
+                rest = buffer[index + len(marker) :]
+                while b"\n" not in rest:
+                    more = await stream.read(64)
+                    if not more:
+                        raise EOFError("shell session exited")
+                    rest += more
+                return int(rest.split(b"\n", 1)[0] or 0)
+            # Forward everything that cannot be the start of the marker
+            safe = len(buffer) - len(marker)
+            if safe > 0:
+                collector.feed(buffer[:safe])
+                buffer = buffer[safe:]
+
+    async def close(self) -> None:
+        if self._process is None or self._process.returncode is not None:
+            return
+        _kill_process_group(self._process.pid)
+        await self._process.wait()
+
+    def kill(self) -> None:
+        """Kill the shell and everything it started, without waiting (callable from any thread)."""
+        if self.alive:
+            _kill_process_group(self._process.pid)
+
 
 class ShellMiddleware(AgentMiddleware[AgentState, Any]):
     """Give basic shell access to agents via the shell.
 
     This shell will execute on the local machine and has NO safeguards except
     for the human in the loop safeguard provided by the CLI itself.
+
+    When invoked asynchronously, commands run without blocking the event loop and
+    their output is streamed to the client as custom stream events
+    (``{"type": "shell_output", "tool_call_id", "stream", "data"}``). With
+    ``persistent_session`` each thread gets a long-lived bash process, so ``cd``,
+    exported variables and activated virtualenvs carry over between calls.
+
+    With a shared ``scheduler``, commands of all users run under common
+    concurrency limits, and ``enable_jobs`` adds tools to run long commands in
+    the background (``shell_job_start``/``status``/``tail``/``cancel``).
     """
 
     def __init__(
@@ -26,6 +501,16 @@ class ShellMiddleware(AgentMiddleware[AgentState, Any]):
         timeout: float = 120.0,
         max_output_bytes: int = 100_000,
         env: dict[str, str] | None = None,
+        persistent_session: bool = False,
+        max_sessions: int = 32,
+        spill_dir: str | Path | None = None,
+        max_spill_bytes: int = 64 * 1024 * 1024,
+        limits: ShellLimits | None = None,
+        scheduler: ShellScheduler | None = None,
+        user_id: str = "default",
+        enable_jobs: bool = False,
+        job_timeout: float = 3600.0,
+        queue_timeout: float | None = 60.0,
     ) -> None:
         """Initialize an instance of `ShellMiddleware`.
 
@@ -33,27 +518,70 @@ class ShellMiddleware(AgentMiddleware[AgentState, Any]):
             workspace_root: Working directory for shell commands.
             timeout: Maximum time in seconds to wait for command completion.
                 Defaults to 120 seconds.
-            max_output_bytes: Maximum number of bytes to capture from command output.
-                Defaults to 100,000 bytes.
+            max_output_bytes: Maximum number of bytes of command output returned to
+                the agent. Longer output keeps its start and end, and the number of
+                omitted bytes is reported. Defaults to 100,000 bytes.
             env: Environment variables to pass to the subprocess. If None,
                 uses the current process's environment. Defaults to None.
+            persistent_session: Keep one shell process per thread (async only).
+                Defaults to False.
+            max_sessions: Maximum number of live sessions; the least recently
+                used session is closed first. Defaults to 32.
+            spill_dir: Directory where the full output of truncated commands is
+                saved so the agent can page through it with read_file. If None,
+                output beyond ``max_output_bytes`` is discarded. Defaults to None.
+            max_spill_bytes: Maximum size of a single spill file. Defaults to 64 MiB.
+            limits: Resource limits for each command. ``limits.wall_seconds``, if
+                set, replaces ``timeout``. Defaults to no limits.
+            scheduler: Scheduler shared by all users that limits how many commands
+                run at once. If None, commands start immediately. Defaults to None.
+            user_id: User the commands are scheduled (and jobs owned) as.
+                Defaults to "default".
+            enable_jobs: Add the background job tools. Defaults to False.
+            job_timeout: Maximum run time in seconds of a background job.
+                Defaults to 3600 seconds.
+            queue_timeout: Maximum time in seconds a command waits for a
+                scheduler slot before an error is returned (None waits forever).
+                Defaults to 60 seconds.
         """
         super().__init__()
-        self._timeout = timeout
+        self._limits = limits or ShellLimits()
+        self._timeout = self._limits.wall_seconds or timeout
         self._max_output_bytes = max_output_bytes
         self._tool_name = "shell"
-        self._env = env if env is not None else os.environ.copy()
+        self._env = dict(env) if env is not None else os.environ.copy()
         self._workspace_root = workspace_root
+        self._persistent_session = persistent_session
+        self._max_sessions = max_sessions
+        self._sessions: OrderedDict[str, ShellSession] = OrderedDict()
+        self._closed = False
+        self._spill_dir = Path(spill_dir) if spill_dir is not None else None
+        self._max_spill_bytes = max_spill_bytes
+        self._scheduler = scheduler
+        self._user_id = user_id
+        # Background jobs always go through a scheduler (a private one if none is shared)
+        self._job_scheduler = scheduler or ShellScheduler()
+        self._enable_jobs = enable_jobs
+        self._job_timeout = job_timeout
+        self._queue_timeout = queue_timeout
 
         # Build description with working directory information
+        if persistent_session:
+            session_note = (
+                "Commands in the same conversation share one shell session, so the current "
+                "directory, exported variables and activated environments persist between calls."
+            )
+        else:
+            session_note = (
+                "Each command runs in a fresh shell environment with the current process's "
+                "environment variables."
+            )
         description = (
             f"Execute a shell command directly on the host. Commands will run in "
-            f"the working directory: {workspace_root}. Each command runs in a fresh shell "
-            f"environment with the current process's environment variables. Commands may "
+            f"the working directory: {workspace_root}. {session_note} Commands may "
             f"be truncated if they exceed the configured timeout or output limits."
         )
 
-        @tool(self._tool_name, description=description)
         def shell_tool(
             command: str,
             runtime: ToolRuntime[None, AgentState],
@@ -66,8 +594,27 @@ class ShellMiddleware(AgentMiddleware[AgentState, Any]):
             """
             return self._run_shell_command(command, tool_call_id=runtime.tool_call_id)
 
-        self._shell_tool = shell_tool
+        async def ashell_tool(
+            command: str,
+            runtime: ToolRuntime[None, AgentState],
+        ) -> ToolMessage | str:
+            """Execute a shell command.
+
+            Args:
+                command: The shell command to execute.
+                runtime: The tool runtime context.
+            """
+            return await self._arun_shell_command(command, runtime=runtime)
+
+        self._shell_tool = StructuredTool.from_function(
+            func=shell_tool,
+            coroutine=ashell_tool,
+            name=self._tool_name,
+            description=description,
+        )
         self.tools = [self._shell_tool]
+        if enable_jobs:
+            self.tools.extend(self._job_tools())
 
     def _run_shell_command(
         self,
@@ -88,44 +635,97 @@ class ShellMiddleware(AgentMiddleware[AgentState, Any]):
             msg = "Shell tool expects a non-empty command string."
             raise ToolException(msg)
 
+        spill = self._open_spill(tool_call_id)
+        stdout, stderr = self._collectors(spill=spill)
         try:
-            result = subprocess.run(
-                command,
-                check=False,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=self._timeout,
-                env=self._env,
-                cwd=self._workspace_root,
+            with self._slot():
+                returncode = self._run_subprocess_sync(command, stdout, stderr)
+            output, status = _format_output(
+                stdout, stderr, returncode, self._max_output_bytes, spill
             )
+        except subprocess.TimeoutExpired:
+            output = self._timeout_message(stdout, stderr)
+            status = "error"
+        except SlotTimeoutError as e:
+            output = self._busy_message(e)
+            status = "error"
+        finally:
+            self._close_spill(spill)
 
-            # Combine stdout and stderr
-            output_parts = []
-            if result.stdout:
-                output_parts.append(result.stdout)
-            if result.stderr:
-                stderr_lines = result.stderr.strip().split("\n")
-                for line in stderr_lines:
-                    output_parts.append(f"[stderr] {line}")
-
-            output = "\n".join(output_parts) if output_parts else "<no output>"
-
-            # Truncate output if needed
-            if len(output) > self._max_output_bytes:
-                output = output[: self._max_output_bytes]
-                output += f"\n\n... Output truncated at {self._max_output_bytes} bytes."
-
-            # Add exit code info if non-zero
-            if result.returncode != 0:
-                output = f"{output.rstrip()}\n\nExit code: {result.returncode}"
-                status = "error"
-            else:
-                status = "success"
+        return ToolMessage(
+            content=output,
+            tool_call_id=tool_call_id,
+            name=self._tool_name,
+            status=status,
+        )
 
-        except subprocess.TimeoutExpired:
-            output = f"Error: Command timed out after {self._timeout:.1f} seconds."
+    async def _arun_shell_command(
+        self,
+        command: str,
+        *,
+        runtime: ToolRuntime[None, AgentState],
+    ) -> ToolMessage | str:
+        """Execute a shell command without blocking the event loop, streaming its output.
+
+        Args:
+            command: The shell command to execute.
+            runtime: The tool runtime context.
+
+        Returns:
+            A ToolMessage with the command output or an error message.
+        """
+        if not command or not isinstance(command, str):
+            msg = "Shell tool expects a non-empty command string."
+            raise ToolException(msg)
+
+        tool_call_id = runtime.tool_call_id
+        writer = getattr(runtime, "stream_writer", None)
+
+        def emit(stream: str, data: str) -> None:
+            if writer is None or not data:
+                return
+            try:
+                writer(
+                    {
+                        "type": SHELL_OUTPUT_EVENT,
+                        "tool_call_id": tool_call_id,
+                        "stream": stream,
+                        "data": data,
+                    }
+                )
+            except Exception:  # noqa: BLE001
+                # Streaming is best effort; the full result is still returned
+                pass
+
+        spill = self._open_spill(tool_call_id)
+        stdout, stderr = self._collectors(emit=emit, spill=spill)
+        try:
+            # Waiting for a slot does not count against the timeout
+            async with self._aslot():
+                if self._persistent_session:
+                    returncode = await self._run_in_session(command, runtime, stdout, stderr)
+                else:
+                    returncode = await asyncio.wait_for(
+                        self._run_subprocess(command, stdout, stderr), self._timeout
+                    )
+            output, status = _format_output(
+                stdout, stderr, returncode, self._max_output_bytes, spill
+            )
+        except SlotTimeoutError as e:
+            output = self._busy_message(e)
             status = "error"
+        except TimeoutError:
+            output = self._timeout_message(stdout, stderr)
+            if self._persistent_session:
+                output += " The shell session was restarted."
+            status = "error"
+        except EOFError:
+            output = "Error: The shell session exited. A new session will be started on the next command."
+            status = "error"
+        finally:
+            stdout.close_live()
+            stderr.close_live()
+            self._close_spill(spill)
 
         return ToolMessage(
             content=output,
@@ -134,5 +734,339 @@ class ShellMiddleware(AgentMiddleware[AgentState, Any]):
             status=status,
         )
 
+    def _slot(self) -> AbstractContextManager[None]:
+        if self._scheduler is None:
+            return nullcontext()
+        return self._scheduler.slot(self._user_id, self._queue_timeout)
+
+    def _aslot(self) -> AbstractAsyncContextManager[None]:
+        if self._scheduler is None:
+            return nullcontext()
+        return self._scheduler.aslot(self._user_id, self._queue_timeout)
+
+    def _busy_message(self, error: SlotTimeoutError) -> str:
+        output = f"Error: {error}; the command was not run. Try again shortly."
+        if self._enable_jobs:
+            output += " Long-running commands should use shell_job_start instead."
+        return output
+
+    def _collectors(
+        self, *, emit: Callable[[str, str], None] | None = None, spill: _SpillFile | None = None
+    ) -> tuple[_OutputCollector, _OutputCollector]:
+        # Each stream keeps at most max_output_bytes in memory, however much it writes
+        head = int(self._max_output_bytes * _HEAD_FRACTION)
+        tail = self._max_output_bytes - head
+
+        def collector(name: str) -> _OutputCollector:
+            # The UI is sent no more than the head of each stream
+            live = _LiveOutput(name, emit, head) if emit is not None else None
+            return _OutputCollector(name, head, tail, live, spill)
+
+        return collector("stdout"), collector("stderr")
+
+    def _open_spill(self, tool_call_id: str | None) -> _SpillFile | None:
+        if self._spill_dir is None:
+            return None
+        name = tool_call_id or uuid.uuid4().hex
+        try:
+            return _SpillFile(self._spill_dir / f"{name}.log", self._max_spill_bytes)
+        except OSError:
+            # Spilling is optional; fall back to head/tail capture only
+            return None
+
+    @staticmethod
+    def _close_spill(spill: _SpillFile | None) -> None:
+        if spill is not None:
+            # Keep the file only when the result had to be truncated
+            spill.close(keep=spill.referenced)
+
+    def _timeout_message(self, stdout: _OutputCollector, stderr: _OutputCollector) -> str:
+        output = f"Error: Command timed out after {self._timeout:.1f} seconds."
+        if stdout.total or stderr.total:
+            partial, _ = _format_output(stdout, stderr, 0, self._max_output_bytes)
+            output += f" Output before the timeout:\n\n{partial}"
+        return output
+
+    def _run_subprocess_sync(
+        self, command: str, stdout: _OutputCollector, stderr: _OutputCollector
+    ) -> int:
+        process = subprocess.Popen(
+            self._limits.wrap(["/bin/sh", "-c", command]),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=self._env,
+            cwd=self._workspace_root,
+            # Own process group, so a timeout also kills everything the command started
+            start_new_session=True,
+        )
+
+        def pump(stream: Any, collector: _OutputCollector) -> None:
+            with stream:
+                while data := stream.read1(_STREAM_CHUNK_SIZE):
+                    collector.feed(data)
+
+        readers = [
+            threading.Thread(target=pump, args=(process.stdout, stdout), daemon=True),
+            threading.Thread(target=pump, args=(process.stderr, stderr), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+        try:
+            returncode = process.wait(timeout=self._timeout)
+        except subprocess.TimeoutExpired:
+            _kill_process_group(process.pid)
+            process.wait()
+            raise
+        finally:
+            for reader in readers:
+                # Background children may keep the pipes open; don't wait on them forever
+                reader.join(timeout=1.0)
+        return returncode
+
+    async def _run_subprocess(
+        self, command: str, stdout: _OutputCollector, stderr: _OutputCollector
+    ) -> int:
+        process = await asyncio.create_subprocess_exec(
+            *self._limits.wrap(["/bin/sh", "-c", command]),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=self._env,
+            cwd=self._workspace_root,
+            # Own process group, so a timeout also kills everything the command started
+            start_new_session=True,
+        )
+
+        async def pump(stream: asyncio.StreamReader, collector: _OutputCollector) -> None:
+            while data := await stream.read(_STREAM_CHUNK_SIZE):
+                collector.feed(data)
+
+        try:
+            await asyncio.gather(pump(process.stdout, stdout), pump(process.stderr, stderr))
+            return await process.wait()
+        except asyncio.CancelledError:
+            # Timed out (wait_for) or the run was cancelled: don't leave the process behind
+            _kill_process_group(process.pid)
+            if process.returncode is None:
+                await process.wait()
+            raise
+
+    async def _run_in_session(
+        self,
+        command: str,
+        runtime: ToolRuntime[None, AgentState],
+        stdout: _OutputCollector,
+        stderr: _OutputCollector,
+    ) -> int:
+        thread_id = str((runtime.config or {}).get("configurable", {}).get("thread_id", "default"))
+        session = self._sessions.get(thread_id)
+        if session is None:
+            session = self._sessions[thread_id] = ShellSession(
+                self._workspace_root, self._env, self._limits
+            )
+            while len(self._sessions) > self._max_sessions:
+                _, evicted = self._sessions.popitem(last=False)
+                await evicted.close()
+        self._sessions.move_to_end(thread_id)
+
+        # Calls from the same thread run one at a time in its session
+        async with session.lock:
+            try:
+                return await asyncio.wait_for(session.run(command, stdout, stderr), self._timeout)
+            except (TimeoutError, EOFError):
+                await session.close()
+                raise
+            finally:
+                if self._closed:
+                    # The middleware was discarded while this command ran
+                    await session.close()
+
+    def close(self) -> None:
+        """Kill the persistent shell sessions (e.g. when the agent graph is discarded).
+
+        Idle sessions are killed right away; a session running a command is
+        closed when the command finishes. Background jobs belong to the
+        scheduler and keep running.
+        """
+        self._closed = True
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        for session in sessions:
+            if not session.lock.locked():
+                session.kill()
+
+    # ---- background jobs ----
+
+    def _job_tools(self) -> list[StructuredTool]:
+        def shell_job_start(command: str) -> str:
+            """Start a shell command in the background and return its job id.
+
+            Use this for long-running builds, tests or data processing instead of
+            the shell tool. stdout and stderr are combined. Check progress with
+            shell_job_status and shell_job_tail.
+
+            Args:
+                command: The shell command to run.
+            """
+            return self._start_job(command)
+
+        def shell_job_status(job_id: str | None = None) -> str:
+            """Show the status of a background job, or of all jobs if no id is given.
+
+            Args:
+                job_id: Job id returned by shell_job_start.
+            """
+            if job_id is None:
+                jobs = self._job_scheduler.list_jobs(self._user_id)
+                return "\n".join(_describe_job(job) for job in jobs) or "No background jobs."
+            job = self._job_scheduler.get_job(self._user_id, job_id)
+            return _describe_job(job) if job else f"Error: Job '{job_id}' not found."
+
+        def shell_job_tail(job_id: str, max_bytes: int = 4000) -> str:
+            """Show the latest output of a background job.
+
+            Args:
+                job_id: Job id returned by shell_job_start.
+                max_bytes: Maximum number of bytes of output to return.
+            """
+            job = self._job_scheduler.get_job(self._user_id, job_id)
+            if job is None:
+                return f"Error: Job '{job_id}' not found."
+            with job.lock:
+                data = job.output.last(max(1, min(max_bytes, self._max_output_bytes)))
+                total = job.output.total
+            text = data.decode("utf-8", errors="replace") or "<no output yet>"
+            header = f"{_describe_job(job)}\n(last {len(data)} of {total} bytes)"
+            if job.log_path:
+                header += f"\nFull output: {job.log_path}"
+            return f"{header}\n\n{text}"
+
+        def shell_job_cancel(job_id: str) -> str:
+            """Cancel a queued or running background job.
+
+            Args:
+                job_id: Job id returned by shell_job_start.
+            """
+            job = self._job_scheduler.get_job(self._user_id, job_id)
+            if job is None:
+                return f"Error: Job '{job_id}' not found."
+            if not self._stop_job(job, CANCELLED):
+                return f"Job {job_id} already finished ({job.status})."
+            return f"Cancelled job {job_id}."
+
+        return [
+            StructuredTool.from_function(func=func, parse_docstring=True)
+            for func in (shell_job_start, shell_job_status, shell_job_tail, shell_job_cancel)
+        ]
+
+    def _start_job(self, command: str) -> str:
+        if not command or not isinstance(command, str):
+            msg = "shell_job_start expects a non-empty command string."
+            raise ToolException(msg)
+
+        head = int(self._max_output_bytes * _HEAD_FRACTION)
+        job_id = uuid.uuid4().hex[:8]
+        spill = self._open_spill(f"job-{job_id}")
+        job = ShellJob(
+            id=job_id,
+            owner=self._user_id,
+            command=command,
+            output=_OutputCollector("output", head, self._max_output_bytes - head, spill=spill),
+            log_path=str(spill.path) if spill else None,
+        )
+        try:
+            self._job_scheduler.add_job(job)
+        except ValueError as e:
+            if spill is not None:
+                spill.close(keep=False)
+            return f"Error: {e}"
+
+        job.grant = self._job_scheduler.acquire_job(self._user_id)
+        threading.Thread(
+            target=self._run_job, args=(job, spill), name=f"shell-job-{job_id}", daemon=True
+        ).start()
+        return (
+            f"Started background job {job_id}. Use shell_job_status('{job_id}') to check "
+            f"on it and shell_job_tail('{job_id}') to read its output."
+        )
+
+    def _run_job(self, job: ShellJob, spill: _SpillFile | None) -> None:
+        try:
+            job.grant.result()
+        except CancelledError:
+            # Cancelled while queued
+            if spill is not None:
+                spill.close(keep=True)
+            return
+
+        try:
+            with job.lock:
+                if job.status != QUEUED:
+                    return
+                process = subprocess.Popen(
+                    self._limits.wrap(["/bin/sh", "-c", job.command]),
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    env=self._env,
+                    cwd=self._workspace_root,
+                    start_new_session=True,
+                )
+                job.pid = process.pid
+                job.status = RUNNING
+                job.started_at = time.time()
+
+            timer = threading.Timer(self._job_timeout, self._stop_job, args=(job, TIMED_OUT))
+            timer.daemon = True
+            timer.start()
+            try:
+                with process.stdout as stream:
+                    while data := stream.read1(_STREAM_CHUNK_SIZE):
+                        with job.lock:
+                            job.output.feed(data)
+                returncode = process.wait()
+            finally:
+                timer.cancel()
+
+            with job.lock:
+                job.returncode = returncode
+                if job.status == RUNNING:
+                    job.status = COMPLETED if returncode == 0 else FAILED
+        except OSError as e:
+            with job.lock:
+                job.output.feed(f"Error: {e}".encode())
+                job.status = FAILED
+        finally:
+            with job.lock:
+                job.finished_at = time.time()
+            self._job_scheduler.release_job(job.owner)
+            if spill is not None:
+                spill.close(keep=True)
+
+    @staticmethod
+    def _stop_job(job: ShellJob, status: str) -> bool:
+        """Cancel or expire a job. Returns False if it already finished."""
+        with job.lock:
+            if not job.active:
+                return False
+            if job.status == QUEUED and job.grant is not None and job.grant.cancel():
+                job.finished_at = time.time()
+            elif job.pid is not None:
+                _kill_process_group(job.pid)
+            # Otherwise the slot was just granted: the job thread sees the status and stops
+            job.status = status
+        return True
+
+
+def _describe_job(job: ShellJob) -> str:
+    line = f"{job.id} [{job.status}]"
+    if job.started_at is not None:
+        line += f" {job.elapsed:.1f}s"
+    if job.returncode is not None:
+        line += f" exit={job.returncode}{_describe_exit(job.returncode)}"
+    command = job.command if len(job.command) <= 120 else job.command[:117] + "..."
+    return f"{line} $ {command}"
+
 
-__all__ = ["ShellMiddleware"]
\ No newline at end of file
+__all__ = ["ShellLimits", "ShellMiddleware"]
@@ -0,0 +1,271 @@
+"""Fair, per-user scheduling of shell commands and background jobs.
+
+A single ``ShellScheduler`` is shared by the shell middleware of every user.
+It limits how many commands run at once (overall and per user), and hands out
+free slots round-robin across users, so one user with many parallel subagents
+cannot starve the others. Slots are granted through ``concurrent.futures``
+futures, which can be awaited from any event loop or waited on from threads.
+
+The scheduler also keeps the registry of background jobs started with the
+``shell_job_*`` tools. Jobs run in a pool of their own with their own per-user
+cap: a job may run for an hour and must not hold up foreground commands.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from collections.abc import AsyncIterator, Iterator
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed_out"
+
+_ACTIVE_STATES = frozenset({QUEUED, RUNNING})
+
+
+@dataclass
+class ShellJob:
+    """A shell command running in the background."""
+
+    id: str
+    owner: str
+    command: str
+    output: Any
+    """Bounded capture of the combined stdout/stderr (``_OutputCollector``)."""
+    status: str = QUEUED
+    returncode: int | None = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    pid: int | None = None
+    log_path: str | None = None
+    """File with the full output, if output spilling is enabled."""
+    grant: Future | None = field(default=None, repr=False)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def active(self) -> bool:
+        """Whether the job is still queued or running."""
+        return self.status in _ACTIVE_STATES
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds the job has been running (or ran)."""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+
+class SlotTimeoutError(TimeoutError):
+    """No slot became free within the allowed wait."""
+
+
+class _Pool:
+    """Slots with an overall and a per-user limit, granted round-robin across users."""
+
+    def __init__(self, max_concurrency: int, max_per_user: int) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_per_user = max_per_user
+        self._lock = threading.Lock()
+        self._running: Counter[str] = Counter()
+        # Users with waiting requests, in round-robin order
+        self._waiting: OrderedDict[str, deque[Future]] = OrderedDict()
+
+    def acquire(self, user_id: str) -> Future:
+        grant: Future = Future()
+        with self._lock:
+            self._waiting.setdefault(user_id, deque()).append(grant)
+            self._dispatch()
+        return grant
+
+    def release(self, user_id: str) -> None:
+        with self._lock:
+            self._running[user_id] -= 1
+            if self._running[user_id] <= 0:
+                del self._running[user_id]
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        # Called with the lock held: grant free slots, one user at a time
+        while self._waiting and self._running.total() < self.max_concurrency:
+            for user_id, queue in self._waiting.items():
+                if self._running[user_id] < self.max_per_user:
+                    break
+            else:
+                return
+
+            grant = queue.popleft()
+            if queue:
+                # The user goes to the back of the line for their next request
+                self._waiting.move_to_end(user_id)
+            else:
+                del self._waiting[user_id]
+            if grant.set_running_or_notify_cancel():
+                self._running[user_id] += 1
+                grant.set_result(None)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "running": dict(self._running),
+                "queued": {
+                    user_id: sum(not grant.cancelled() for grant in queue)
+                    for user_id, queue in self._waiting.items()
+                },
+            }
+
+
+class ShellScheduler:
+    """Concurrency limits with round-robin fairness across users.
+
+    Foreground commands and background jobs use separate pools, so long-running
+    jobs never hold the slots the ``shell`` tool waits for.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = 4,
+        max_per_user: int = 2,
+        max_job_concurrency: int = 4,
+        max_running_jobs_per_user: int = 1,
+        max_jobs_per_user: int = 8,
+        max_finished_jobs: int = 32,
+    ) -> None:
+        """Initialize the scheduler.
+
+        Args:
+            max_concurrency: Foreground commands running at once.
+            max_per_user: Foreground commands a single user may run at once.
+            max_job_concurrency: Background jobs running at once.
+            max_running_jobs_per_user: Background jobs a single user may run at
+                once (the rest wait in the queue).
+            max_jobs_per_user: Background jobs a user may have queued or running.
+            max_finished_jobs: Finished jobs kept per user for polling (oldest
+                are dropped first).
+        """
+        self.max_jobs_per_user = max_jobs_per_user
+        self.max_finished_jobs = max_finished_jobs
+        self._commands = _Pool(max_concurrency, max_per_user)
+        self._job_slots = _Pool(max_job_concurrency, max_running_jobs_per_user)
+        self._lock = threading.Lock()
+        self._jobs: dict[str, OrderedDict[str, ShellJob]] = {}
+
+    # ---- slots ----
+
+    def acquire(self, user_id: str) -> Future:
+        """Queue a request for a foreground command slot.
+
+        Returns:
+            A future resolved when the slot is granted. Cancel it to leave the
+            queue; once resolved, the slot must be given back with ``release``.
+        """
+        return self._commands.acquire(user_id)
+
+    def release(self, user_id: str) -> None:
+        """Give back a slot granted by ``acquire``."""
+        self._commands.release(user_id)
+
+    def acquire_job(self, user_id: str) -> Future:
+        """Queue a request for a background job slot (see ``acquire``)."""
+        return self._job_slots.acquire(user_id)
+
+    def release_job(self, user_id: str) -> None:
+        """Give back a slot granted by ``acquire_job``."""
+        self._job_slots.release(user_id)
+
+    def _give_up(self, grant: Future, user_id: str) -> None:
+        # Leave the queue; if the slot was granted in the meantime, hand it back
+        if not grant.cancel() and not grant.cancelled():
+            self.release(user_id)
+
+    @contextmanager
+    def slot(self, user_id: str, timeout: float | None = None) -> Iterator[None]:
+        """Hold a slot for the duration of the block (blocking wait).
+
+        Raises:
+            SlotTimeoutError: If no slot was granted within ``timeout`` seconds.
+        """
+        grant = self.acquire(user_id)
+        try:
+            grant.result(timeout)
+        except TimeoutError:
+            self._give_up(grant, user_id)
+            msg = f"No shell slot became free within {timeout:.0f} seconds"
+            raise SlotTimeoutError(msg) from None
+        try:
+            yield
+        finally:
+            self.release(user_id)
+
+    @asynccontextmanager
+    async def aslot(self, user_id: str, timeout: float | None = None) -> AsyncIterator[None]:
+        """Hold a slot for the duration of the block (async wait).
+
+        Raises:
+            SlotTimeoutError: If no slot was granted within ``timeout`` seconds.
+        """
+        grant = self.acquire(user_id)
+        try:
+            await asyncio.wait_for(asyncio.wrap_future(grant), timeout)
+        except TimeoutError:
+            self._give_up(grant, user_id)
+            msg = f"No shell slot became free within {timeout:.0f} seconds"
+            raise SlotTimeoutError(msg) from None
+        except asyncio.CancelledError:
+            # Granted just before the caller was cancelled: don't leak the slot
+            self._give_up(grant, user_id)
+            raise
+        try:
+            yield
+        finally:
+            self.release(user_id)
+
+    def stats(self) -> dict[str, Any]:
+        """Return running and queued counts per user (commands, and jobs under "jobs")."""
+        return {**self._commands.stats(), "jobs": self._job_slots.stats()}
+
+    # ---- background jobs ----
+
+    def add_job(self, job: ShellJob) -> None:
+        """Register a background job.
+
+        Raises:
+            ValueError: If the owner already has ``max_jobs_per_user`` active jobs.
+        """
+        with self._lock:
+            jobs = self._jobs.setdefault(job.owner, OrderedDict())
+            if sum(j.active for j in jobs.values()) >= self.max_jobs_per_user:
+                msg = (
+                    f"Too many background jobs ({self.max_jobs_per_user} queued or running). "
+                    "Wait for one to finish or cancel one first."
+                )
+                raise ValueError(msg)
+            jobs[job.id] = job
+            finished = [j.id for j in jobs.values() if not j.active]
+            for job_id in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+                del jobs[job_id]
+
+    def get_job(self, owner: str, job_id: str) -> ShellJob | None:
+        """Return one of the owner's jobs."""
+        with self._lock:
+            return self._jobs.get(owner, {}).get(job_id)
+
+    def list_jobs(self, owner: str) -> list[ShellJob]:
+        """Return the owner's jobs, oldest first."""
+        with self._lock:
+            return list(self._jobs.get(owner, {}).values())
+
+
+__all__ = ["ShellJob", "ShellScheduler", "SlotTimeoutError"]
@@ -1,6 +1,8 @@
 """Skill loader for parsing and loading agent skills from SKILL.md files.
 
 This module implements Anthropic's agent skills pattern with YAML frontmatter parsing.
+Parsed metadata is cached by ``deepagents_cli.skills.registry`` so directories are
+only re-read when their contents change.
 Each skill is a directory containing a SKILL.md file with:
 - YAML frontmatter (name, description required)
 - Markdown instructions for the agent
@@ -26,6 +28,8 @@ from __future__ import annotations
 import re
 from typing import TYPE_CHECKING, TypedDict
 
+import yaml
+
 if TYPE_CHECKING:
     from pathlib import Path
 
@@ -89,6 +93,44 @@ def _is_safe_path(path: Path, base_dir: Path) -> bool:
         return False
 
 
+_FRONTMATTER_PATTERN = re.compile(r"^---\s*\n(.*?)\n---\s*(?:\n|$)", re.DOTALL)
+
+
+def _parse_frontmatter(content: str) -> tuple[str, str] | None:
+    """Parse the YAML frontmatter of a SKILL.md file.
+
+    Args:
+        content: Full SKILL.md text.
+
+    Returns:
+        (name, description), or None if the frontmatter is missing, is not
+        valid YAML, or lacks either field.
+    """
+    match = _FRONTMATTER_PATTERN.match(content)
+    if not match:
+        return None
+
+    try:
+        frontmatter = yaml.safe_load(match.group(1))
+    except yaml.YAMLError:
+        return None
+
+    if not isinstance(frontmatter, dict):
+        return None
+
+    # Validate required fields
+    name = frontmatter.get("name")
+    description = frontmatter.get("description")
+    if name is None or description is None:
+        return None
+
+    name = str(name).strip()
+    description = " ".join(str(description).split())
+    if not name or not description:
+        return None
+    return name, description
+
+
 def _parse_skill_metadata(skill_md_path: Path, source: str) -> SkillMetadata | None:
     """Parse YAML frontmatter from a SKILL.md file.
 
@@ -106,47 +148,29 @@ def _parse_skill_metadata(skill_md_path: Path, source: str) -> SkillMetadata | N
             # Silently skip files that are too large
             return None
 
-        content = skill_md_path.read_text(encoding="utf-8")
-
-        # Match YAML frontmatter between --- delimiters
-        frontmatter_pattern = r"^---\s*\n(.*?)\n---\s*\n"
-        match = re.match(frontmatter_pattern, content, re.DOTALL)
-
-        if not match:
-            return None
-
-        frontmatter = match.group(1)
-
-        # Parse key-value pairs from YAML (simple parsing, no nested structures)
-        metadata: dict[str, str] = {}
-        for line in frontmatter.split("\n"):
-            # Match "key: value" pattern
-            kv_match = re.match(r"^(\w+):\s*(.+)$", line.strip())
-            if kv_match:
-                key, value = kv_match.groups()
-                metadata[key] = value.strip()
-
-        # Validate required fields
-        if "name" not in metadata or "description" not in metadata:
-            return None
-
-        return SkillMetadata(
-            name=metadata["name"],
-            description=metadata["description"],
-            path=str(skill_md_path),
-            source=source,
-        )
-
+        parsed = _parse_frontmatter(skill_md_path.read_text(encoding="utf-8"))
     except (OSError, UnicodeDecodeError):
         # Silently skip malformed or inaccessible files
         return None
 
+    if parsed is None:
+        return None
+
+    name, description = parsed
+    return SkillMetadata(
+        name=name,
+        description=description,
+        path=str(skill_md_path),
+        source=source,
+    )
+
 
 def _list_skills(skills_dir: Path, source: str) -> list[SkillMetadata]:
     """List all skills from a single skills directory (internal helper).
 
     Scans the skills directory for subdirectories containing SKILL.md files,
-    parses YAML frontmatter, and returns skill metadata.
+    parses YAML frontmatter, and returns skill metadata. Results come from the
+    shared skill registry, which only re-reads entries whose stat changed.
 
     Skills are organized as:
     skills/
@@ -162,45 +186,9 @@ def _list_skills(skills_dir: Path, source: str) -> list[SkillMetadata]:
     Returns:
         List of skill metadata dictionaries with name, description, path, and source.
     """
-    # Check if skills directory exists
-    skills_dir = skills_dir.expanduser()
-    if not skills_dir.exists():
-        return []
-
-    # Resolve base directory to canonical path for security checks
-    try:
-        resolved_base = skills_dir.resolve()
-    except (OSError, RuntimeError):
-        # Can't resolve base directory, fail safe
-        return []
-
-    skills: list[SkillMetadata] = []
-
-    # Iterate through subdirectories
-    for skill_dir in skills_dir.iterdir():
-        # Security: Catch symlinks pointing outside the skills directory
-        if not _is_safe_path(skill_dir, resolved_base):
-            continue
-
-        if not skill_dir.is_dir():
-            continue
-
-        # Look for SKILL.md file
-        skill_md_path = skill_dir / "SKILL.md"
-        if not skill_md_path.exists():
-            continue
-
-        # Security: Validate SKILL.md path is safe before reading
-        # This catches SKILL.md files that are symlinks pointing outside
-        if not _is_safe_path(skill_md_path, resolved_base):
-            continue
-
-        # Parse metadata
-        metadata = _parse_skill_metadata(skill_md_path, source=source)
-        if metadata:
-            skills.append(metadata)
+    from deepagents_cli.skills.registry import skill_registry
 
-    return skills
+    return skill_registry.list_dir(skills_dir, source)
 
 
 def list_skills(
@@ -33,9 +33,13 @@ from langchain.agents.middleware.types import (
     ModelRequest,
     ModelResponse,
 )
+from langchain.tools import ToolRuntime, tool
+from langchain_core.messages import HumanMessage
 from langgraph.runtime import Runtime
 
+from deepagents_cli.prompt_cache import append_system_blocks
 from deepagents_cli.skills.load import SkillMetadata, list_skills
+from deepagents_cli.skills.search import SkillIndex
 
 
 class SkillsState(AgentState):
@@ -99,6 +103,16 @@ Remember: Skills are tools to make you more capable and consistent. When in doub
 """
 
 
+# Maximum number of distinct skills lists whose formatted section is kept
+_SECTION_CACHE_SIZE = 16
+
+SEARCH_SKILLS_TOOL_DESCRIPTION = """Search the skills library by keywords.
+
+Only the skills most relevant to the conversation are listed in the system prompt.
+Use this tool to find other skills (e.g. "pdf report", "deploy cloud run").
+Returns matching skills with the path of their SKILL.md."""
+
+
 class SkillsMiddleware(AgentMiddleware):
     """Middleware for loading and exposing agent skills.
 
@@ -112,10 +126,15 @@ class SkillsMiddleware(AgentMiddleware):
     - Project skills: {PROJECT_ROOT}/.deepagents/skills/
     - Project skills override user skills with the same name
 
+    With ``shortlist_size`` set, only the skills most relevant to the latest
+    user message (BM25 over names, descriptions and headings) are listed, and a
+    ``search_skills`` tool gives access to the rest.
+
     Args:
         skills_dir: Path to the user-level skills directory (per-agent).
         assistant_id: The agent identifier for path references in prompts.
         project_skills_dir: Optional path to project-level skills directory.
+        shortlist_size: Optional maximum number of skills listed in the prompt.
     """
 
     state_schema = SkillsState
@@ -126,6 +145,7 @@ class SkillsMiddleware(AgentMiddleware):
         skills_dir: str | Path,
         assistant_id: str,
         project_skills_dir: str | Path | None = None,
+        shortlist_size: int | None = None,
     ) -> None:
         """Initialize the skills middleware.
 
@@ -133,6 +153,8 @@ class SkillsMiddleware(AgentMiddleware):
             skills_dir: Path to the user-level skills directory.
             assistant_id: The agent identifier.
             project_skills_dir: Optional path to the project-level skills directory.
+            shortlist_size: If set, list at most this many relevant skills in the
+                system prompt and expose a ``search_skills`` tool for the rest.
         """
         self.skills_dir = Path(skills_dir).expanduser()
         self.assistant_id = assistant_id
@@ -142,6 +164,35 @@ class SkillsMiddleware(AgentMiddleware):
         # Store display paths for prompts
         self.user_skills_display = f"~/.deepagents/{assistant_id}/skills"
         self.system_prompt_template = SKILLS_SYSTEM_PROMPT
+        # Formatted skills sections keyed by the skills list (oldest evicted first)
+        self._section_cache: dict[tuple, str] = {}
+
+        # Relevance shortlisting (optional)
+        self.shortlist_size = shortlist_size
+        self._index_key: tuple | None = None
+        self._index: SkillIndex | None = None
+        if shortlist_size:
+
+            @tool("search_skills", description=SEARCH_SKILLS_TOOL_DESCRIPTION)
+            def search_skills(
+                query: str,
+                runtime: ToolRuntime[None, SkillsState],
+                limit: int = 5,
+            ) -> str:
+                """Search the skills library.
+
+                Args:
+                    query: Keywords describing the task.
+                    runtime: The tool runtime context.
+                    limit: Maximum number of skills to return.
+                """
+                skills = runtime.state.get("skills_metadata", [])
+                matches = self._skill_index(skills).search(query, limit=limit)
+                if not matches:
+                    return f"No skills matched '{query}'."
+                return "\n".join(self._format_skill(skill) for skill in matches)
+
+            self.tools = [search_skills]
 
     def _format_skills_locations(self) -> str:
         """Format skills locations for display in system prompt."""
@@ -170,20 +221,89 @@ class SkillsMiddleware(AgentMiddleware):
         # Show user skills
         if user_skills:
             lines.append("**User Skills:**")
-            for skill in user_skills:
-                lines.append(f"- **{skill['name']}**: {skill['description']}")
-                lines.append(f"  → Read `{skill['path']}` for full instructions")
+            lines.extend(self._format_skill(skill) for skill in user_skills)
             lines.append("")
 
         # Show project skills
         if project_skills:
             lines.append("**Project Skills:**")
-            for skill in project_skills:
-                lines.append(f"- **{skill['name']}**: {skill['description']}")
-                lines.append(f"  → Read `{skill['path']}` for full instructions")
+            lines.extend(self._format_skill(skill) for skill in project_skills)
 
         return "\n".join(lines)
 
+    @staticmethod
+    def _format_skill(skill: SkillMetadata) -> str:
+        return (
+            f"- **{skill['name']}**: {skill['description']}\n"
+            f"  → Read `{skill['path']}` for full instructions"
+        )
+
+    @staticmethod
+    def _skills_key(skills: list[SkillMetadata]) -> tuple:
+        return tuple(
+            (skill["name"], skill["description"], skill["path"], skill["source"])
+            for skill in skills
+        )
+
+    def _skill_index(self, skills: list[SkillMetadata]) -> SkillIndex:
+        """Return the BM25 index for a skills list (rebuilt only when it changes)."""
+        key = self._skills_key(skills)
+        if self._index is None or self._index_key != key:
+            self._index = SkillIndex(skills)
+            self._index_key = key
+        return self._index
+
+    def _shortlist(
+        self, request: ModelRequest, skills: list[SkillMetadata]
+    ) -> tuple[list[SkillMetadata], int]:
+        """Pick the skills to list in the prompt.
+
+        The query is the latest user message, which stays the same for every
+        model call of a run, so the skills block remains cacheable within a run.
+
+        Returns:
+            (listed skills, number of skills left out)
+        """
+        if not self.shortlist_size or len(skills) <= self.shortlist_size:
+            return skills, 0
+        query = next(
+            (m.text for m in reversed(request.messages) if isinstance(m, HumanMessage)),
+            "",
+        )
+        listed = self._skill_index(skills).search(query, limit=self.shortlist_size)
+        return listed, len(skills) - len(listed)
+
+    def _skills_section(self, skills: list[SkillMetadata], hidden: int = 0) -> str:
+        """Return the formatted skills section, memoized on the skills list."""
+        key = (self._skills_key(skills), hidden)
+        section = self._section_cache.get(key)
+        if section is None:
+            skills_list = self._format_skills_list(skills) if skills or not hidden else ""
+            if hidden:
+                skills_list += (
+                    f"\n\n_{hidden} more skills are not listed here. "
+                    "Use the `search_skills` tool to find skills for other tasks._"
+                )
+            section = self.system_prompt_template.format(
+                skills_locations=self._format_skills_locations(),
+                skills_list=skills_list.strip(),
+            )
+            if len(self._section_cache) >= _SECTION_CACHE_SIZE:
+                self._section_cache.pop(next(iter(self._section_cache)))
+            self._section_cache[key] = section
+        return section
+
+    def skills_section(self) -> str:
+        """Return the skills section for the skills currently on disk.
+
+        Used for token accounting; every skill is listed (no shortlisting).
+        """
+        skills = list_skills(
+            user_skills_dir=self.skills_dir,
+            project_skills_dir=self.project_skills_dir,
+        )
+        return self._skills_section(skills)
+
     def before_agent(self, state: SkillsState, runtime: Runtime) -> SkillsStateUpdate | None:
         """Load skills metadata before agent execution.
 
@@ -223,23 +343,8 @@ class SkillsMiddleware(AgentMiddleware):
         """
         # Get skills metadata from state
         skills_metadata = request.state.get("skills_metadata", [])
-
-        # Format skills locations and list
-        skills_locations = self._format_skills_locations()
-        skills_list = self._format_skills_list(skills_metadata)
-
-        # Format the skills documentation
-        skills_section = self.system_prompt_template.format(
-            skills_locations=skills_locations,
-            skills_list=skills_list,
-        )
-
-        if request.system_prompt:
-            system_prompt = request.system_prompt + "\n\n" + skills_section
-        else:
-            system_prompt = skills_section
-
-        return handler(request.override(system_prompt=system_prompt))
+        listed, hidden = self._shortlist(request, skills_metadata)
+        return handler(append_system_blocks(request, self._skills_section(listed, hidden)))
 
     async def awrap_model_call(
         self,
@@ -258,21 +363,5 @@ class SkillsMiddleware(AgentMiddleware):
         # The state is guaranteed to be SkillsState due to state_schema
         state = cast("SkillsState", request.state)
         skills_metadata = state.get("skills_metadata", [])
-
-        # Format skills locations and list
-        skills_locations = self._format_skills_locations()
-        skills_list = self._format_skills_list(skills_metadata)
-
-        # Format the skills documentation
-        skills_section = self.system_prompt_template.format(
-            skills_locations=skills_locations,
-            skills_list=skills_list,
-        )
-
-        # Inject into system prompt
-        if request.system_prompt:
-            system_prompt = request.system_prompt + "\n\n" + skills_section
-        else:
-            system_prompt = skills_section
-
-        return await handler(request.override(system_prompt=system_prompt))
\ No newline at end of file
+        listed, hidden = self._shortlist(request, skills_metadata)
+        return await handler(append_system_blocks(request, self._skills_section(listed, hidden)))
\ No newline at end of file
@@ -0,0 +1,216 @@
+"""Process-wide, stat-validated index of skill metadata.
+
+``list_skills`` used to walk every skills directory, resolve every entry and
+re-read every SKILL.md on each agent invocation. The registry keeps:
+
+- per skills directory: the directory mtime and, for every skill subdirectory,
+  its mtime plus the validated SKILL.md path. An unchanged directory is
+  revalidated with one ``stat`` per skill instead of ``iterdir`` + ``resolve``.
+- parsed frontmatter keyed by (skill directory name, size, mtime_ns) of the
+  SKILL.md file. User skills are copied from a shared template with
+  ``shutil.copytree`` (which preserves mtimes), so users with the same template
+  skills share one parsed entry.
+
+Only SKILL.md files whose size or mtime changed are read and parsed again.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from deepagents_cli.skills.load import (
+    MAX_SKILL_FILE_SIZE,
+    SkillMetadata,
+    _is_safe_path,
+    _parse_frontmatter,
+)
+
+
+@dataclass
+class _SkillDirEntry:
+    """Cached scan of one skill subdirectory."""
+
+    mtime_ns: int
+    skill_md_path: Path | None
+    """Validated SKILL.md path, or None if the subdirectory has no usable SKILL.md."""
+
+
+@dataclass
+class _SkillsDirIndex:
+    """Cached scan of a skills directory."""
+
+    mtime_ns: int
+    skill_dirs: dict[Path, _SkillDirEntry] = field(default_factory=dict)
+
+
+class SkillRegistry:
+    """Cache of skill metadata shared by all users and middleware instances."""
+
+    def __init__(self, max_parsed_entries: int = 4096) -> None:
+        """Initialize the registry.
+
+        Args:
+            max_parsed_entries: Maximum number of parsed SKILL.md entries kept
+                (least recently used entries are dropped first).
+        """
+        self.max_parsed_entries = max_parsed_entries
+        self._lock = threading.Lock()
+        self._dirs: dict[Path, _SkillsDirIndex] = {}
+        self._parsed: OrderedDict[tuple[str, int, int], tuple[str, str] | None] = OrderedDict()
+        self.hits = 0
+        self.parses = 0
+
+    def list_dir(self, skills_dir: Path, source: str) -> list[SkillMetadata]:
+        """List the skills of one skills directory.
+
+        Args:
+            skills_dir: Path to the skills directory.
+            source: Source of the skills ('user' or 'project').
+
+        Returns:
+            List of skill metadata dictionaries with name, description, path, and source.
+        """
+        skills_dir = skills_dir.expanduser()
+        index = self._revalidate(skills_dir)
+        if index is None:
+            return []
+
+        skills: list[SkillMetadata] = []
+        for skill_dir, entry in index.skill_dirs.items():
+            if entry.skill_md_path is None:
+                continue
+            parsed = self._parse(skill_dir.name, entry.skill_md_path)
+            if parsed is None:
+                continue
+            name, description = parsed
+            skills.append(
+                SkillMetadata(
+                    name=name,
+                    description=description,
+                    path=str(entry.skill_md_path),
+                    source=source,
+                )
+            )
+        return skills
+
+    def invalidate(self, skills_dir: Path | None = None) -> None:
+        """Drop cached directory scans (all, or those of one skills directory)."""
+        with self._lock:
+            if skills_dir is None:
+                self._dirs.clear()
+            else:
+                self._dirs.pop(skills_dir.expanduser(), None)
+
+    # ---- directory scans ----
+
+    def _revalidate(self, skills_dir: Path) -> _SkillsDirIndex | None:
+        try:
+            dir_mtime = skills_dir.stat().st_mtime_ns
+        except OSError:
+            return None
+
+        with self._lock:
+            index = self._dirs.get(skills_dir)
+
+        if index is None or index.mtime_ns != dir_mtime:
+            # Entries were added, removed or renamed: rescan the directory
+            index = self._scan(skills_dir, dir_mtime, index)
+        else:
+            # Same entries: only subdirectories whose mtime changed (SKILL.md
+            # created, removed or replaced) are checked again
+            for skill_dir, entry in list(index.skill_dirs.items()):
+                try:
+                    mtime = skill_dir.stat().st_mtime_ns
+                except OSError:
+                    mtime = -1
+                if mtime != entry.mtime_ns:
+                    index.skill_dirs[skill_dir] = self._scan_skill_dir(skill_dir, skills_dir)
+
+        if index is not None:
+            with self._lock:
+                self._dirs[skills_dir] = index
+        return index
+
+    def _scan(
+        self, skills_dir: Path, dir_mtime: int, previous: _SkillsDirIndex | None
+    ) -> _SkillsDirIndex | None:
+        # Resolve base directory to canonical path for security checks
+        try:
+            resolved_base = skills_dir.resolve()
+            children = list(skills_dir.iterdir())
+        except (OSError, RuntimeError):
+            return None
+
+        index = _SkillsDirIndex(mtime_ns=dir_mtime)
+        for skill_dir in children:
+            cached = previous.skill_dirs.get(skill_dir) if previous else None
+            try:
+                mtime = skill_dir.stat().st_mtime_ns
+            except OSError:
+                continue
+            if cached is not None and cached.mtime_ns == mtime:
+                index.skill_dirs[skill_dir] = cached
+            else:
+                index.skill_dirs[skill_dir] = self._scan_skill_dir(skill_dir, resolved_base)
+        return index
+
+    @staticmethod
+    def _scan_skill_dir(skill_dir: Path, resolved_base: Path) -> _SkillDirEntry:
+        try:
+            mtime = skill_dir.stat().st_mtime_ns
+        except OSError:
+            return _SkillDirEntry(mtime_ns=-1, skill_md_path=None)
+
+        # Security: Catch symlinks pointing outside the skills directory
+        if not _is_safe_path(skill_dir, resolved_base) or not skill_dir.is_dir():
+            return _SkillDirEntry(mtime_ns=mtime, skill_md_path=None)
+
+        # Look for SKILL.md file
+        skill_md_path = skill_dir / "SKILL.md"
+        if not skill_md_path.exists():
+            return _SkillDirEntry(mtime_ns=mtime, skill_md_path=None)
+
+        # Security: Validate SKILL.md path is safe before reading
+        # This catches SKILL.md files that are symlinks pointing outside
+        if not _is_safe_path(skill_md_path, resolved_base):
+            return _SkillDirEntry(mtime_ns=mtime, skill_md_path=None)
+
+        return _SkillDirEntry(mtime_ns=mtime, skill_md_path=skill_md_path)
+
+    # ---- parsed frontmatter ----
+
+    def _parse(self, skill_name: str, skill_md_path: Path) -> tuple[str, str] | None:
+        try:
+            stat = skill_md_path.stat()
+        except OSError:
+            return None
+        # Security: Check file size to prevent DoS attacks
+        if stat.st_size > MAX_SKILL_FILE_SIZE:
+            return None
+
+        key = (skill_name, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if key in self._parsed:
+                self._parsed.move_to_end(key)
+                self.hits += 1
+                return self._parsed[key]
+
+        try:
+            parsed = _parse_frontmatter(skill_md_path.read_text(encoding="utf-8"))
+        except (OSError, UnicodeDecodeError):
+            # Silently skip malformed or inaccessible files (retried on next change)
+            return None
+
+        with self._lock:
+            self.parses += 1
+            self._parsed[key] = parsed
+            while len(self._parsed) > self.max_parsed_entries:
+                self._parsed.popitem(last=False)
+        return parsed
+
+
+# Shared registry used by list_skills()
+skill_registry = SkillRegistry()
@@ -0,0 +1,131 @@
+"""Local lexical (BM25) search over skill metadata.
+
+Used by ``SkillsMiddleware`` to shortlist the skills most relevant to the
+current conversation instead of listing every skill in the system prompt, and
+by the ``search_skills`` tool to find the rest. Everything runs in-process; no
+embeddings or network calls.
+
+Each skill is indexed on its name (weighted highest), description and the
+markdown headings of its SKILL.md. Text is lowercased and split into words;
+runs of non-ASCII characters (e.g. Japanese, which has no spaces) are indexed
+as character bigrams.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter
+from pathlib import Path
+
+from deepagents_cli.skills.load import MAX_SKILL_FILE_SIZE, SkillMetadata
+
+_WORD_PATTERN = re.compile(r"\w+")
+_HEADING_PATTERN = re.compile(r"^#{1,6}\s+(.+?)\s*#*\s*$", re.MULTILINE)
+
+# Field weights: a term in the name counts as much as three in the body
+_NAME_WEIGHT = 3
+_DESCRIPTION_WEIGHT = 2
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase search terms.
+
+    Args:
+        text: Text to tokenize.
+
+    Returns:
+        ASCII words as-is, non-ASCII runs as overlapping character bigrams.
+    """
+    tokens: list[str] = []
+    for word in _WORD_PATTERN.findall(text.lower()):
+        if word.isascii():
+            tokens.extend(part for part in word.split("_") if part)
+        elif len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i : i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+def _skill_headings(path: str) -> str:
+    try:
+        skill_md_path = Path(path)
+        if skill_md_path.stat().st_size > MAX_SKILL_FILE_SIZE:
+            return ""
+        content = skill_md_path.read_text(encoding="utf-8")
+    except (OSError, UnicodeDecodeError):
+        return ""
+    return " ".join(_HEADING_PATTERN.findall(content))
+
+
+class SkillIndex:
+    """BM25 index over a fixed list of skills."""
+
+    def __init__(
+        self,
+        skills: list[SkillMetadata],
+        *,
+        include_headings: bool = True,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ) -> None:
+        """Build the index.
+
+        Args:
+            skills: Skills to index.
+            include_headings: Also index the markdown headings of each SKILL.md.
+            k1: BM25 term frequency saturation.
+            b: BM25 length normalization.
+        """
+        self.skills = skills
+        self.k1 = k1
+        self.b = b
+
+        self._doc_terms: list[Counter[str]] = []
+        for skill in skills:
+            terms = (
+                tokenize(skill["name"].replace("-", " ")) * _NAME_WEIGHT
+                + tokenize(skill["description"]) * _DESCRIPTION_WEIGHT
+            )
+            if include_headings:
+                terms += tokenize(_skill_headings(skill["path"]))
+            self._doc_terms.append(Counter(terms))
+
+        self._doc_lengths = [sum(terms.values()) for terms in self._doc_terms]
+        self._avg_length = (
+            sum(self._doc_lengths) / len(self._doc_lengths) if self._doc_lengths else 0.0
+        )
+        document_frequency: Counter[str] = Counter()
+        for terms in self._doc_terms:
+            document_frequency.update(terms.keys())
+        n = len(skills)
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def scores(self, query: str) -> list[float]:
+        """Return the BM25 score of every skill for a query."""
+        query_terms = set(tokenize(query))
+        scores = [0.0] * len(self.skills)
+        if not query_terms or not self._avg_length:
+            return scores
+        for i, terms in enumerate(self._doc_terms):
+            length_norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[i] / self._avg_length)
+            score = 0.0
+            for term in query_terms:
+                tf = terms.get(term)
+                if tf:
+                    score += self._idf[term] * tf * (self.k1 + 1) / (tf + length_norm)
+            scores[i] = score
+        return scores
+
+    def search(self, query: str, limit: int = 5) -> list[SkillMetadata]:
+        """Return up to ``limit`` skills matching the query, best first.
+
+        Skills with no matching term are not returned.
+        """
+        scores = self.scores(query)
+        ranked = sorted(range(len(scores)), key=lambda i: (-scores[i], self.skills[i]["name"]))
+        return [self.skills[i] for i in ranked[:limit] if scores[i] > 0]
@@ -0,0 +1,352 @@
+"""Per-step performance telemetry of agent runs.
+
+``TelemetryMiddleware`` records every model call (time to first token, total
+time, input/output/cached tokens) and every tool call (name, duration, result
+size) and appends them as one JSON line per step to
+``~/.deepagents/{user_id}/.telemetry/{thread_id}.jsonl``. ``summarize`` turns a
+thread's log into totals per model (including prompt cache hits) and per tool, which the
+``/api/stats/threads/{thread_id}/telemetry`` endpoint and the CLI's ``/stats``
+command show.
+
+Time to first token is measured with a callback handler that is attached to
+the model call through a LangChain configure hook, so it sees the streamed
+tokens without wrapping the model.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import re
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from contextvars import ContextVar
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from langchain.agents.middleware.types import AgentMiddleware, ModelRequest, ModelResponse
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tracers.context import register_configure_hook
+
+from deepagents_cli.config import settings
+
+if TYPE_CHECKING:
+    from langchain.agents.middleware.types import ToolCallRequest
+    from langgraph.types import Command
+
+logger = logging.getLogger(__name__)
+
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class _FirstTokenTimer(BaseCallbackHandler):
+    """Note when the first streamed token of a model call arrives."""
+
+    run_inline = True  # timestamp in the model's own thread / task
+
+    def __init__(self) -> None:
+        self.first_token_at: float | None = None
+
+    def on_llm_new_token(self, token: str, *, chunk: Any = None, **kwargs: Any) -> None:
+        if self.first_token_at is not None:
+            return
+        message = getattr(chunk, "message", None)
+        if token or getattr(message, "tool_call_chunks", None):
+            self.first_token_at = time.perf_counter()
+
+
+_first_token_timer: ContextVar[_FirstTokenTimer | None] = ContextVar(
+    "deepagents_first_token_timer", default=None
+)
+# Added to the callbacks of every run started while the variable is set
+register_configure_hook(_first_token_timer, inheritable=True)
+
+
+def telemetry_dir() -> Path:
+    """Return the telemetry directory of the current user."""
+    return settings.user_deepagents_dir / ".telemetry"
+
+
+def _log_path(log_dir: Path, thread_id: str) -> Path:
+    return log_dir / f"{_UNSAFE_NAME.sub('_', thread_id)}.jsonl"
+
+
+def _run_ids() -> tuple[str, str | None]:
+    try:
+        from langgraph.config import get_config
+
+        config = get_config()
+    except RuntimeError:
+        # Called outside a runnable context
+        return "default", None
+    thread_id = config.get("configurable", {}).get("thread_id") or "default"
+    run_id = config.get("metadata", {}).get("run_id")
+    return str(thread_id), str(run_id) if run_id else None
+
+
+def read_telemetry(thread_id: str, log_dir: Path | None = None) -> list[dict[str, Any]]:
+    """Read the recorded steps of a thread, oldest first.
+
+    Args:
+        thread_id: Thread whose log is read.
+        log_dir: Telemetry directory (default: the current user's).
+
+    Returns:
+        The step records (empty if nothing was recorded).
+    """
+    path = _log_path(log_dir or telemetry_dir(), thread_id)
+    try:
+        lines = path.read_text(encoding="utf-8").splitlines()
+    except FileNotFoundError:
+        return []
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue  # partially written line
+    return records
+
+
+def _percentile(values: list[float], fraction: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(records: list[dict[str, Any]]) -> dict[str, Any]:
+    """Aggregate step records into model and per-tool totals.
+
+    Args:
+        records: Records from ``read_telemetry``.
+
+    Returns:
+        Totals for model calls (time, time to first token, tokens) and tool
+        calls, with tools ordered by total time (slowest first).
+    """
+    model_steps = [r for r in records if r.get("kind") == "model"]
+    tool_steps = [r for r in records if r.get("kind") == "tool"]
+    ttfts = [r["ttft_ms"] for r in model_steps if r.get("ttft_ms") is not None]
+
+    by_tool: dict[str, dict[str, Any]] = {}
+    for step in tool_steps:
+        stats = by_tool.setdefault(
+            step.get("name", "?"),
+            {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "result_chars": 0},
+        )
+        stats["calls"] += 1
+        stats["errors"] += bool(step.get("error"))
+        stats["total_ms"] += step.get("ms", 0.0)
+        stats["max_ms"] = max(stats["max_ms"], step.get("ms", 0.0))
+        stats["result_chars"] += step.get("result_chars", 0)
+    for stats in by_tool.values():
+        stats["total_ms"] = round(stats["total_ms"], 1)
+
+    return {
+        "steps": len(records),
+        "runs": len({r["run_id"] for r in records if r.get("run_id")}),
+        "model": {
+            "calls": len(model_steps),
+            "total_ms": round(sum(r.get("ms", 0.0) for r in model_steps), 1),
+            "ttft_ms_p50": _percentile(ttfts, 0.5),
+            "ttft_ms_p90": _percentile(ttfts, 0.9),
+            "input_tokens": sum(r.get("input_tokens", 0) for r in model_steps),
+            "output_tokens": sum(r.get("output_tokens", 0) for r in model_steps),
+            "cached_tokens": sum(r.get("cached_tokens", 0) for r in model_steps),
+            "cache_write_tokens": sum(r.get("cache_write_tokens", 0) for r in model_steps),
+            # Calls that read at least one token from the provider prompt cache
+            "cache_hits": sum(bool(r.get("cached_tokens")) for r in model_steps),
+        },
+        "tools": {
+            "calls": len(tool_steps),
+            "total_ms": round(sum(r.get("ms", 0.0) for r in tool_steps), 1),
+            "by_name": dict(
+                sorted(by_tool.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+            ),
+        },
+    }
+
+
+class TelemetryMiddleware(AgentMiddleware):
+    """Record the latency and token usage of every model and tool call.
+
+    Add this middleware after the other middleware (before prompt caching) so
+    it times the model and the tools themselves.
+    """
+
+    def __init__(self, *, log_dir: str | Path | None = None) -> None:
+        """Initialize the telemetry middleware.
+
+        Args:
+            log_dir: Directory of the per-thread logs (default: the telemetry
+                directory of the user the agent is built for).
+        """
+        super().__init__()
+        self.log_dir = Path(log_dir) if log_dir is not None else telemetry_dir()
+        self._lock = threading.Lock()
+
+    def _append(self, record: dict[str, Any]) -> None:
+        thread_id, run_id = _run_ids()
+        record = {"at": round(time.time(), 3), "run_id": run_id, **record}
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        try:
+            with self._lock:
+                self.log_dir.mkdir(parents=True, exist_ok=True)
+                with _log_path(self.log_dir, thread_id).open("a", encoding="utf-8") as f:
+                    f.write(line)
+        except OSError as e:
+            logger.debug("Could not write telemetry: %s", e)
+
+    async def _aappend(self, record: dict[str, Any]) -> None:
+        # File I/O off the event loop (to_thread copies the context, so run ids still resolve)
+        await asyncio.to_thread(self._append, record)
+
+    def _model_record(
+        self,
+        request: ModelRequest,
+        response: ModelResponse | None,
+        started: float,
+        timer: _FirstTokenTimer,
+    ) -> dict[str, Any]:
+        messages = response.result if response is not None else []
+        message = next((m for m in reversed(messages) if isinstance(m, AIMessage)), None)
+        usage = (message.usage_metadata if message is not None else None) or {}
+        details = usage.get("input_token_details") or {}
+        return {
+            "kind": "model",
+            "model": getattr(request.model, "model_name", None)
+            or getattr(request.model, "model", None),
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+            "ttft_ms": (
+                round((timer.first_token_at - started) * 1000, 1)
+                if timer.first_token_at is not None
+                else None
+            ),
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0),
+            "cached_tokens": details.get("cache_read") or 0,
+            "cache_write_tokens": details.get("cache_creation") or 0,
+            "tool_calls": len(message.tool_calls) if message is not None else 0,
+            "error": response is None,
+        }
+
+    def _tool_record(
+        self, request: ToolCallRequest, result: ToolMessage | Command | None, started: float
+    ) -> dict[str, Any]:
+        if isinstance(result, ToolMessage):
+            content = result.content
+            if not isinstance(content, str):
+                content = json.dumps(content, default=str)
+            size = len(content)
+            error = result.status == "error"
+        else:
+            size = 0
+            error = result is None
+        return {
+            "kind": "tool",
+            "name": request.tool_call.get("name"),
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+            "result_chars": size,
+            "error": error,
+        }
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], ModelResponse],
+    ) -> ModelResponse:
+        """Time the model call and record its token usage.
+
+        Args:
+            request: The model request being processed.
+            handler: The handler function to call with the request.
+
+        Returns:
+            The model response from the handler.
+        """
+        timer = _FirstTokenTimer()
+        token = _first_token_timer.set(timer)
+        started = time.perf_counter()
+        response = None
+        try:
+            response = handler(request)
+            return response
+        finally:
+            _first_token_timer.reset(token)
+            self._append(self._model_record(request, response, started, timer))
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
+    ) -> ModelResponse:
+        """(async) Time the model call and record its token usage.
+
+        Args:
+            request: The model request being processed.
+            handler: The handler function to call with the request.
+
+        Returns:
+            The model response from the handler.
+        """
+        timer = _FirstTokenTimer()
+        token = _first_token_timer.set(timer)
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await handler(request)
+            return response
+        finally:
+            _first_token_timer.reset(token)
+            await self._aappend(self._model_record(request, response, started, timer))
+
+    def wrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], ToolMessage | Command],
+    ) -> ToolMessage | Command:
+        """Time the tool call and record the size of its result.
+
+        Args:
+            request: The tool call request being processed.
+            handler: The handler function to call with the request.
+
+        Returns:
+            The tool result from the handler.
+        """
+        started = time.perf_counter()
+        result = None
+        try:
+            result = handler(request)
+            return result
+        finally:
+            self._append(self._tool_record(request, result, started))
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[ToolMessage | Command]],
+    ) -> ToolMessage | Command:
+        """(async) Time the tool call and record the size of its result.
+
+        Args:
+            request: The tool call request being processed.
+            handler: The handler function to call with the request.
+
+        Returns:
+            The tool result from the handler.
+        """
+        started = time.perf_counter()
+        result = None
+        try:
+            result = await handler(request)
+            return result
+        finally:
+            await self._aappend(self._tool_record(request, result, started))
+
+
+__all__ = ["TelemetryMiddleware", "read_telemetry", "summarize", "telemetry_dir"]
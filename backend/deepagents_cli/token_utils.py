@@ -1,116 +1,232 @@
-"""Utilities for accurate token counting using LangChain models."""
-
+"""Token accounting for the CLI's context display.
+
+The parts of the context that are known before the first model call (the base
+system prompt, long-term memory, the skills section and the tool definitions)
+are counted separately, so ``/tokens`` can show where the context goes.
+
+Counts come from the model's own tokenizer, which for some providers is a
+remote call, and are cached on disk by content hash: a CLI start with
+unchanged prompts, memory files and tools needs no tokenizer calls at all.
+When the tokenizer is unavailable (offline, or a provider without one) a fast
+local estimate is used and the count is marked as approximate.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from collections.abc import Sequence
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Any
 
 from langchain_core.messages import SystemMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from deepagents_cli.config import settings
+
+logger = logging.getLogger(__name__)
 
-from deepagents_cli.config import console, settings
+DEFAULT_COUNT_CACHE_PATH = Path.home() / ".deepagents" / ".cache" / "token_counts.json"
 
+# Maximum number of cached counts (least recently used are dropped first)
+_MAX_CACHED_COUNTS = 4096
 
-def calculate_baseline_tokens(model, agent_dir: Path, system_prompt: str, assistant_id: str) -> int:
-    """Calculate baseline context tokens using the model's official tokenizer.
 
-    This uses the model's get_num_tokens_from_messages() method to get
-    accurate token counts for the initial context (system prompt + agent.md).
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a text without a tokenizer.
 
-    Note: Tool definitions cannot be accurately counted before the first API call
-    due to LangChain limitations. They will be included in the total after the
-    first message is sent (~5,000 tokens).
+    About 4 characters per token for ASCII text and one token per character
+    for other scripts (CJK text tokenizes much more densely than English).
 
     Args:
-        model: LangChain model instance (ChatAnthropic or ChatOpenAI)
-        agent_dir: Path to agent directory containing agent.md
-        system_prompt: The base system prompt string
-        assistant_id: The agent identifier for path references
+        text: Text to estimate.
 
     Returns:
-        Token count for system prompt + agent.md (tools not included)
+        Estimated number of tokens.
     """
-    # Load user agent.md content
-    agent_md_path = agent_dir / "agent.md"
-    user_memory = ""
-    if agent_md_path.exists():
-        user_memory = agent_md_path.read_text()
-
-    # Load project agent.md content
-    from .config import _find_project_agent_md, _find_project_root
-
-    project_memory = ""
-    project_root = _find_project_root()
-    if project_root:
-        project_md_paths = _find_project_agent_md(project_root)
-        if project_md_paths:
-            try:
-                # Combine all project agent.md files (if multiple exist)
-                contents = []
-                for path in project_md_paths:
-                    contents.append(path.read_text())
-                project_memory = "\n\n".join(contents)
-            except Exception:
-                pass
-
-    # Build the complete system prompt as it will be sent
-    # This mimics what AgentMemoryMiddleware.wrap_model_call() does
-    memory_section = (
-        f"<user_memory>\n{user_memory or '(No user agent.md)'}\n</user_memory>\n\n"
-        f"<project_memory>\n{project_memory or '(No project agent.md)'}\n</project_memory>"
-    )
-
-    # Get the long-term memory system prompt
-    memory_system_prompt = get_memory_system_prompt(
-        assistant_id, project_root, bool(project_memory)
-    )
-
-    # Combine all parts in the same order as the middleware
-    full_system_prompt = memory_section + "\n\n" + system_prompt + "\n\n" + memory_system_prompt
-
-    # Count tokens using the model's official method
-    messages = [SystemMessage(content=full_system_prompt)]
-
-    try:
-        # Note: tools parameter is not supported by LangChain's token counting
-        # Tool tokens will be included in the API response after first message
-        return model.get_num_tokens_from_messages(messages)
-    except Exception as e:
-        # Fallback if token counting fails
-        console.print(f"[yellow]Warning: Could not calculate baseline tokens: {e}[/yellow]")
+    if not text:
         return 0
-
-
-def get_memory_system_prompt(
-    assistant_id: str, project_root: Path | None = None, has_project_memory: bool = False
-) -> str:
-    """Get the long-term memory system prompt text.
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+@dataclass
+class ContextBreakdown:
+    """Token counts of the parts of the context known before the first call."""
+
+    system: int = 0
+    """Base system prompt."""
+    memory: int = 0
+    """Long-term memory instructions and agent.md contents."""
+    skills: int = 0
+    """Skills section of the system prompt."""
+    tools: int = 0
+    """Tool definitions (JSON schemas)."""
+    exact: bool = True
+    """False if any part is a local estimate."""
+
+    @property
+    def total(self) -> int:
+        """Sum of all parts."""
+        return self.system + self.memory + self.skills + self.tools
+
+
+def _model_key(model: Any) -> str:
+    name = getattr(model, "model_name", None) or getattr(model, "model", None) or ""
+    return f"{type(model).__name__}:{name}"
+
+
+class TokenCounter:
+    """Count tokens with a model's tokenizer, cached on disk by content hash."""
+
+    def __init__(self, model: Any | None, cache_path: Path = DEFAULT_COUNT_CACHE_PATH) -> None:
+        """Initialize the counter.
+
+        Args:
+            model: Chat model whose ``get_num_tokens_from_messages`` is used, or
+                None to always estimate.
+            cache_path: JSON file the counts are cached in.
+        """
+        self.model = model
+        self.model_key = _model_key(model)
+        self.cache_path = cache_path
+        # DEEPAGENTS_TOKEN_COUNT=estimate skips the tokenizer (e.g. when working offline)
+        self.offline = model is None or os.getenv("DEEPAGENTS_TOKEN_COUNT") == "estimate"
+        self._counts = self._load()
+        self._dirty = False
+
+    def _load(self) -> dict[str, int]:
+        try:
+            data = json.loads(self.cache_path.read_text())
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def count(self, text: str) -> tuple[int, bool]:
+        """Count the tokens of a text.
+
+        Args:
+            text: Text to count.
+
+        Returns:
+            (tokens, exact). ``exact`` is False if the count is a local estimate.
+        """
+        if not text:
+            return 0, True
+        key = f"{self.model_key}:{hashlib.sha256(text.encode()).hexdigest()}"
+        cached = self._counts.pop(key, None)
+        if cached is not None:
+            self._counts[key] = cached
+            return cached, True
+
+        if not self.offline:
+            try:
+                tokens = self.model.get_num_tokens_from_messages([SystemMessage(content=text)])
+            except Exception as e:
+                # Don't retry (and wait on) an unreachable tokenizer for every part
+                logger.debug("Token counting failed, using estimates: %s", e)
+                self.offline = True
+            else:
+                self._counts[key] = tokens
+                self._dirty = True
+                return tokens, True
+        return estimate_tokens(text), False
+
+    def save(self) -> None:
+        """Write new counts to the cache file."""
+        if not self._dirty:
+            return
+        counts = dict(list(self._counts.items())[-_MAX_CACHED_COUNTS:])
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(counts))
+            tmp_path.replace(self.cache_path)
+        except OSError as e:
+            logger.debug("Could not write the token count cache: %s", e)
+            return
+        self._dirty = False
+
+
+def tool_definitions_text(tools: Sequence[Any]) -> str:
+    """Return the JSON schemas of tools as sent to the model (one per line)."""
+    schemas = []
+    for tool in tools:
+        try:
+            schemas.append(json.dumps(convert_to_openai_tool(tool), sort_keys=True))
+        except Exception as e:
+            logger.debug("Could not convert tool %r to a schema: %s", tool, e)
+    return "\n".join(schemas)
+
+
+def agent_tools(agent: Any) -> list[Any]:
+    """Return the tools bound to a compiled agent graph (empty if not found)."""
+    graph = getattr(agent, "bound", agent)  # with_config() wraps the graph
+    node = getattr(graph, "nodes", {}).get("tools")
+    tool_node = getattr(node, "bound", None)
+    return list(getattr(tool_node, "tools_by_name", {}).values())
+
+
+def calculate_context_breakdown(
+    model: Any,
+    assistant_id: str,
+    system_prompt: str,
+    tools: Sequence[Any] = (),
+    *,
+    include_memory: bool = True,
+    include_skills: bool = True,
+) -> ContextBreakdown:
+    """Count the parts of the context that are sent with every model call.
+
+    The memory and skills sections are built the same way the middleware
+    builds them, so the counts match what the model receives.
 
     Args:
-        assistant_id: The agent identifier for path references
-        project_root: Path to the detected project root (if any)
-        has_project_memory: Whether project memory was loaded
+        model: Chat model whose tokenizer is used.
+        assistant_id: The agent identifier.
+        system_prompt: The base system prompt.
+        tools: Tools available to the agent.
+        include_memory: Count the long-term memory sections.
+        include_skills: Count the skills section.
+
+    Returns:
+        Token counts per part.
     """
-    # Import from agent_memory middleware
-    from .agent_memory import LONGTERM_MEMORY_SYSTEM_PROMPT
-
-    agent_dir = settings.get_agent_dir(assistant_id)
-    agent_dir_absolute = str(agent_dir)
-    agent_dir_display = f"~/.deepagents/{assistant_id}"
-
-    # Build project memory info
-    if project_root and has_project_memory:
-        project_memory_info = f"`{project_root}` (detected)"
-    elif project_root:
-        project_memory_info = f"`{project_root}` (no agent.md found)"
-    else:
-        project_memory_info = "None (not in a git project)"
-
-    # Build project deepagents directory path
-    if project_root:
-        project_deepagents_dir = f"{project_root}/.deepagents"
-    else:
-        project_deepagents_dir = "[project-root]/.deepagents (not in a project)"
-
-    return LONGTERM_MEMORY_SYSTEM_PROMPT.format(
-        agent_dir_absolute=agent_dir_absolute,
-        agent_dir_display=agent_dir_display,
-        project_memory_info=project_memory_info,
-        project_deepagents_dir=project_deepagents_dir,
-    )
\ No newline at end of file
+    from .agent_memory import DEFAULT_MEMORY_SNIPPET, _memory_prompt_sections, load_memory_file
+    from .skills.middleware import SkillsMiddleware
+
+    parts = {"system": system_prompt, "tools": tool_definitions_text(tools)}
+
+    if include_memory:
+        agent_dir = settings.get_agent_dir(assistant_id)
+        user_memory = load_memory_file(agent_dir / "agent.md")
+        project_path = settings.get_project_agent_md_path()
+        project_memory = load_memory_file(project_path) if project_path else None
+        project_root = settings.project_root
+        parts["memory"] = "\n\n".join(
+            _memory_prompt_sections(
+                DEFAULT_MEMORY_SNIPPET,
+                user_memory.text if user_memory else None,
+                project_memory.text if project_memory else None,
+                str(agent_dir),
+                f"~/.deepagents/{assistant_id}",
+                str(project_root) if project_root else None,
+            )
+        )
+
+    if include_skills:
+        parts["skills"] = SkillsMiddleware(
+            skills_dir=settings.get_user_skills_dir(assistant_id),
+            assistant_id=assistant_id,
+            project_skills_dir=settings.get_project_skills_dir(),
+        ).skills_section()
+
+    counter = TokenCounter(model)
+    breakdown = ContextBreakdown()
+    for name, text in parts.items():
+        tokens, exact = counter.count(text)
+        setattr(breakdown, name, tokens)
+        breakdown.exact = breakdown.exact and exact
+    counter.save()
+    return breakdown
@@ -0,0 +1,302 @@
+"""Concurrency classes for tool calls made in the same model turn.
+
+When the model returns several tool calls in one message, the agent graph
+starts one task per call and runs them concurrently in the same step; their
+results are written back in the order of the tool calls. Unbounded, that is
+too much for CPU-heavy tools and unsafe for two edits of the same file.
+
+``ToolConcurrencyMiddleware`` puts every tool in a concurrency class:
+
+- ``io``: network and file reads; many may run at once (``max_io``).
+- ``cpu``: shell commands and other CPU-bound work; at most ``max_cpu``.
+- ``exclusive``: writes; calls on the same path run one at a time, calls on
+  different paths still run in parallel.
+
+Calls naming a path also take that path's readers-writer lock: reads of a
+path share it, so a ``read_file`` of a file never runs during a write to the
+same file (the lock is per exact path, so ``ls``/``grep`` of a parent
+directory are not ordered against the write).
+
+The middleware only sees calls that reach it: ``create_deep_agent`` places its
+own ``FilesystemMiddleware`` and ``SubAgentMiddleware`` outside the user
+middleware, so this is the outermost of this repo's middleware, not of the
+whole stack.
+
+Slots are granted through ``concurrent.futures`` futures (like the shell
+scheduler), so the same limits apply to sync and async runs on any event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from collections import deque
+from collections.abc import Awaitable, Callable, Mapping
+from concurrent.futures import Future
+from typing import TYPE_CHECKING
+
+from langchain.agents.middleware.types import AgentMiddleware
+
+if TYPE_CHECKING:
+    from langchain.agents.middleware.types import ToolCallRequest
+    from langchain_core.messages import ToolMessage
+    from langgraph.types import Command
+
+IO = "io"
+CPU = "cpu"
+EXCLUSIVE = "exclusive"
+
+DEFAULT_TOOL_CLASSES: dict[str, str] = {
+    "ls": IO,
+    "read_file": IO,
+    "glob": IO,
+    "grep": IO,
+    "http_request": IO,
+    "fetch_url": IO,
+    "fetch_urls": IO,
+    "web_search": IO,
+    "task": IO,
+    "shell": CPU,
+    "execute": CPU,
+    "write_file": EXCLUSIVE,
+    "edit_file": EXCLUSIVE,
+}
+
+# Arguments naming the file an exclusive tool writes to
+_PATH_ARGS = ("file_path", "path")
+
+
+class _Limiter:
+    """A FIFO semaphore whose waiters hold futures."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = max(1, limit)
+        self.active = 0
+        self._waiting: deque[Future] = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Future:
+        grant: Future = Future()
+        with self._lock:
+            self._waiting.append(grant)
+            self._dispatch()
+        return grant
+
+    def release(self) -> None:
+        with self._lock:
+            self.active -= 1
+            self._dispatch()
+
+    @property
+    def idle(self) -> bool:
+        with self._lock:
+            return self.active == 0 and all(grant.cancelled() for grant in self._waiting)
+
+    def _dispatch(self) -> None:
+        # Called with the lock held
+        while self._waiting and self.active < self.limit:
+            grant = self._waiting.popleft()
+            if grant.set_running_or_notify_cancel():
+                self.active += 1
+                grant.set_result(None)
+
+
+class _PathLock:
+    """A FIFO readers-writer lock whose waiters hold futures.
+
+    Not thread-safe on its own; the middleware calls it with its lock held.
+    """
+
+    def __init__(self) -> None:
+        self.readers = 0
+        self.writing = False
+        self._waiting: deque[tuple[Future, bool]] = deque()
+
+    def acquire(self, exclusive: bool) -> Future:
+        grant: Future = Future()
+        self._waiting.append((grant, exclusive))
+        self.dispatch()
+        return grant
+
+    def release(self, exclusive: bool) -> None:
+        if exclusive:
+            self.writing = False
+        else:
+            self.readers -= 1
+        self.dispatch()
+
+    @property
+    def idle(self) -> bool:
+        return (
+            not self.writing
+            and self.readers == 0
+            and all(grant.cancelled() for grant, _ in self._waiting)
+        )
+
+    def dispatch(self) -> None:
+        """Grant queued waiters in arrival order, skipping cancelled ones."""
+        # A waiting writer holds back the readers queued behind it
+        while self._waiting and not self.writing:
+            grant, exclusive = self._waiting[0]
+            if exclusive and self.readers and not grant.cancelled():
+                return
+            self._waiting.popleft()
+            if grant.set_running_or_notify_cancel():
+                if exclusive:
+                    self.writing = True
+                else:
+                    self.readers += 1
+                grant.set_result(None)
+
+
+async def _wait_for(
+    grant: Future, on_granted: Callable[[], None], on_cancelled: Callable[[], None]
+) -> None:
+    """Await a grant, giving back the slot if the caller is cancelled meanwhile."""
+    try:
+        await asyncio.wrap_future(grant)
+    except asyncio.CancelledError:
+        # Granted just before the caller was cancelled: don't leak the slot
+        if grant.done() and not grant.cancelled():
+            on_granted()
+        else:
+            on_cancelled()
+        raise
+
+
+class ToolConcurrencyMiddleware(AgentMiddleware):
+    """Limit concurrent tool calls per concurrency class."""
+
+    def __init__(
+        self,
+        *,
+        max_io: int = 16,
+        max_cpu: int | None = None,
+        tool_classes: Mapping[str, str] | None = None,
+        default_class: str = IO,
+    ) -> None:
+        """Initialize the tool concurrency middleware.
+
+        Args:
+            max_io: I/O-bound tool calls running at once.
+            max_cpu: CPU-bound tool calls running at once (default: CPU count).
+            tool_classes: Concurrency class per tool name, merged over
+                ``DEFAULT_TOOL_CLASSES``.
+            default_class: Class of tools not listed in ``tool_classes``.
+        """
+        super().__init__()
+        self.tool_classes = {**DEFAULT_TOOL_CLASSES, **(tool_classes or {})}
+        self.default_class = default_class
+        self._class_limiters = {
+            IO: _Limiter(max_io),
+            CPU: _Limiter(max_cpu or os.cpu_count() or 2),
+        }
+        self._path_locks: dict[str, _PathLock] = {}
+        self._lock = threading.Lock()
+
+    def _classify(self, request: ToolCallRequest) -> tuple[str | None, bool, _Limiter | None]:
+        """Return the path key, whether the call writes it, and its class limiter.
+
+        Exclusive calls have no class limiter (the path lock is their only limit);
+        an exclusive call without a path locks the shared ``"*"`` key.
+        """
+        tool_call = request.tool_call
+        tool_class = self.tool_classes.get(tool_call["name"], self.default_class)
+        args = tool_call.get("args") or {}
+        path = next((str(args[name]) for name in _PATH_ARGS if args.get(name)), "")
+        key = os.path.normpath(path) if path else None
+        if tool_class == EXCLUSIVE:
+            return key or "*", True, None
+        return key, False, self._class_limiters.get(tool_class, self._class_limiters[IO])
+
+    def _acquire_path(self, key: str, exclusive: bool) -> Future:
+        with self._lock:
+            lock = self._path_locks.get(key)
+            if lock is None:
+                lock = self._path_locks[key] = _PathLock()
+            return lock.acquire(exclusive)
+
+    def _release_path(self, key: str, exclusive: bool) -> None:
+        with self._lock:
+            lock = self._path_locks[key]
+            lock.release(exclusive)
+            self._forget(key, lock)
+
+    def _cancel_path(self, key: str) -> None:
+        with self._lock:
+            lock = self._path_locks.get(key)
+            if lock is not None:
+                # Grant whoever was queued behind the cancelled waiter
+                lock.dispatch()
+                self._forget(key, lock)
+
+    def _forget(self, key: str, lock: _PathLock) -> None:
+        # Called with the lock held: drop the lock of a path nobody uses or waits for
+        if lock.idle and self._path_locks.get(key) is lock:
+            del self._path_locks[key]
+
+    def wrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], ToolMessage | Command],
+    ) -> ToolMessage | Command:
+        """Run the tool call once its path and concurrency class have a free slot.
+
+        Args:
+            request: The tool call request being processed.
+            handler: The handler function to call with the request.
+
+        Returns:
+            The tool result from the handler.
+        """
+        key, exclusive, limiter = self._classify(request)
+        if key is not None:
+            self._acquire_path(key, exclusive).result()
+        try:
+            if limiter is None:
+                return handler(request)
+            limiter.acquire().result()
+            try:
+                return handler(request)
+            finally:
+                limiter.release()
+        finally:
+            if key is not None:
+                self._release_path(key, exclusive)
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[ToolMessage | Command]],
+    ) -> ToolMessage | Command:
+        """(async) Run the tool call once its path and concurrency class have a free slot.
+
+        Args:
+            request: The tool call request being processed.
+            handler: The handler function to call with the request.
+
+        Returns:
+            The tool result from the handler.
+        """
+        key, exclusive, limiter = self._classify(request)
+        if key is not None:
+            await _wait_for(
+                self._acquire_path(key, exclusive),
+                lambda: self._release_path(key, exclusive),
+                lambda: self._cancel_path(key),
+            )
+        try:
+            if limiter is None:
+                return await handler(request)
+            await _wait_for(limiter.acquire(), limiter.release, lambda: None)
+            try:
+                return await handler(request)
+            finally:
+                limiter.release()
+        finally:
+            if key is not None:
+                self._release_path(key, exclusive)
+
+
+__all__ = ["CPU", "DEFAULT_TOOL_CLASSES", "EXCLUSIVE", "IO", "ToolConcurrencyMiddleware"]
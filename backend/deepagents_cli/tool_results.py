@@ -0,0 +1,255 @@
+"""Spill oversized tool results to files.
+
+Every tool result stays in the message history and is resent on every later
+model call of the thread, so one large API response or web page can cost more
+than the rest of the conversation. ``ToolResultSpilloverMiddleware`` writes
+results above a size threshold to a file in ``spill_dir`` and replaces them
+with a compact summary: the file path and size, an outline (markdown headings
+or the JSON structure) and a short preview. The agent then reads the parts it
+needs with ``read_file`` or ``grep``.
+
+deepagents' own ``FilesystemMiddleware`` wraps this middleware and moves
+results over 80,000 characters to ``/large_tool_results``. With ``max_chars``
+below that, it only ever sees the summaries written here, so its eviction
+applies only to results this middleware leaves alone (``excluded_tools``, or
+when spilling is disabled).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import re
+import threading
+from collections.abc import Awaitable, Callable, Iterable
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from langchain.agents.middleware.types import AgentMiddleware
+from langchain_core.messages import ToolMessage
+
+if TYPE_CHECKING:
+    from langchain.agents.middleware.types import ToolCallRequest
+    from langgraph.types import Command
+
+logger = logging.getLogger(__name__)
+
+# Tools whose results are never spilled; read_file is how the agent reads spilled files back
+DEFAULT_EXCLUDED_TOOLS = frozenset({"read_file"})
+
+_HEADING = re.compile(r"^(#{1,4})\s+(.+?)\s*#*$")
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9_.-]+")
+
+# A text field holding at least this share of a JSON result is written out as is
+_DOMINANT_FIELD_SHARE = 0.5
+
+_MAX_OUTLINE_ITEMS = 40
+_MAX_SCHEMA_LINES = 40
+_MAX_FIELD_CHARS = 200
+
+
+def _markdown_outline(text: str) -> list[str]:
+    outline = []
+    in_code = False
+    for number, line in enumerate(text.splitlines(), start=1):
+        if line.startswith("```"):
+            in_code = not in_code
+            continue
+        match = None if in_code else _HEADING.match(line)
+        if match:
+            indent = "  " * (len(match.group(1)) - 1)
+            outline.append(f"{indent}- {match.group(2)} (line {number})")
+            if len(outline) >= _MAX_OUTLINE_ITEMS:
+                outline.append("- ...")
+                break
+    return outline
+
+
+def _json_schema(
+    value: Any, key: str = "", depth: int = 0, lines: list[str] | None = None
+) -> list[str]:
+    """Describe the shape of a JSON value, one line per key (lists show their first item)."""
+    if lines is None:
+        lines = []
+    if len(lines) >= _MAX_SCHEMA_LINES:
+        return lines
+    indent = "  " * depth
+    label = f"{key}: " if key else ""
+
+    if isinstance(value, dict):
+        lines.append(f"{indent}{label}object ({len(value)} keys)")
+        if depth < 4:
+            for child_key, child in value.items():
+                _json_schema(child, str(child_key), depth + 1, lines)
+    elif isinstance(value, list):
+        lines.append(f"{indent}{label}array ({len(value)} items)")
+        if value and depth < 4:
+            _json_schema(value[0], "[0]", depth + 1, lines)
+    elif isinstance(value, str):
+        lines.append(f"{indent}{label}string ({len(value):,} chars)")
+    elif isinstance(value, bool) or value is None:
+        lines.append(f"{indent}{label}{json.dumps(value)}")
+    else:
+        lines.append(f"{indent}{label}{type(value).__name__}")
+    return lines
+
+
+def _short(value: Any) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    return text if len(text) <= _MAX_FIELD_CHARS else text[:_MAX_FIELD_CHARS] + "..."
+
+
+class ToolResultSpilloverMiddleware(AgentMiddleware):
+    """Replace oversized tool results with a file reference and a summary."""
+
+    def __init__(
+        self,
+        *,
+        spill_dir: str | Path,
+        max_chars: int = 20_000,
+        preview_chars: int = 2_000,
+        excluded_tools: Iterable[str] = DEFAULT_EXCLUDED_TOOLS,
+        max_files: int = 200,
+    ) -> None:
+        """Initialize the spillover middleware.
+
+        Args:
+            spill_dir: Directory the full results are written to. It must be
+                readable with the agent's file tools.
+            max_chars: Results longer than this many characters are spilled.
+            preview_chars: Characters of the result kept inline as a preview.
+            excluded_tools: Tools whose results are always kept inline.
+            max_files: Spilled files kept in ``spill_dir`` (oldest are deleted).
+        """
+        super().__init__()
+        self.spill_dir = Path(spill_dir)
+        self.max_chars = max_chars
+        self.preview_chars = preview_chars
+        self.excluded_tools = frozenset(excluded_tools)
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def _spill(self, message: ToolMessage) -> ToolMessage:
+        content = message.content
+        if (
+            not isinstance(content, str)
+            or len(content) <= self.max_chars
+            or message.name in self.excluded_tools
+        ):
+            return message
+        try:
+            summary = self._write(message.name or "tool", message.tool_call_id, content)
+        except OSError:
+            logger.warning(
+                "Could not spill the %s result to %s", message.name, self.spill_dir, exc_info=True
+            )
+            return message
+        return message.model_copy(update={"content": summary})
+
+    def _write(self, tool_name: str, tool_call_id: str, content: str) -> str:
+        try:
+            data = json.loads(content)
+        except ValueError:
+            data = None
+
+        fields: dict[str, Any] = {}
+        schema: list[str] = []
+        if isinstance(data, dict):
+            # e.g. fetch_url: write the markdown itself so it can be read by line
+            key, text = max(
+                ((k, v) for k, v in data.items() if isinstance(v, str)),
+                key=lambda item: len(item[1]),
+                default=(None, ""),
+            )
+            if key is not None and len(text) >= len(content) * _DOMINANT_FIELD_SHARE:
+                fields = {k: v for k, v in data.items() if k != key}
+                fields[key] = f"<{len(text):,} characters, saved to the file>"
+                data = None
+                content = text
+        if data is not None:
+            schema = _json_schema(data)
+            if len(schema) >= _MAX_SCHEMA_LINES:
+                schema.append("...")
+            content = json.dumps(data, ensure_ascii=False, indent=2)
+            suffix = ".json"
+        else:
+            outline = _markdown_outline(content)
+            suffix = ".md" if outline else ".txt"
+
+        name = _UNSAFE_NAME.sub("_", f"{tool_name}-{tool_call_id}")[-120:]
+        path = self.spill_dir / f"{name}{suffix}"
+        with self._lock:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            path.write_text(content, encoding="utf-8")
+            self._prune()
+
+        line_count = content.count("\n") + 1
+        parts = [
+            f"The {tool_name} result was too large to include "
+            f"({len(content):,} characters, {line_count:,} lines). The full result was saved to:",
+            f"  {path}",
+            "Read the parts you need with read_file (offset and limit are in lines) "
+            "or search it with grep instead of requesting it again.",
+        ]
+        if fields:
+            listed = "\n".join(f"- {k}: {_short(v)}" for k, v in fields.items())
+            parts.append(f"\nFields:\n{listed}")
+        if schema:
+            parts.append("\nStructure:\n" + "\n".join(schema))
+        elif suffix == ".md":
+            parts.append("\nOutline:\n" + "\n".join(outline))
+        preview = content[: self.preview_chars]
+        parts.append(f"\nPreview (first {len(preview):,} characters):\n{preview}")
+        if len(preview) < len(content):
+            parts.append("...")
+        return "\n".join(parts)
+
+    def _prune(self) -> None:
+        # Called with the lock held
+        files = sorted(
+            (p for p in self.spill_dir.iterdir() if p.is_file()),
+            key=lambda p: p.stat().st_mtime,
+        )
+        for old in files[: max(0, len(files) - self.max_files)]:
+            old.unlink(missing_ok=True)
+
+    def wrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], ToolMessage | Command],
+    ) -> ToolMessage | Command:
+        """Run the tool and spill its result if it is too large.
+
+        Args:
+            request: The tool call request being processed.
+            handler: The handler function to call with the request.
+
+        Returns:
+            The tool result, or a summary pointing at the spilled file.
+        """
+        result = handler(request)
+        return self._spill(result) if isinstance(result, ToolMessage) else result
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[ToolMessage | Command]],
+    ) -> ToolMessage | Command:
+        """(async) Run the tool and spill its result if it is too large.
+
+        Args:
+            request: The tool call request being processed.
+            handler: The handler function to call with the request.
+
+        Returns:
+            The tool result, or a summary pointing at the spilled file.
+        """
+        result = await handler(request)
+        if not isinstance(result, ToolMessage):
+            return result
+        # File writes are small but blocking
+        return await asyncio.to_thread(self._spill, result)
+
+
+__all__ = ["ToolResultSpilloverMiddleware"]
@@ -1,18 +1,38 @@
 """Custom tools for the CLI agent."""
 
+import asyncio
+import functools
+import time
+from collections.abc import Awaitable, Callable
 from typing import Any, Literal
+from urllib.parse import urlsplit
 
-import requests
-from markdownify import markdownify
+import httpx
+from langchain_core.tools import StructuredTool
 # from tavily import TavilyClient
 
+from deepagents_cli import http_cache, http_client
 from deepagents_cli.config import settings
+from deepagents_cli.html_content import html_to_markdown
 
 # Initialize Tavily client if API key is available
 tavily_client = None
 
+# Version of the HTML-to-markdown conversion; bump it when the conversion changes
+# so markdown stored in the HTTP cache is regenerated
+MARKDOWN_VERSION = 2
 
-def http_request(
+# fetch_url downloads at most this many bytes of a page
+FETCH_URL_MAX_BYTES = 2 * 1024 * 1024
+# Default number of markdown characters fetch_url returns per call
+FETCH_URL_MAX_CHARS = 20_000
+# fetch_urls accepts at most this many URLs per call
+FETCH_URLS_MAX_URLS = 20
+# Concurrent fetch_urls requests to the same host (politeness limit)
+FETCH_URLS_PER_HOST = 2
+
+
+async def _http_request(
     url: str,
     method: str = "GET",
     headers: dict[str, str] | None = None,
@@ -34,7 +54,7 @@ def http_request(
         Dictionary with response data including status, headers, and content
     """
     try:
-        kwargs = {"url": url, "method": method.upper(), "timeout": timeout}
+        kwargs: dict[str, Any] = {"timeout": timeout}
 
         if headers:
             kwargs["headers"] = headers
@@ -44,24 +64,27 @@ def http_request(
             if isinstance(data, dict):
                 kwargs["json"] = data
             else:
-                kwargs["data"] = data
+                kwargs["content"] = data
 
-        response = requests.request(**kwargs)
+        response = await http_client.request(method, url, **kwargs)
 
         try:
             content = response.json()
-        except:
+        except ValueError:
             content = response.text
 
-        return {
+        result = {
             "success": response.status_code < 400,
             "status_code": response.status_code,
             "headers": dict(response.headers),
             "content": content,
             "url": response.url,
         }
+        if response.truncated:
+            result["truncated"] = True
+        return result
 
-    except requests.exceptions.Timeout:
+    except TimeoutError:
         return {
             "success": False,
             "status_code": 0,
@@ -69,7 +92,7 @@ def http_request(
             "content": f"Request timed out after {timeout} seconds",
             "url": url,
         }
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return {
             "success": False,
             "status_code": 0,
@@ -137,24 +160,31 @@ def web_search(
         return {"error": f"Web search error: {e!s}", "query": query}
 
 
-def fetch_url(url: str, timeout: int = 30) -> dict[str, Any]:
+async def _fetch_url(
+    url: str, timeout: int = 30, offset: int = 0, max_chars: int = FETCH_URL_MAX_CHARS
+) -> dict[str, Any]:
     """Fetch content from a URL and convert HTML to markdown format.
 
-    This tool fetches web page content and converts it to clean markdown text,
-    making it easy to read and process HTML content. After receiving the markdown,
-    you MUST synthesize the information into a natural, helpful response for the user.
+    This tool fetches web page content and converts its main content to clean
+    markdown text (navigation, scripts and other page chrome are removed). Long
+    pages are returned in pieces: if `next_offset` is present, call again with
+    `offset=next_offset` to read the rest. After receiving the markdown, you MUST
+    synthesize the information into a natural, helpful response for the user.
 
     Args:
         url: The URL to fetch (must be a valid HTTP/HTTPS URL)
         timeout: Request timeout in seconds (default: 30)
+        offset: Character offset in the markdown to start reading from (default: 0)
+        max_chars: Maximum number of characters to return (default: 20000)
 
     Returns:
         Dictionary containing:
-        - success: Whether the request succeeded
         - url: The final URL after redirects
-        - markdown_content: The page content converted to markdown
+        - markdown_content: The requested part of the page as markdown
         - status_code: HTTP status code
-        - content_length: Length of the markdown content in characters
+        - content_length: Length of the returned markdown in characters
+        - total_length: Length of the whole page's markdown in characters
+        - next_offset: Offset of the next part (only if more content remains)
 
     IMPORTANT: After using this tool:
     1. Read through the markdown content
@@ -163,21 +193,140 @@ def fetch_url(url: str, timeout: int = 30) -> dict[str, Any]:
     4. NEVER show the raw markdown to the user unless specifically requested
     """
     try:
-        response = requests.get(
-            url,
-            timeout=timeout,
-            headers={"User-Agent": "Mozilla/5.0 (compatible; DeepAgents/1.0)"},
+        fetched = await http_cache.cached_get(
+            url, timeout=timeout, max_bytes=FETCH_URL_MAX_BYTES
         )
-        response.raise_for_status()
+        if fetched.status_code >= 400:
+            msg = f"HTTP {fetched.status_code} for url '{fetched.url}'"
+            raise httpx.HTTPError(msg)
 
-        # Convert HTML content to markdown
-        markdown_content = markdownify(response.text)
+        entry = fetched.entry
+        if entry is not None and entry.markdown_version == MARKDOWN_VERSION:
+            markdown_content = entry.markdown
+        else:
+            # CPU-bound conversion: keep it off the event loop
+            markdown_content = await asyncio.to_thread(
+                _to_markdown, fetched.text, fetched.content_type
+            )
+            cache = http_cache.get_http_cache()
+            if entry is not None and cache is not None:
+                await asyncio.to_thread(
+                    cache.set_markdown, entry.url, markdown_content, MARKDOWN_VERSION
+                )
 
-        return {
-            "url": str(response.url),
-            "markdown_content": markdown_content,
-            "status_code": response.status_code,
-            "content_length": len(markdown_content),
+        offset = max(0, offset)
+        end = _page_end(markdown_content, offset, max(1, max_chars))
+        page = markdown_content[offset:end]
+        result: dict[str, Any] = {
+            "url": fetched.url,
+            "markdown_content": page,
+            "status_code": fetched.status_code,
+            "content_length": len(page),
+            "total_length": len(markdown_content),
+            "cache": fetched.status,
         }
+        if end < len(markdown_content):
+            result["next_offset"] = end
+        if fetched.truncated:
+            result["download_truncated"] = (
+                f"Only the first {FETCH_URL_MAX_BYTES} bytes of the page were downloaded."
+            )
+        return result
+    except TimeoutError:
+        return {"error": f"Fetch URL error: timed out after {timeout}s", "url": url}
     except Exception as e:
-        return {"error": f"Fetch URL error: {e!s}", "url": url}
\ No newline at end of file
+        return {"error": f"Fetch URL error: {e!s}", "url": url}
+
+
+async def _fetch_urls(
+    urls: list[str], timeout: int = 60, max_chars_per_url: int = 8_000
+) -> dict[str, Any]:
+    """Fetch several URLs concurrently and convert each page to markdown.
+
+    Use this instead of calling fetch_url repeatedly when you need more than one
+    page. Pages are fetched in parallel (a few at a time per host), and every URL
+    gets its own result, so one failing URL does not fail the others. Pages that
+    could not be fetched within the overall time budget are reported as errors.
+    To read more of a page whose result has `next_offset`, call fetch_url with
+    that URL and `offset=next_offset`.
+
+    Args:
+        urls: The URLs to fetch (HTTP/HTTPS, at most 20; duplicates are fetched once)
+        timeout: Time budget in seconds for the whole batch (default: 60)
+        max_chars_per_url: Maximum number of markdown characters returned per page (default: 8000)
+
+    Returns:
+        Dictionary containing:
+        - results: One entry per URL, in the given order, with the same fields as
+          fetch_url (url, markdown_content, status_code, ...) or `error` and `url`
+        - succeeded: Number of pages fetched
+        - failed: Number of URLs that failed or ran out of time
+    """
+    unique_urls = list(dict.fromkeys(urls))
+    skipped = unique_urls[FETCH_URLS_MAX_URLS:]
+    unique_urls = unique_urls[:FETCH_URLS_MAX_URLS]
+    deadline = time.monotonic() + timeout
+    host_limits: dict[str, asyncio.Semaphore] = {}
+
+    async def fetch(url: str) -> dict[str, Any]:
+        host = urlsplit(url).netloc.lower()
+        semaphore = host_limits.setdefault(host, asyncio.Semaphore(FETCH_URLS_PER_HOST))
+        async with semaphore:
+            remaining = round(deadline - time.monotonic(), 1)
+            return await _fetch_url(
+                url, timeout=max(0.1, min(30, remaining)), max_chars=max_chars_per_url
+            )
+
+    tasks = [asyncio.create_task(fetch(url)) for url in unique_urls]
+    if tasks:
+        await asyncio.wait(tasks, timeout=max(0, deadline - time.monotonic()))
+
+    pending = [task for task in tasks if not task.done()]
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    results: list[dict[str, Any]] = []
+    for url, task in zip(unique_urls, tasks, strict=True):
+        if task.cancelled() or task.exception() is not None:
+            results.append({"error": f"Not fetched within the {timeout}s time budget", "url": url})
+        else:
+            results.append(task.result())
+    results.extend(
+        {"error": f"Skipped: at most {FETCH_URLS_MAX_URLS} URLs per call", "url": url}
+        for url in skipped
+    )
+
+    failed = sum("error" in result for result in results)
+    return {"results": results, "succeeded": len(results) - failed, "failed": failed}
+
+
+def _page_end(text: str, offset: int, max_chars: int) -> int:
+    end = offset + max_chars
+    if end >= len(text):
+        return len(text)
+    # Prefer ending the page at a line break in its second half
+    newline = text.rfind("\n", offset + max_chars // 2, end)
+    return newline + 1 if newline != -1 else end
+
+
+def _to_markdown(text: str, content_type: str) -> str:
+    if "html" in content_type or not content_type:
+        return html_to_markdown(text)
+    # Plain text, markdown, JSON, ... are returned as they are
+    return text
+
+
+def _async_tool(coroutine: Callable[..., Awaitable[Any]], name: str) -> StructuredTool:
+    """Expose an async tool with a blocking variant that shares the pooled client."""
+
+    @functools.wraps(coroutine)
+    def func(*args: Any, **kwargs: Any) -> Any:
+        return http_client.run_sync(coroutine(*args, **kwargs))
+
+    return StructuredTool.from_function(func=func, coroutine=coroutine, name=name)
+
+
+http_request = _async_tool(_http_request, "http_request")
+fetch_url = _async_tool(_fetch_url, "fetch_url")
+fetch_urls = _async_tool(_fetch_urls, "fetch_urls")
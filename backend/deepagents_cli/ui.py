@@ -13,6 +13,7 @@ from rich.text import Text
 
 from .config import COLORS, COMMANDS, DEEP_AGENTS_ASCII, MAX_ARG_LENGTH, console
 from .file_ops import FileOperationRecord
+from .token_utils import ContextBreakdown
 
 
 def truncate_value(value: str, max_length: int = MAX_ARG_LENGTH) -> str:
@@ -133,6 +134,14 @@ def format_tool_display(tool_name: str, tool_args: dict) -> str:
             url = truncate_value(url, 80)
             return f'{tool_name}("{url}")'
 
+    elif tool_name == "fetch_urls":
+        # Fetch URLs: show the first URL and how many there are
+        urls = tool_args.get("urls")
+        if isinstance(urls, list) and urls:
+            first = truncate_value(str(urls[0]), 60)
+            more = f", +{len(urls) - 1} more" if len(urls) > 1 else ""
+            return f'{tool_name}("{first}"{more})'
+
     elif tool_name == "task":
         # Task: show the task description
         if "description" in tool_args:
@@ -174,18 +183,20 @@ class TokenTracker:
     """Track token usage across the conversation."""
 
     def __init__(self) -> None:
-        self.baseline_context = 0  # Baseline system context (system + agent.md + tools)
+        self.baseline = ContextBreakdown()  # Parts known before the first call
+        self.baseline_context = 0  # Baseline system context (system + memory + skills + tools)
         self.current_context = 0  # Total context including messages
         self.last_output = 0
 
-    def set_baseline(self, tokens: int) -> None:
-        """Set the baseline context token count.
+    def set_baseline(self, baseline: ContextBreakdown) -> None:
+        """Set the baseline context breakdown.
 
         Args:
-            tokens: The baseline token count (system prompt + agent.md + tools)
+            baseline: Token counts of the system prompt, memory, skills and tools
         """
-        self.baseline_context = tokens
-        self.current_context = tokens
+        self.baseline = baseline
+        self.baseline_context = baseline.total
+        self.current_context = baseline.total
 
     def reset(self) -> None:
         """Reset to baseline (for /clear command)."""
@@ -206,34 +217,77 @@ class TokenTracker:
             console.print(f"  Current context: {self.current_context:,} tokens", style="dim")
 
     def display_session(self) -> None:
-        """Display current context size."""
+        """Display current context size, broken down by component."""
         console.print("\n[bold]Token Usage:[/bold]", style=COLORS["primary"])
 
         # Check if we've had any actual API calls yet (current > baseline means we have conversation)
         has_conversation = self.current_context > self.baseline_context
+        approx = "" if self.baseline.exact else "~"
 
-        if self.baseline_context > 0:
-            console.print(
-                f"  Baseline: {self.baseline_context:,} tokens [dim](system + agent.md)[/dim]",
-                style=COLORS["dim"],
-            )
-
-            if not has_conversation:
-                # Before first message - warn that tools aren't counted yet
-                console.print(
-                    "  [dim]Note: Tool definitions (~5k tokens) included after first message[/dim]"
-                )
+        for label, tokens in (
+            ("System prompt", self.baseline.system),
+            ("Memory (agent.md)", self.baseline.memory),
+            ("Skills", self.baseline.skills),
+            ("Tool definitions", self.baseline.tools),
+        ):
+            if tokens:
+                console.print(f"  {label}: {approx}{tokens:,} tokens", style=COLORS["dim"])
 
         if has_conversation:
-            tools_and_conversation = self.current_context - self.baseline_context
+            history = self.current_context - self.baseline_context
             console.print(
-                f"  Tools + conversation: {tools_and_conversation:,} tokens", style=COLORS["dim"]
+                f"  History: {approx}{history:,} tokens [dim](messages + built-in prompts)[/dim]",
+                style=COLORS["dim"],
             )
 
         console.print(f"  Total: {self.current_context:,} tokens", style="bold " + COLORS["dim"])
+        if approx:
+            console.print("  [dim]~ Estimated locally (the model's tokenizer was unavailable)[/dim]")
         console.print()
 
 
+def render_run_stats(summary: dict[str, Any] | None) -> None:
+    """Display model and tool timings recorded for the session."""
+    console.print("\n[bold]Run Stats:[/bold]", style=COLORS["primary"])
+    if not summary or not summary["steps"]:
+        console.print("  No model or tool calls recorded yet.", style=COLORS["dim"])
+        console.print()
+        return
+
+    model = summary["model"]
+    ttft = model["ttft_ms_p50"]
+    console.print(
+        f"  Model: {model['calls']} calls, {model['total_ms'] / 1000:.1f}s"
+        + (f" [dim](first token p50 {ttft / 1000:.2f}s)[/dim]" if ttft is not None else ""),
+        style=COLORS["dim"],
+    )
+    console.print(
+        f"  Tokens: {model['input_tokens']:,} in ({model['cached_tokens']:,} cached), "
+        f"{model['output_tokens']:,} out",
+        style=COLORS["dim"],
+    )
+    if model["calls"]:
+        console.print(
+            f"  Prompt cache: {model.get('cache_hits', 0)}/{model['calls']} calls hit, "
+            f"{model.get('cache_write_tokens', 0):,} tokens written",
+            style=COLORS["dim"],
+        )
+
+    tools = summary["tools"]
+    console.print(
+        f"  Tools: {tools['calls']} calls, {tools['total_ms'] / 1000:.1f}s", style=COLORS["dim"]
+    )
+    # Slowest tools first
+    for name, stats in list(tools["by_name"].items())[:10]:
+        errors = f", {stats['errors']} failed" if stats["errors"] else ""
+        console.print(
+            f"    {name}: {stats['calls']}x, {stats['total_ms'] / 1000:.2f}s total, "
+            f"max {stats['max_ms'] / 1000:.2f}s, {stats['result_chars']:,} chars{errors}",
+            style=COLORS["dim"],
+        )
+    console.print()
+
+
 def render_todo_list(todos: list[dict]) -> None:
     """Render todo list as a rich Panel with checkboxes."""
     if not todos:
@@ -632,6 +686,9 @@ def show_help() -> None:
     console.print("  /help           Show available commands and features", style=COLORS["dim"])
     console.print("  /clear          Clear screen and reset conversation", style=COLORS["dim"])
     console.print("  /tokens         Show token usage for current session", style=COLORS["dim"])
+    console.print(
+        "  /stats          Show model and tool timings for current session", style=COLORS["dim"]
+    )
     console.print("  /quit, /exit    Exit the session", style=COLORS["dim"])
     console.print(
         "  quit, exit, q   Exit the session (just type and press Enter)", style=COLORS["dim"]
@@ -1,42 +1,174 @@
 """Cloud Storage utilities for downloading agent configuration files."""
+import base64
+import hashlib
+import json
 import os
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Optional
+
+from file_api.local_bucket import LOCAL_BUCKET_SCHEME, LocalBucket
 
 logger = logging.getLogger(__name__)
 
 
+# 並列ダウンロード数
+GCS_DOWNLOAD_WORKERS = int(os.getenv("GCS_DOWNLOAD_WORKERS", "8"))
+
+# 同期マニフェストの保存先（ダウンロード先のワークスペース内には置かない）
+GCS_SYNC_STATE_DIR = Path(os.getenv(
+    "GCS_SYNC_STATE_DIR",
+    str(Path.home() / ".cache" / "deepagents" / "gcs_sync")
+))
+
+_storage_client = None
+_storage_client_lock = threading.Lock()
+
+
+def get_bucket(bucket_name: str):
+    """
+    Get a bucket handle.
+
+    Args:
+        bucket_name: GCS bucket name, or "file:///path" for a local
+            filesystem-backed bucket (tests / local development)
+
+    Returns:
+        google.cloud.storage.Bucket or LocalBucket
+    """
+    if bucket_name.startswith(LOCAL_BUCKET_SCHEME):
+        return LocalBucket.from_url(bucket_name)
+
+    from google.cloud import storage
+
+    # クライアントはプロセス内で共有（認証・コネクションプールの再利用）
+    global _storage_client
+    with _storage_client_lock:
+        if _storage_client is None:
+            _storage_client = storage.Client()
+    return _storage_client.bucket(bucket_name)
+
+
+def _manifest_path(bucket_name: str, source_prefix: str, destination_dir: str) -> Path:
+    key = f"{bucket_name}|{source_prefix}|{Path(destination_dir).resolve()}"
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+    return GCS_SYNC_STATE_DIR / f"{digest}.json"
+
+
+def _load_manifest(path: Path) -> Dict[str, Dict[str, Any]]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return data.get("objects", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(path: Path, objects: Dict[str, Dict[str, Any]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps({"version": 1, "objects": objects}), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def _file_md5_base64(path: Path) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return base64.b64encode(digest.digest()).decode("ascii")
+
+
+def _file_crc32c_base64(path: Path) -> Optional[str]:
+    try:
+        import google_crc32c
+    except ImportError:
+        return None
+    checksum = google_crc32c.Checksum()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            checksum.update(chunk)
+    return base64.b64encode(checksum.digest()).decode("ascii")
+
+
+def local_file_matches_blob(local_path: Path, blob, entry: Optional[Dict[str, Any]]) -> bool:
+    """
+    Check whether the local file already has the blob's content.
+
+    Cheap path: the manifest recorded this generation and the local size+mtime
+    are unchanged since. Otherwise compare the stored MD5 (or CRC32C for
+    composite objects, which have no MD5).
+    """
+    try:
+        stat = local_path.stat()
+    except OSError:
+        return False
+
+    if (
+        entry is not None
+        and entry.get("generation") == blob.generation
+        and entry.get("size") == stat.st_size
+        and entry.get("mtime_ns") == stat.st_mtime_ns
+    ):
+        return True
+
+    if blob.size is not None and stat.st_size != blob.size:
+        return False
+    if blob.md5_hash:
+        return _file_md5_base64(local_path) == blob.md5_hash
+    if blob.crc32c:
+        return _file_crc32c_base64(local_path) == blob.crc32c
+    return False
+
+
+def _manifest_entry(blob, local_path: Path) -> Dict[str, Any]:
+    stat = local_path.stat()
+    return {
+        "generation": blob.generation,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "md5": blob.md5_hash,
+        "crc32c": blob.crc32c,
+    }
+
+
 def download_from_gcs(
     bucket_name: str,
     source_prefix: str,
-    destination_dir: str
+    destination_dir: str,
+    *,
+    bucket=None,
+    max_workers: Optional[int] = None,
 ) -> bool:
     """
     Download agent_config directory from Google Cloud Storage.
 
+    Downloads run concurrently on a bounded worker pool. Files whose local copy
+    already matches the object (manifest generation + size/mtime, or MD5/CRC32C)
+    are skipped, and a local manifest of object generations is kept under
+    GCS_SYNC_STATE_DIR so later syncs only transfer changed objects.
+
     Args:
-        bucket_name: GCS bucket name
+        bucket_name: GCS bucket name (or "file:///path" for a local bucket)
         source_prefix: Source path prefix in GCS (e.g., "agent_config")
         destination_dir: Local destination directory (e.g., "/root")
+        bucket: Optional bucket object to use instead of resolving bucket_name
+        max_workers: Maximum concurrent downloads (default: GCS_DOWNLOAD_WORKERS)
 
     Returns:
         True if successful, False otherwise
     """
     try:
-        from google.cloud import storage
-
         logger.info(f"Downloading agent_config from gs://{bucket_name}/{source_prefix} to {destination_dir}")
 
         # Normalize prefix so we can strip it from blob paths reliably.
         # We store downloaded files under destination_dir *without* the prefix path.
         normalized_prefix = (source_prefix or "").strip("/")
         prefix_with_slash = f"{normalized_prefix}/" if normalized_prefix else ""
-        print(f"prefix_with_slash: {prefix_with_slash}")
 
-        # Initialize GCS client
-        client = storage.Client()
-        bucket = client.bucket(bucket_name)
+        if bucket is None:
+            bucket = get_bucket(bucket_name)
 
         # List all blobs with the given prefix
         # IMPORTANT: GCS prefix match is a simple string prefix.
@@ -45,7 +177,12 @@ def download_from_gcs(
         list_prefix = prefix_with_slash if prefix_with_slash else None
         blobs = bucket.list_blobs(prefix=list_prefix)
 
-        download_count = 0
+        manifest_path = _manifest_path(str(bucket_name), normalized_prefix, destination_dir)
+        manifest = _load_manifest(manifest_path)
+        new_manifest: Dict[str, Dict[str, Any]] = {}
+
+        pending = []
+        skip_count = 0
         for blob in blobs:
             # Skip directory markers
             if blob.name.endswith('/'):
@@ -67,16 +204,45 @@ def download_from_gcs(
                 continue
             local_file_path = Path(destination_dir) / relative_path
 
+            if local_file_matches_blob(local_file_path, blob, manifest.get(blob.name)):
+                new_manifest[blob.name] = _manifest_entry(blob, local_file_path)
+                skip_count += 1
+                continue
+
+            pending.append((blob, local_file_path))
+
+        def _download(blob, local_file_path: Path) -> Dict[str, Any]:
             # Create parent directories
             local_file_path.parent.mkdir(parents=True, exist_ok=True)
-
-            # Download the file
             blob.download_to_filename(str(local_file_path))
-            download_count += 1
             logger.debug(f"Downloaded: {blob.name} -> {local_file_path}")
+            return _manifest_entry(blob, local_file_path)
 
-        logger.info(f"Successfully downloaded {download_count} files from Cloud Storage")
-        return True
+        download_count = 0
+        failed = 0
+        if pending:
+            workers = max(1, min(max_workers or GCS_DOWNLOAD_WORKERS, len(pending)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gcs-download") as executor:
+                futures = {
+                    executor.submit(_download, blob, local_file_path): blob
+                    for blob, local_file_path in pending
+                }
+                for future in as_completed(futures):
+                    blob = futures[future]
+                    try:
+                        new_manifest[blob.name] = future.result()
+                        download_count += 1
+                    except Exception as e:
+                        failed += 1
+                        logger.error(f"Failed to download {blob.name}: {e}")
+
+        _save_manifest(manifest_path, new_manifest)
+
+        logger.info(
+            f"Successfully downloaded {download_count} files from Cloud Storage "
+            f"({skip_count} unchanged, {failed} failed)"
+        )
+        return failed == 0
 
     except Exception as e:
         logger.error(f"Failed to download agent_config from Cloud Storage: {e}")
@@ -124,6 +290,11 @@ def ensure_files(
     return False
 
 
+def user_workspace_prefix(user_id: str) -> str:
+    """Return the GCS prefix holding a user's workspace."""
+    return f"/{os.getenv("GCS_WORKSPACE_PREFIX")}/workspace_{user_id}"
+
+
 def download_user_workspace_from_gcs(user_id: str, destination_dir: str) -> bool:
     """
     Download user-specific workspace from Google Cloud Storage.
@@ -145,7 +316,7 @@ def download_user_workspace_from_gcs(user_id: str, destination_dir: str) -> bool
         return False
 
     # Try user-specific workspace first
-    user_specific_prefix = f"/{os.getenv("GCS_WORKSPACE_PREFIX")}/workspace_{user_id}"
+    user_specific_prefix = user_workspace_prefix(user_id)
     logger.info(f"Attempting to download user-specific workspace from {user_specific_prefix}")
 
     if download_from_gcs(
@@ -2,6 +2,10 @@
 import os
 import logging
 from pathlib import Path
+from typing import Dict, Optional
+
+from file_api.lazy_workspace import LAZY_CACHE_MAX_BYTES, WORKSPACE_HYDRATION_MODE, LazyWorkspace
+from file_api.workspace_registry import WorkspaceRegistry
 
 logger = logging.getLogger(__name__)
 
@@ -21,10 +25,63 @@ WATCH_DIR = WATCH_DIR_BASE / "default"
 WATCH_DIR.mkdir(parents=True, exist_ok=True)
 
 
+# lazyモードのユーザーごとのワークスペース（オブジェクト一覧のみ同期済み）
+lazy_workspaces: Dict[str, LazyWorkspace] = {}
+
+
+def get_lazy_workspace(user_id: str) -> Optional[LazyWorkspace]:
+    """Return the user's LazyWorkspace, or None when hydration is eager."""
+    workspace = lazy_workspaces.get(user_id)
+    if workspace is None and WORKSPACE_HYDRATION_MODE == "lazy":
+        # 既存ディレクトリ（再起動前に一覧同期済み）の場合はマニフェストから復元
+        workspace = LazyWorkspace.load(WATCH_DIR_BASE / user_id, cache_max_bytes=LAZY_CACHE_MAX_BYTES)
+        if workspace is not None:
+            lazy_workspaces[user_id] = workspace
+    return workspace
+
+
+def _hydrate_user_workspace(user_id: str, destination_dir: str) -> bool:
+    """Hydrate a user's workspace from GCS (runs in a background worker)."""
+    from file_api import cloud_storage as cs
+
+    bucket_name = os.getenv("GCS_BUCKET")
+    if WORKSPACE_HYDRATION_MODE == "lazy" and bucket_name:
+        # 一覧のみ同期し、ファイル本体は初回アクセス時またはプリフェッチで取得
+        logger.info(f"Syncing workspace listing for user {user_id} (lazy mode)")
+        workspace = LazyWorkspace(bucket_name, cs.user_workspace_prefix(user_id), Path(destination_dir))
+        try:
+            workspace.sync_listing()
+        except Exception as e:
+            logger.error(f"Failed to sync workspace listing for user {user_id}: {e}")
+            return False
+        lazy_workspaces[user_id] = workspace
+        workspace.prefetch()
+        return True
+
+    logger.info(f"Downloading workspace for user {user_id}")
+    return cs.download_user_workspace_from_gcs(user_id, destination_dir)
+
+
+# ワークスペースのハイドレーション待ちの最大秒数（超えた場合は 503 + Retry-After）
+WORKSPACE_HYDRATION_WAIT = float(os.getenv("WORKSPACE_HYDRATION_WAIT", "10"))
+
+workspace_registry = WorkspaceRegistry(
+    WATCH_DIR_BASE,
+    hydrate=_hydrate_user_workspace,
+    max_workers=int(os.getenv("WORKSPACE_HYDRATION_WORKERS", "4")),
+    # 失敗したハイドレーションを再試行するまでの秒数
+    retry_after=float(os.getenv("WORKSPACE_HYDRATION_RETRY_SECONDS", "30")),
+)
+
+
 def get_user_watch_dir(user_id: str) -> Path:
     """
     Get the watch directory for a specific user.
-    Creates the directory if it doesn't exist, and downloads workspace from GCS if needed.
+    Creates the directory if it doesn't exist, and schedules a one-time
+    background download of the workspace from GCS if needed.
+
+    This never blocks on the download; use workspace_registry.wait_ready()
+    to wait for hydration to finish.
 
     Args:
         user_id: User ID
@@ -32,23 +89,8 @@ def get_user_watch_dir(user_id: str) -> Path:
     Returns:
         Path to user's watch directory
     """
-    user_dir = WATCH_DIR_BASE / user_id
-
-    # Check if the user directory already exists and has content
-    user_dir_exists = user_dir.exists() and any(user_dir.iterdir())
-
-    if not user_dir_exists:
-        # Create the directory
-        user_dir.mkdir(parents=True, exist_ok=True)
-
-        # Download workspace from GCS for this user
-        from file_api import cloud_storage as cs
-        logger.info(f"Downloading workspace for user {user_id}")
-
-        if not cs.download_user_workspace_from_gcs(user_id, str(user_dir)):
-            logger.warning(f"Failed to download workspace for user {user_id}, using empty directory")
-
-    return user_dir
+    workspace_registry.ensure(user_id)
+    return workspace_registry.user_dir(user_id)
 
 
 # CORS設定
@@ -2,7 +2,7 @@
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler, FileSystemEvent
 from pathlib import Path
-from typing import Callable, List
+from typing import Callable, List, Set
 import asyncio
 
 
@@ -18,6 +18,8 @@ class FileWatcher:
         self.watch_path = watch_path
         self.observer = Observer()
         self.listeners: List[Callable] = []
+        # 移動元の削除も受け取るリスナー（書き戻し・lazy マニフェスト用）
+        self.move_source_listeners: Set[Callable] = set()
         self.event_handler = self._create_handler()
         self.event_loop = event_loop
 
@@ -36,13 +38,19 @@ class FileWatcher:
                 watcher._notify("deleted", event.src_path, event.is_directory)
 
             def on_moved(self, event: FileSystemEvent):
+                # 移動元は削除として通知（書き戻し先の古いオブジェクトを消すため）。
+                # WebSocket などの通常のリスナーには従来どおり "moved" のみ送る
+                watcher._notify(
+                    "deleted", event.src_path, event.is_directory,
+                    listeners=list(watcher.move_source_listeners),
+                )
                 watcher._notify("moved", event.dest_path, event.is_directory)
 
         return Handler()
 
-    def _notify(self, event_type: str, path: str, is_directory: bool):
-        """全リスナーに通知"""
-        for listener in self.listeners:
+    def _notify(self, event_type: str, path: str, is_directory: bool, listeners=None):
+        """全リスナー（listeners 指定時はそのリスナーのみ）に通知"""
+        for listener in self.listeners if listeners is None else listeners:
             try:
                 # 非同期関数の場合はメインスレッドのイベントループで実行
                 if asyncio.iscoroutinefunction(listener):
@@ -66,14 +74,23 @@ class FileWatcher:
             except Exception as e:
                 print(f"Error notifying listener: {e}")
 
-    def add_listener(self, callback: Callable):
-        """リスナー追加"""
+    def add_listener(self, callback: Callable, move_sources: bool = False):
+        """
+        リスナー追加
+
+        Args:
+            callback: (event_type, path, is_directory) を受け取る関数
+            move_sources: True の場合、移動元のパスも "deleted" として受け取る
+        """
         self.listeners.append(callback)
+        if move_sources:
+            self.move_source_listeners.add(callback)
 
     def remove_listener(self, callback: Callable):
         """リスナー削除"""
         if callback in self.listeners:
             self.listeners.remove(callback)
+        self.move_source_listeners.discard(callback)
 
     def start(self):
         """ファイル監視開始"""
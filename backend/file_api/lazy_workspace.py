@@ -0,0 +1,550 @@
+"""Lazy, on-demand workspace hydration from object storage.
+
+Instead of downloading a whole workspace prefix up front, only the object
+listing (names, sizes, mtimes) is synced into a local manifest. Directory
+listings are served from the manifest merged with local files, and file bytes
+are fetched on first read (file API or agent) or by a background prefetch.
+
+Hydrated files form a local disk cache bounded by size: once the total size of
+clean hydrated files exceeds the limit, the least recently used ones are
+removed again (they remain listed and are re-fetched on the next read).
+The size total and the LRU order are kept up to date on hydration, access,
+eviction and local writes (FileWatcher events); the workspace is only scanned
+once, the first time eviction is needed.
+A hydrated file is "clean" while its size and mtime still equal the object's,
+so files modified locally are never evicted, and the write-back uploader can
+skip clean files without comparing them with the remote object.
+
+Downloads are staged in a hidden directory next to the workspace (on the same
+filesystem) and moved into place, so watchers of the workspace only see the
+finished file, never a partial download.
+
+The manifest is stored on disk (under GCS_SYNC_STATE_DIR) so that other
+processes working on the same workspace, such as the LangGraph agent server,
+can load it with LazyWorkspace.load() (or the cached LazyWorkspace.shared())
+and list and hydrate files themselves.
+"""
+import hashlib
+import json
+import logging
+import errno
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from file_api.cloud_storage import GCS_SYNC_STATE_DIR, get_bucket
+
+logger = logging.getLogger(__name__)
+
+# ハイドレーション方式: "eager"（従来通り全ダウンロード）または "lazy"
+WORKSPACE_HYDRATION_MODE = os.getenv("WORKSPACE_HYDRATION_MODE", "eager").lower()
+# ローカルキャッシュ（ハイドレーション済みファイル）の上限サイズ
+LAZY_CACHE_MAX_BYTES = int(os.getenv("LAZY_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+# バックグラウンドでプリフェッチする合計サイズ
+LAZY_PREFETCH_BYTES = int(os.getenv("LAZY_PREFETCH_BYTES", str(64 * 1024 * 1024)))
+# プリフェッチ対象とする1ファイルの最大サイズ
+LAZY_PREFETCH_MAX_FILE_BYTES = int(os.getenv("LAZY_PREFETCH_MAX_FILE_BYTES", str(1024 * 1024)))
+
+
+def _lazy_manifest_path(workspace_dir: Path) -> Path:
+    digest = hashlib.sha256(str(workspace_dir.resolve()).encode("utf-8")).hexdigest()[:32]
+    return GCS_SYNC_STATE_DIR / "lazy" / f"{digest}.json"
+
+
+def _staging_dir(workspace_dir: Path) -> Path:
+    """ダウンロード途中のファイルの置き場所（ワークスペースの外・同じファイルシステム）"""
+    return workspace_dir.parent / f".{workspace_dir.name}.hydrating"
+
+
+# LazyWorkspace.shared() のキャッシュ（ワークスペース -> (マニフェストの mtime, インスタンス)）
+_shared: Dict[str, Tuple[int, "LazyWorkspace"]] = {}
+_shared_lock = threading.Lock()
+
+
+class LazyWorkspace:
+    """
+    オブジェクト一覧だけを同期し、ファイル本体は必要時に取得するワークスペース
+
+    - list_dir(): マニフェスト + ローカルファイルから一覧を返す
+    - ensure_local(): 初回アクセス時にダウンロード（パス単位で single-flight）
+    - prefetch(): 小さい最近のファイルをバックグラウンドで取得
+    """
+
+    def __init__(
+        self,
+        bucket_name: str,
+        source_prefix: str,
+        workspace_dir: Path,
+        *,
+        bucket=None,
+        cache_max_bytes: Optional[int] = LAZY_CACHE_MAX_BYTES,
+        max_workers: int = 4,
+    ):
+        """
+        Args:
+            bucket_name: GCS bucket name (or "file:///path" for a local bucket)
+            source_prefix: Object prefix holding the workspace
+            workspace_dir: Local workspace directory
+            bucket: Optional bucket object to use instead of resolving bucket_name
+            cache_max_bytes: Upper bound for the total size of clean hydrated files,
+                or None to disable eviction
+            max_workers: Maximum concurrent downloads
+        """
+        self.bucket_name = bucket_name
+        normalized_prefix = (source_prefix or "").strip("/")
+        self.source_prefix = normalized_prefix
+        self._prefix = f"{normalized_prefix}/" if normalized_prefix else ""
+        self.workspace_dir = workspace_dir
+        self.cache_max_bytes = cache_max_bytes
+        self._bucket = bucket
+        self._objects: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        # クリーンなハイドレーション済みファイル（パス -> サイズ、古く使われた順）
+        self._cached: "OrderedDict[str, int]" = OrderedDict()
+        self._cached_bytes = 0
+        self._cache_indexed = False
+        self._evicted: Set[str] = set()
+        self._max_workers = max_workers
+        # ダウンロードするまでスレッドを作らない（一覧表示だけの利用ではスレッド不要）
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers, thread_name_prefix="lazy-hydrate"
+                )
+            return self._executor
+
+    @property
+    def bucket(self):
+        if self._bucket is None:
+            self._bucket = get_bucket(self.bucket_name)
+        return self._bucket
+
+    # ---- manifest ----
+
+    @classmethod
+    def load(
+        cls, workspace_dir: Path, cache_max_bytes: Optional[int] = None
+    ) -> Optional["LazyWorkspace"]:
+        """
+        Load a lazy workspace from its on-disk manifest.
+
+        By default the loaded instance hydrates files but never evicts them;
+        eviction is left to the process that owns the workspace (the file API server).
+
+        Args:
+            workspace_dir: Local workspace directory
+            cache_max_bytes: Cache bound, or None to disable eviction
+
+        Returns:
+            LazyWorkspace, or None if the workspace was not hydrated lazily
+        """
+        try:
+            data = json.loads(_lazy_manifest_path(workspace_dir).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        workspace = cls(data["bucket"], data["prefix"], workspace_dir, cache_max_bytes=cache_max_bytes)
+        workspace._objects = data.get("objects", {})
+        return workspace
+
+    @classmethod
+    def shared(cls, workspace_dir: Path) -> Optional["LazyWorkspace"]:
+        """
+        Return this process's instance for a workspace (see load()).
+
+        The instance is kept for the life of the process and its listing is
+        reloaded whenever the manifest on disk changes.
+
+        Returns:
+            LazyWorkspace, or None if the workspace was not hydrated lazily
+        """
+        try:
+            manifest_mtime = _lazy_manifest_path(workspace_dir).stat().st_mtime_ns
+        except OSError:
+            return None
+        key = str(workspace_dir.resolve())
+        with _shared_lock:
+            cached = _shared.get(key)
+        if cached is not None and cached[0] == manifest_mtime:
+            return cached[1]
+
+        loaded = cls.load(workspace_dir)
+        if loaded is None:
+            return None
+        with _shared_lock:
+            cached = _shared.get(key)
+            if cached is None:
+                workspace = loaded
+            else:
+                workspace = cached[1]
+                with workspace._lock:
+                    workspace._objects = loaded._objects
+            _shared[key] = (manifest_mtime, workspace)
+        return workspace
+
+    def _save_manifest(self) -> None:
+        path = _lazy_manifest_path(self.workspace_dir)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with self._lock:
+            data = {
+                "version": 1,
+                "bucket": self.bucket_name,
+                "prefix": self.source_prefix,
+                "objects": dict(self._objects),
+            }
+        tmp_path.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def sync_listing(self) -> int:
+        """
+        Sync the object listing (names, sizes, mtimes) into the manifest.
+
+        Returns:
+            Number of objects listed
+        """
+        objects: Dict[str, Dict[str, Any]] = {}
+        for blob in self.bucket.list_blobs(prefix=self._prefix or None):
+            if blob.name.endswith("/"):
+                continue
+            relative_path = blob.name[len(self._prefix):]
+            if not relative_path:
+                continue
+            objects[relative_path] = {
+                "size": blob.size,
+                "mtime": blob.updated.timestamp() if blob.updated else time.time(),
+                "generation": blob.generation,
+            }
+        with self._lock:
+            self._objects = objects
+            # 一覧が変わったのでキャッシュの集計は次回の破棄時に取り直す
+            self._cache_indexed = False
+        self._save_manifest()
+        logger.info(f"Synced listing of {len(objects)} objects for {self.workspace_dir}")
+        return len(objects)
+
+    def forget(self, relative_path: str) -> None:
+        """Drop a file or directory subtree from the manifest (e.g. after deletion)."""
+        relative_path = relative_path.strip("/")
+        with self._lock:
+            for name in list(self._objects):
+                if name == relative_path or name.startswith(f"{relative_path}/"):
+                    del self._objects[name]
+                    # 一覧にないファイルはキャッシュ（破棄対象）でもない
+                    self._cached_bytes -= self._cached.pop(name, 0)
+        self._save_manifest()
+
+    def on_change(self, event_type: str, src_path: str, is_directory: bool) -> None:
+        """
+        FileWatcher listener: forget objects deleted locally (but not evicted ones)
+        and keep the cache accounting in sync with local writes.
+        """
+        try:
+            relative_path = Path(src_path).relative_to(self.workspace_dir).as_posix()
+        except ValueError:
+            return
+        if event_type != "deleted":
+            if not is_directory:
+                # ローカルで変更されたファイルはクリーンでなくなる（破棄対象から外す）
+                self._track(relative_path, self._clean_size(relative_path))
+            return
+        self._track(relative_path, None)
+        if relative_path in self._evicted:
+            self._evicted.discard(relative_path)
+            return
+        if self.has(relative_path):
+            self.forget(relative_path)
+
+    # ---- listing ----
+
+    def has(self, relative_path: str) -> bool:
+        """Return True if the path is a listed object or a directory of listed objects."""
+        relative_path = relative_path.strip("/")
+        if not relative_path:
+            return True
+        with self._lock:
+            if relative_path in self._objects:
+                return True
+            dir_prefix = f"{relative_path}/"
+            return any(name.startswith(dir_prefix) for name in self._objects)
+
+    def is_dir(self, relative_path: str) -> bool:
+        """Return True if the path is a directory locally or in the manifest."""
+        relative_path = relative_path.strip("/")
+        if (self.workspace_dir / relative_path).is_dir():
+            return True
+        return self.has(relative_path) and relative_path not in self._objects
+
+    def list_dir(self, relative_dir: str) -> List[Dict[str, Any]]:
+        """
+        List a directory from the manifest merged with local files.
+
+        Args:
+            relative_dir: Directory relative to the workspace root ("" for root)
+
+        Returns:
+            Items in the same format as the /api/files listing
+        """
+        relative_dir = relative_dir.strip("/")
+        dir_prefix = f"{relative_dir}/" if relative_dir else ""
+        items: Dict[str, Dict[str, Any]] = {}
+
+        with self._lock:
+            objects = list(self._objects.items())
+        for name, meta in objects:
+            if not name.startswith(dir_prefix):
+                continue
+            child, _, rest = name[len(dir_prefix):].partition("/")
+            child_path = f"{dir_prefix}{child}"
+            if rest:
+                entry = items.setdefault(child, {
+                    "name": child, "path": child_path, "type": "directory",
+                    "size": 0, "modified": meta["mtime"], "extension": None,
+                })
+                entry["modified"] = max(entry["modified"], meta["mtime"])
+            else:
+                suffix = PurePosixPath(child).suffix
+                items[child] = {
+                    "name": child, "path": child_path, "type": "file",
+                    "size": meta["size"], "modified": meta["mtime"],
+                    "extension": suffix[1:] if suffix else None,
+                }
+
+        # ローカルの実ファイルを優先（ローカルでの変更・新規作成を反映）
+        local_dir = self.workspace_dir / relative_dir
+        if local_dir.is_dir():
+            for item in local_dir.iterdir():
+                stat = item.stat()
+                is_file = item.is_file()
+                items[item.name] = {
+                    "name": item.name,
+                    "path": str(item.relative_to(self.workspace_dir)),
+                    "type": "file" if is_file else "directory",
+                    "size": stat.st_size if is_file else 0,
+                    "modified": stat.st_mtime,
+                    "extension": item.suffix[1:] if is_file and item.suffix else None,
+                }
+
+        return sorted(items.values(), key=lambda x: (x["type"] != "directory", x["name"].lower()))
+
+    def glob(self, pattern: str, relative_dir: str = "") -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        List the objects under a directory whose path matches a glob pattern.
+
+        The pattern is matched at any depth below the directory, like Path.rglob().
+
+        Returns:
+            (relative path, manifest entry) pairs
+        """
+        relative_dir = relative_dir.strip("/")
+        dir_prefix = f"{relative_dir}/" if relative_dir else ""
+        full_pattern = f"**/{pattern.lstrip('/')}"
+        with self._lock:
+            objects = list(self._objects.items())
+        return [
+            (name, meta)
+            for name, meta in objects
+            if name.startswith(dir_prefix)
+            and PurePosixPath(name[len(dir_prefix):]).full_match(full_pattern)
+        ]
+
+    # ---- hydration ----
+
+    def ensure_local(self, relative_path: str) -> bool:
+        """
+        Make sure a listed file is present on local disk, downloading it if needed.
+
+        Concurrent callers for the same path wait on a single download.
+
+        Args:
+            relative_path: File path relative to the workspace root
+
+        Returns:
+            True if the file is available locally
+        """
+        relative_path = relative_path.strip("/")
+        self._touch(relative_path)
+        if (self.workspace_dir / relative_path).exists():
+            return True
+        future = self._submit(relative_path)
+        return future is not None and future.result()
+
+    def ensure_local_many(self, relative_paths: Iterable[str]) -> None:
+        """Download the listed files that are missing locally, in parallel, and wait for them."""
+        futures = []
+        for relative_path in relative_paths:
+            relative_path = relative_path.strip("/")
+            self._touch(relative_path)
+            if not (self.workspace_dir / relative_path).exists():
+                futures.append(self._submit(relative_path))
+        for future in futures:
+            if future is not None:
+                future.result()
+
+    def _submit(self, relative_path: str) -> Optional[Future]:
+        """Start (or join) the download of a listed file."""
+        executor = self.executor
+        with self._lock:
+            if relative_path not in self._objects:
+                return None
+            future = self._inflight.get(relative_path)
+            if future is not None:
+                return future
+            future = executor.submit(self._download, relative_path)
+            self._inflight[relative_path] = future
+
+        def done(_: Future) -> None:
+            with self._lock:
+                if self._inflight.get(relative_path) is future:
+                    del self._inflight[relative_path]
+
+        future.add_done_callback(done)
+        return future
+
+    def _download(self, relative_path: str) -> bool:
+        local_path = self.workspace_dir / relative_path
+        meta = self._objects.get(relative_path)
+        if meta is None:
+            return False
+        # ワークスペース外にダウンロードしてから移動（監視対象に一時ファイルのイベントを出さない）
+        staging_dir = _staging_dir(self.workspace_dir)
+        tmp_path = staging_dir / uuid.uuid4().hex
+        try:
+            staging_dir.mkdir(parents=True, exist_ok=True)
+            local_path.parent.mkdir(parents=True, exist_ok=True)
+            self.bucket.blob(f"{self._prefix}{relative_path}").download_to_filename(str(tmp_path))
+            # mtime をオブジェクトに合わせる（未変更=キャッシュ破棄可能の判定に使う）
+            os.utime(tmp_path, (time.time(), meta["mtime"]))
+            try:
+                os.replace(tmp_path, local_path)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                # ワークスペースが別のファイルシステム（マウント）の場合はコピー
+                shutil.move(str(tmp_path), str(local_path))
+            logger.debug(f"Hydrated {relative_path}")
+        except Exception as e:
+            logger.error(f"Failed to hydrate {relative_path}: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return False
+        self._track(relative_path, self._clean_size(relative_path))
+        self._evict_if_needed(keep=relative_path)
+        return True
+
+    def prefetch(self, max_bytes: int = LAZY_PREFETCH_BYTES) -> None:
+        """Fetch small, recently modified files in the background."""
+        with self._lock:
+            candidates = sorted(self._objects.items(), key=lambda item: item[1]["mtime"], reverse=True)
+        budget = min(max_bytes, self.cache_max_bytes or max_bytes)
+        for relative_path, meta in candidates:
+            if meta["size"] > LAZY_PREFETCH_MAX_FILE_BYTES or meta["size"] > budget:
+                continue
+            budget -= meta["size"]
+            if not (self.workspace_dir / relative_path).exists():
+                self._submit(relative_path)
+
+    # ---- cache eviction ----
+
+    def is_clean(self, relative_path: str) -> bool:
+        """Return True if the local file is a hydrated copy still identical to its object."""
+        return self._clean_size(relative_path.strip("/")) is not None
+
+    def _clean_size(self, relative_path: str) -> Optional[int]:
+        """Size of the local file if it is clean, else None."""
+        meta = self._objects.get(relative_path)
+        if meta is None:
+            return None
+        stat = self._is_clean(relative_path, meta)
+        return stat.st_size if stat is not None else None
+
+    def _is_clean(self, relative_path: str, meta: Dict[str, Any]) -> Optional[os.stat_result]:
+        try:
+            stat = (self.workspace_dir / relative_path).stat()
+        except OSError:
+            return None
+        if stat.st_size == meta["size"] and abs(stat.st_mtime - meta["mtime"]) < 1e-3:
+            return stat
+        return None
+
+    def _touch(self, relative_path: str) -> None:
+        """Mark a cached file as most recently used."""
+        with self._lock:
+            if relative_path in self._cached:
+                self._cached.move_to_end(relative_path)
+
+    def _track(self, relative_path: str, size: Optional[int]) -> None:
+        """Record a clean file of the given size (most recently used), or drop it if None."""
+        if self.cache_max_bytes is None:
+            return
+        with self._lock:
+            if not self._cache_indexed:
+                # 初回のスキャンで現在の状態をまとめて取り込む
+                return
+            self._cached_bytes -= self._cached.pop(relative_path, 0)
+            if size is not None:
+                self._cached[relative_path] = size
+                self._cached_bytes += size
+
+    def _index_cache(self) -> None:
+        """Scan the workspace once for clean hydrated files (e.g. left from a previous run)."""
+        with self._lock:
+            if self._cache_indexed:
+                return
+            objects = list(self._objects.items())
+        cached = []
+        for relative_path, meta in objects:
+            stat = self._is_clean(relative_path, meta)
+            if stat is not None:
+                cached.append((stat.st_atime, relative_path, stat.st_size))
+        with self._lock:
+            if self._cache_indexed:
+                return
+            self._cached = OrderedDict((path, size) for _, path, size in sorted(cached))
+            self._cached_bytes = sum(self._cached.values())
+            self._cache_indexed = True
+
+    def _evict_if_needed(self, keep: Optional[str] = None) -> None:
+        if self.cache_max_bytes is None:
+            return
+        self._index_cache()
+        victims = []
+        with self._lock:
+            if self._cached_bytes <= self.cache_max_bytes:
+                return
+            for relative_path, size in list(self._cached.items()):
+                if self._cached_bytes <= self.cache_max_bytes:
+                    break
+                if relative_path == keep:
+                    continue
+                del self._cached[relative_path]
+                self._cached_bytes -= size
+                victims.append(relative_path)
+        for relative_path in victims:
+            # 変更イベントより先に書き換えられている可能性があるので削除直前に再確認
+            meta = self._objects.get(relative_path)
+            if meta is None or self._is_clean(relative_path, meta) is None:
+                continue
+            try:
+                # 削除イベントを「ユーザーによる削除」と区別するため先に記録
+                self._evicted.add(relative_path)
+                (self.workspace_dir / relative_path).unlink()
+                logger.debug(f"Evicted {relative_path} from local cache")
+            except OSError:
+                self._evicted.discard(relative_path)
+                continue
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,126 @@
+"""Filesystem-backed stand-in for a Google Cloud Storage bucket.
+
+Implements the subset of the ``google.cloud.storage`` Bucket/Blob API used by
+``cloud_storage`` so the sync layer can run against a local directory, for
+tests and local development. Select it with ``GCS_BUCKET=file:///some/dir``.
+
+Object metadata mirrors GCS semantics closely enough for sync decisions:
+``generation`` changes on every write, ``md5_hash`` is the base64 MD5 digest.
+"""
+import base64
+import hashlib
+import os
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional
+
+LOCAL_BUCKET_SCHEME = "file://"
+
+
+def _md5_base64(path: Path) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return base64.b64encode(digest.digest()).decode("ascii")
+
+
+class LocalBlob:
+    """A single object stored as a file under the bucket root."""
+
+    def __init__(self, bucket: "LocalBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+        self.chunk_size: Optional[int] = None
+        self.size: Optional[int] = None
+        self.generation: Optional[int] = None
+        self.md5_hash: Optional[str] = None
+        self.crc32c: Optional[str] = None
+        self.updated: Optional[datetime] = None
+
+    @property
+    def _path(self) -> Path:
+        return self.bucket.root / self.name
+
+    def exists(self) -> bool:
+        return self._path.is_file()
+
+    def reload(self) -> None:
+        """Refresh metadata from the backing file."""
+        stat = self._path.stat()
+        self.size = stat.st_size
+        self.generation = stat.st_mtime_ns
+        self.md5_hash = _md5_base64(self._path)
+        self.updated = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+
+    def download_to_filename(self, filename: str) -> None:
+        shutil.copyfile(self._path, filename)
+
+    def upload_from_filename(self, filename: str) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path.with_name(f".{self._path.name}.uploading")
+        shutil.copyfile(filename, tmp_path)
+        os.replace(tmp_path, self._path)
+        self.reload()
+
+    def upload_from_file(self, file_obj: BinaryIO, size: Optional[int] = None) -> None:
+        """Upload ``size`` bytes (or the rest) from the current file position."""
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path.with_name(f".{self._path.name}.uploading")
+        with open(tmp_path, "wb") as out:
+            if size is None:
+                shutil.copyfileobj(file_obj, out)
+            else:
+                out.write(file_obj.read(size))
+        os.replace(tmp_path, self._path)
+        self.reload()
+
+    def compose(self, sources: List["LocalBlob"]) -> None:
+        """Concatenate source objects into this object (like GCS compose)."""
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path.with_name(f".{self._path.name}.composing")
+        with open(tmp_path, "wb") as out:
+            for source in sources:
+                with open(source._path, "rb") as f:
+                    shutil.copyfileobj(f, out)
+        os.replace(tmp_path, self._path)
+        self.reload()
+
+    def delete(self) -> None:
+        self._path.unlink()
+
+
+class LocalBucket:
+    """Bucket whose objects are the files below ``root``."""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self.name = str(self.root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_url(cls, url: str) -> "LocalBucket":
+        """Create a bucket from a ``file:///path`` URL."""
+        return cls(url[len(LOCAL_BUCKET_SCHEME):])
+
+    def blob(self, name: str) -> LocalBlob:
+        return LocalBlob(self, name)
+
+    def get_blob(self, name: str) -> Optional[LocalBlob]:
+        blob = self.blob(name)
+        if not blob.exists():
+            return None
+        blob.reload()
+        return blob
+
+    def list_blobs(self, prefix: Optional[str] = None) -> Iterator[LocalBlob]:
+        for path in sorted(self.root.rglob("*")):
+            if not path.is_file() or path.name.startswith("."):
+                continue
+            name = path.relative_to(self.root).as_posix()
+            if prefix and not name.startswith(prefix):
+                continue
+            blob = self.blob(name)
+            blob.reload()
+            yield blob
@@ -0,0 +1,154 @@
+"""Registry of resolved user workspaces and their hydration state."""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+STATUS_IDLE = "idle"
+STATUS_HYDRATING = "hydrating"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+
+class WorkspaceRegistry:
+    """
+    ユーザーワークスペースの準備状態を管理するレジストリ
+
+    - 準備状態をユーザーごとにキャッシュ（リクエスト毎の iterdir を回避）
+    - GCS からのハイドレーションはユーザーごとに1回だけバックグラウンドで実行
+    - 同時に来た初回リクエストは同じジョブ（Future）を待つ（single-flight）
+    - 失敗したハイドレーションは retry_after 秒経過後の次の ensure() で再実行
+    """
+
+    def __init__(
+        self,
+        base_dir: Path,
+        hydrate: Callable[[str, str], bool],
+        max_workers: int = 4,
+        retry_after: float = 30.0,
+    ):
+        """
+        Args:
+            base_dir: Base directory containing one workspace per user
+            hydrate: Callable (user_id, destination_dir) -> bool that populates
+                the workspace (e.g. cloud_storage.download_user_workspace_from_gcs)
+            max_workers: Maximum number of concurrent hydration jobs
+            retry_after: Seconds after a failed hydration before ensure() retries it
+        """
+        self.base_dir = base_dir
+        self._hydrate = hydrate
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Future] = {}
+        self._status: Dict[str, str] = {}
+        self._failed_at: Dict[str, float] = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="workspace-hydrate"
+        )
+
+    def user_dir(self, user_id: str) -> Path:
+        """Return the workspace directory for a user (no I/O)."""
+        return self.base_dir / user_id
+
+    def ensure(self, user_id: str) -> Future:
+        """
+        Resolve a user's workspace, starting hydration if needed.
+
+        The directory is created synchronously so it can be watched immediately.
+        Only the first call per user touches the filesystem; later calls return
+        the cached job, except that a failed hydration is retried once
+        retry_after seconds have passed.
+
+        Args:
+            user_id: User ID
+
+        Returns:
+            Future that completes when the workspace is ready
+        """
+        with self._lock:
+            job = self._jobs.get(user_id)
+            if job is not None and not self._should_retry(user_id):
+                return job
+
+            user_dir = self.user_dir(user_id)
+            job = Future()
+            self._jobs[user_id] = job
+
+            # 既に内容があるディレクトリはダウンロード不要
+            if user_dir.exists() and any(user_dir.iterdir()):
+                self._status[user_id] = STATUS_READY
+                job.set_result(user_dir)
+                return job
+
+            user_dir.mkdir(parents=True, exist_ok=True)
+            self._status[user_id] = STATUS_HYDRATING
+
+        logger.info(f"Scheduling workspace hydration for user {user_id}")
+        self._executor.submit(self._run_hydration, user_id, user_dir, job)
+        return job
+
+    def _should_retry(self, user_id: str) -> bool:
+        # Called with the lock held
+        failed_at = self._failed_at.get(user_id)
+        if failed_at is None or time.monotonic() - failed_at < self.retry_after:
+            return False
+        del self._failed_at[user_id]
+        logger.info(f"Retrying workspace hydration for user {user_id}")
+        return True
+
+    def _run_hydration(self, user_id: str, user_dir: Path, job: Future) -> None:
+        try:
+            ok = self._hydrate(user_id, str(user_dir))
+        except Exception as e:
+            logger.error(f"Workspace hydration crashed for user {user_id}: {e}")
+            ok = False
+
+        with self._lock:
+            if ok:
+                self._status[user_id] = STATUS_READY
+                logger.info(f"Workspace for user {user_id} is ready")
+            else:
+                # 失敗時も空ディレクトリとして利用可能にし、retry_after 経過後に再試行する
+                self._status[user_id] = STATUS_FAILED
+                self._failed_at[user_id] = time.monotonic()
+                logger.warning(f"Failed to hydrate workspace for user {user_id}, using empty directory")
+        job.set_result(user_dir)
+
+    def status(self, user_id: str) -> str:
+        """
+        Return the hydration status for a user without starting hydration.
+
+        Returns:
+            "idle" (not requested yet), "hydrating", "ready" or "failed"
+        """
+        with self._lock:
+            return self._status.get(user_id, STATUS_IDLE)
+
+    async def wait_ready(self, user_id: str, timeout: Optional[float]) -> Path:
+        """
+        Wait (without blocking the event loop) for a user's workspace.
+
+        Args:
+            user_id: User ID
+            timeout: Maximum seconds to wait, or None to wait until hydration ends
+
+        Returns:
+            Path to the user's workspace
+
+        Raises:
+            asyncio.TimeoutError: If hydration is still running after timeout
+        """
+        job = self.ensure(user_id)
+        if job.done():
+            return job.result()
+        # shield: タイムアウトしてもバックグラウンドのジョブはキャンセルしない
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job)), timeout)
+
+    def shutdown(self) -> None:
+        """Stop accepting new hydration jobs."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
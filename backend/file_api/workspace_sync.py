@@ -0,0 +1,271 @@
+"""Write-back sync of local user workspaces to Cloud Storage."""
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Optional, Set
+
+from file_api.cloud_storage import local_file_matches_blob
+
+logger = logging.getLogger(__name__)
+
+# Write-back の有効化（GCS_BUCKET が設定されている場合のみ動作）
+WORKSPACE_WRITEBACK = os.getenv("WORKSPACE_WRITEBACK", "false").lower() == "true"
+# 変更をまとめてアップロードする間隔（秒）
+WORKSPACE_WRITEBACK_INTERVAL = float(os.getenv("WORKSPACE_WRITEBACK_INTERVAL", "2"))
+# 並列アップロード数
+WORKSPACE_WRITEBACK_WORKERS = int(os.getenv("WORKSPACE_WRITEBACK_WORKERS", "4"))
+# シャットダウン時のフラッシュ期限（秒）。Cloud Run は SIGTERM 後 10 秒で停止する
+WORKSPACE_WRITEBACK_FLUSH_TIMEOUT = float(os.getenv("WORKSPACE_WRITEBACK_FLUSH_TIMEOUT", "8"))
+
+# これ以上のサイズはチャンク単位のレジューム可能アップロード
+RESUMABLE_CHUNK_SIZE = 8 * 1024 * 1024
+# これ以上のサイズは並列コンポジットアップロード
+COMPOSITE_THRESHOLD = int(os.getenv("WORKSPACE_COMPOSITE_THRESHOLD", str(64 * 1024 * 1024)))
+# コンポジットアップロードの1パートあたりのサイズ
+COMPOSITE_PART_SIZE = 16 * 1024 * 1024
+# GCS の compose は最大 32 ソース
+MAX_COMPOSE_SOURCES = 32
+
+
+class WorkspaceUploader:
+    """
+    ワークスペースの変更を GCS に書き戻すバックグラウンドアップローダー
+
+    FileWatcher のリスナーとして変更パスを集め、一定間隔でまとめて
+    並列アップロード（リトライ付き）する。削除されたパスはオブジェクトも削除する。
+    bucket には google.cloud.storage.Bucket または LocalBucket を渡せる。
+    """
+
+    def __init__(
+        self,
+        bucket,
+        workspace_dir: Path,
+        destination_prefix: str,
+        *,
+        batch_interval: float = WORKSPACE_WRITEBACK_INTERVAL,
+        max_workers: int = WORKSPACE_WRITEBACK_WORKERS,
+        max_retries: int = 3,
+        composite_threshold: int = COMPOSITE_THRESHOLD,
+        keep_remote: Optional[Callable[[str], bool]] = None,
+        is_unchanged: Optional[Callable[[str], bool]] = None,
+    ):
+        """
+        Args:
+            bucket: Bucket to upload to
+            workspace_dir: Local workspace directory being watched
+            destination_prefix: Object prefix for the workspace (e.g. "/prefix/workspace_user")
+            batch_interval: Seconds between batch flushes
+            max_workers: Maximum concurrent uploads
+            max_retries: Attempts per object before giving up on this batch
+            composite_threshold: File size above which parallel composite upload is used
+            keep_remote: Optional predicate; when it returns True for a path missing
+                locally, the remote object is kept (e.g. files evicted from a lazy cache)
+            is_unchanged: Optional predicate; when it returns True for a changed local
+                file, the change is ignored (e.g. files just hydrated from the bucket)
+        """
+        self.bucket = bucket
+        self.workspace_dir = workspace_dir.resolve()
+        normalized_prefix = destination_prefix.strip("/")
+        self.prefix = f"{normalized_prefix}/" if normalized_prefix else ""
+        self.batch_interval = batch_interval
+        self.max_retries = max_retries
+        self.composite_threshold = composite_threshold
+        self.keep_remote = keep_remote
+        self.is_unchanged = is_unchanged
+
+        self._dirty: Set[str] = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="workspace-upload"
+        )
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- FileWatcher listener ----
+
+    def on_change(self, event_type: str, src_path: str, is_directory: bool) -> None:
+        """変更パスを記録（FileWatcher のスレッドから呼ばれる）"""
+        try:
+            relative_path = Path(src_path).resolve().relative_to(self.workspace_dir).as_posix()
+        except (ValueError, OSError):
+            return
+        if relative_path == ".":
+            return
+        # 新規ディレクトリ自体は GCS 上に存在しない（中身のファイルイベントで反映される）
+        if is_directory and event_type in ("created", "modified"):
+            return
+        # リモートと同一のファイル（lazy モードのハイドレーション直後など）はアップロード不要
+        if event_type != "deleted" and self.is_unchanged is not None and self.is_unchanged(relative_path):
+            return
+        with self._lock:
+            self._dirty.add(relative_path)
+
+    # ---- lifecycle ----
+
+    def start(self) -> None:
+        """バックグラウンドのフラッシュスレッドを開始"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name=f"workspace-writeback-{self.workspace_dir.name}", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.batch_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Workspace write-back flush failed for {self.workspace_dir}: {e}")
+
+    def stop(self, timeout: float = WORKSPACE_WRITEBACK_FLUSH_TIMEOUT) -> bool:
+        """
+        Stop the background thread and flush pending changes within a deadline.
+
+        Args:
+            timeout: Maximum seconds to spend flushing
+
+        Returns:
+            True if every pending change was uploaded before the deadline
+        """
+        self._stop_event.set()
+        deadline = time.monotonic() + timeout
+        if self._thread is not None:
+            self._thread.join(timeout=max(0.0, deadline - time.monotonic()))
+        flushed = self.flush(deadline=deadline)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        return flushed
+
+    # ---- sync ----
+
+    def flush(self, deadline: Optional[float] = None) -> bool:
+        """
+        Upload (or delete) every dirty path.
+
+        Args:
+            deadline: time.monotonic() value after which we stop waiting
+
+        Returns:
+            True if all dirty paths were synced
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._dirty = self._dirty, set()
+            if not batch:
+                return True
+
+            object_paths = self._expand(batch)
+            futures = {
+                self._executor.submit(self._sync_with_retry, relative_path, deadline): relative_path
+                for relative_path in object_paths
+            }
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, not_done = wait(futures, timeout=timeout)
+
+            failed = {futures[f] for f in done if not f.result()}
+            failed |= {futures[f] for f in not_done}
+            if failed:
+                # 次回のフラッシュで再試行
+                with self._lock:
+                    self._dirty |= failed
+                logger.warning(f"Write-back pending for {len(failed)} path(s) in {self.workspace_dir}")
+            else:
+                logger.info(f"Write-back synced {len(object_paths)} path(s) from {self.workspace_dir}")
+            return not failed
+
+    def _expand(self, batch: Set[str]) -> Set[str]:
+        """ディレクトリを配下のファイル（ローカル）/オブジェクト（リモート）に展開"""
+        paths: Set[str] = set()
+        for relative_path in batch:
+            local_path = self.workspace_dir / relative_path
+            if local_path.is_dir():
+                for child in local_path.rglob("*"):
+                    if child.is_file():
+                        paths.add(child.relative_to(self.workspace_dir).as_posix())
+            elif local_path.exists():
+                paths.add(relative_path)
+            else:
+                # 削除されたパス: ファイルかディレクトリかは不明なので両方を対象にする
+                paths.add(relative_path)
+                for blob in self.bucket.list_blobs(prefix=f"{self.prefix}{relative_path}/"):
+                    paths.add(blob.name[len(self.prefix):])
+        return paths
+
+    def _sync_with_retry(self, relative_path: str, deadline: Optional[float]) -> bool:
+        delay = 0.5
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                self._sync_one(relative_path)
+                return True
+            except Exception as e:
+                logger.warning(
+                    f"Write-back attempt {attempt}/{self.max_retries} failed for {relative_path}: {e}"
+                )
+                if deadline is not None and time.monotonic() + delay > deadline:
+                    break
+                time.sleep(delay)
+                delay *= 2
+        return False
+
+    def _sync_one(self, relative_path: str) -> None:
+        object_name = f"{self.prefix}{relative_path}"
+        local_path = self.workspace_dir / relative_path
+
+        if not local_path.is_file():
+            if self.keep_remote is not None and self.keep_remote(relative_path):
+                return
+            blob = self.bucket.get_blob(object_name)
+            if blob is not None:
+                blob.delete()
+                logger.debug(f"Deleted remote object: {object_name}")
+            return
+
+        # 既に同じ内容ならスキップ（ハイドレーション直後のイベントなど）
+        remote = self.bucket.get_blob(object_name)
+        if remote is not None and local_file_matches_blob(local_path, remote, None):
+            return
+
+        size = local_path.stat().st_size
+        if size >= self.composite_threshold:
+            self._composite_upload(local_path, object_name, size)
+        else:
+            blob = self.bucket.blob(object_name)
+            if size >= RESUMABLE_CHUNK_SIZE:
+                # chunk_size を設定するとチャンク単位のレジューム可能アップロードになる
+                blob.chunk_size = RESUMABLE_CHUNK_SIZE
+            blob.upload_from_filename(str(local_path))
+        logger.debug(f"Uploaded: {local_path} -> {object_name}")
+
+    def _composite_upload(self, local_path: Path, object_name: str, size: int) -> None:
+        """大きなファイルを分割して並列にアップロードし、compose で結合する"""
+        part_count = min(MAX_COMPOSE_SOURCES, max(2, -(-size // COMPOSITE_PART_SIZE)))
+        part_size = -(-size // part_count)
+        part_count = -(-size // part_size)
+        upload_id = uuid.uuid4().hex[:8]
+        parts = [
+            self.bucket.blob(f"{object_name}.__part_{upload_id}_{i:02d}")
+            for i in range(part_count)
+        ]
+
+        def _upload_part(index: int) -> None:
+            with open(local_path, "rb") as f:
+                f.seek(index * part_size)
+                parts[index].upload_from_file(f, size=min(part_size, size - index * part_size))
+
+        try:
+            # パートは専用スレッドで並列送信（バッチ用プールのデッドロックを避ける）
+            with ThreadPoolExecutor(max_workers=part_count, thread_name_prefix="composite-part") as pool:
+                for future in [pool.submit(_upload_part, i) for i in range(part_count)]:
+                    future.result()
+            self.bucket.blob(object_name).compose(parts)
+        finally:
+            for part in parts:
+                try:
+                    part.delete()
+                except Exception:
+                    pass
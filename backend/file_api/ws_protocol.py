@@ -0,0 +1,189 @@
+"""Wire encodings for the /ws file change notification protocol.
+
+The default encoding is one JSON text frame per event (backward compatible).
+Clients may negotiate a compact binary encoding through the WebSocket
+subprotocol header (``Sec-WebSocket-Protocol``):
+
+- ``file-events.msgpack.v1``: MessagePack batches (ormsgpack)
+- ``file-events.cbor.v1``: CBOR batches (requires the optional ``cbor2`` package)
+
+Compact batch format (one binary frame per batch)::
+
+    {
+        "d": {dir_id: "relative/dir", ...},   # new path-prefix dictionary entries
+        "e": [[event_code, dir_id, name, is_directory], ...],
+    }
+
+Dictionary entries are per connection: each directory prefix is sent once and
+later events refer to it by its integer id. ``dir_id`` 0 is the workspace root.
+"""
+import asyncio
+import logging
+from pathlib import PurePosixPath
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+JSON_ENCODING = "json"
+MSGPACK_SUBPROTOCOL = "file-events.msgpack.v1"
+CBOR_SUBPROTOCOL = "file-events.cbor.v1"
+
+# イベント種別の整数コード（compactモード用）
+EVENT_CODES = {
+    "created": 1,
+    "modified": 2,
+    "deleted": 3,
+    "moved": 4,
+}
+
+ROOT_DIR_ID = 0
+
+
+def _msgpack_dumps(obj: Any) -> bytes:
+    import ormsgpack
+
+    return ormsgpack.packb(obj, option=ormsgpack.OPT_NON_STR_KEYS)
+
+
+def _cbor_dumps(obj: Any) -> bytes:
+    import cbor2
+
+    return cbor2.dumps(obj)
+
+
+def _available_serializers() -> Dict[str, Callable[[Any], bytes]]:
+    """Return compact subprotocols whose serializer can be imported."""
+    serializers: Dict[str, Callable[[Any], bytes]] = {}
+    try:
+        import ormsgpack  # noqa: F401
+
+        serializers[MSGPACK_SUBPROTOCOL] = _msgpack_dumps
+    except ImportError:
+        pass
+    try:
+        import cbor2  # noqa: F401
+
+        serializers[CBOR_SUBPROTOCOL] = _cbor_dumps
+    except ImportError:
+        pass
+    return serializers
+
+
+def negotiate_subprotocol(requested: List[str]) -> Optional[str]:
+    """
+    Pick the first compact subprotocol requested by the client that we support.
+
+    Args:
+        requested: Subprotocols offered by the client, in preference order
+
+    Returns:
+        Selected subprotocol, or None to fall back to JSON
+    """
+    available = _available_serializers()
+    for subprotocol in requested:
+        if subprotocol in available:
+            return subprotocol
+    return None
+
+
+class CompactEventEncoder:
+    """
+    Per-connection encoder for compact batches.
+
+    Keeps the path-prefix dictionary for a single WebSocket connection so
+    that repeated directory prefixes are transmitted only once.
+    """
+
+    def __init__(self, subprotocol: str):
+        serializers = _available_serializers()
+        if subprotocol not in serializers:
+            raise ValueError(f"Unsupported subprotocol: {subprotocol}")
+        self.subprotocol = subprotocol
+        self._dumps = serializers[subprotocol]
+        self._dir_ids: Dict[str, int] = {"": ROOT_DIR_ID}
+
+    def _dir_id(self, directory: str, new_entries: Dict[int, str]) -> int:
+        dir_id = self._dir_ids.get(directory)
+        if dir_id is None:
+            dir_id = len(self._dir_ids)
+            self._dir_ids[directory] = dir_id
+            new_entries[dir_id] = directory
+        return dir_id
+
+    def encode_batch(self, events: List[Tuple[str, str, bool]]) -> bytes:
+        """
+        Encode a batch of events.
+
+        Args:
+            events: List of (event_type, relative_path, is_directory)
+
+        Returns:
+            Serialized batch frame
+        """
+        new_entries: Dict[int, str] = {}
+        encoded = []
+        for event_type, relative_path, is_directory in events:
+            path = PurePosixPath(relative_path)
+            directory = "" if str(path.parent) == "." else str(path.parent)
+            dir_id = self._dir_id(directory, new_entries)
+            encoded.append([EVENT_CODES.get(event_type, 0), dir_id, path.name, is_directory])
+        return self._dumps({"d": new_entries, "e": encoded})
+
+
+class EventBatcher:
+    """
+    Collect file events and flush them as one compact frame per window.
+
+    Events are appended from the event loop (FileWatcher dispatches async
+    listeners with run_coroutine_threadsafe) and flushed after ``flush_interval``
+    seconds or once ``max_batch_size`` events are queued.
+    """
+
+    def __init__(
+        self,
+        encoder: CompactEventEncoder,
+        send_bytes: Callable[[bytes], Awaitable[None]],
+        flush_interval: float = 0.05,
+        max_batch_size: int = 256,
+    ):
+        self.encoder = encoder
+        self._send_bytes = send_bytes
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self._pending: List[Tuple[str, str, bool]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def add(self, event_type: str, relative_path: str, is_directory: bool) -> None:
+        """Queue an event and schedule a flush."""
+        self._pending.append((event_type, relative_path, is_directory))
+        if len(self._pending) >= self.max_batch_size:
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        try:
+            await self.flush()
+        except Exception as e:
+            # The client may have disconnected; nobody awaits this task, so log instead of raising
+            logger.debug(f"Failed to flush file events: {e}")
+
+    async def flush(self) -> None:
+        """Send all queued events as a single frame."""
+        async with self._lock:
+            if not self._pending:
+                return
+            events, self._pending = self._pending, []
+            await self._send_bytes(self.encoder.encode_batch(events))
+
+    async def close(self) -> None:
+        """Cancel the pending flush timer and send the events still queued."""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.debug(f"Failed to flush file events on close: {e}")
+        self._pending = []
@@ -7,7 +7,17 @@ import json
 import logging
 
 from file_api.file_watcher import FileWatcher
-from file_api.config import WATCH_DIR, WATCH_DIR_BASE, get_user_watch_dir, CORS_ORIGINS, MAX_FILE_SIZE
+from file_api.config import (
+    WATCH_DIR,
+    WATCH_DIR_BASE,
+    WORKSPACE_HYDRATION_WAIT,
+    get_lazy_workspace,
+    lazy_workspaces,
+    get_user_watch_dir,
+    workspace_registry,
+    CORS_ORIGINS,
+    MAX_FILE_SIZE,
+)
 from file_api.user_utils import get_user_id_from_request, get_user_id_from_websocket
 from deepagents_cli.config import current_user_id
 import httpx
@@ -19,6 +29,8 @@ from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, StreamingResponse
 from file_api import cloud_storage as cs
+from file_api import ws_protocol
+from file_api.workspace_sync import WORKSPACE_WRITEBACK, WorkspaceUploader
 
 # Configure logging
 logging.basicConfig(
@@ -125,9 +137,13 @@ async def proxy_to_langgraph(path: str, request: Request):
                     url=url,
                     content=body,
                     headers={
-                        key: value
-                        for key, value in request.headers.items()
-                        if key.lower() not in ["host", "content-length"]
+                        **{
+                            key: value
+                            for key, value in request.headers.items()
+                            if key.lower() not in ["host", "content-length", "x-user-id"]
+                        },
+                        # LangGraph側でユーザーごとのグラフを選択するため解決済みのユーザーIDを渡す
+                        "x-user-id": user_id,
                     },
                 ),
                 stream=True,
@@ -194,6 +210,38 @@ async def proxy_to_langgraph(path: str, request: Request):
 # ユーザーIDごとのファイル監視インスタンス
 file_watchers: Dict[str, FileWatcher] = {}
 
+# ユーザーIDごとのGCS書き戻しアップローダー（WORKSPACE_WRITEBACK=true の場合のみ）
+workspace_uploaders: Dict[str, WorkspaceUploader] = {}
+
+
+def _start_workspace_uploader(user_id: str, watcher: FileWatcher) -> None:
+    """ユーザーのワークスペース変更をGCSに書き戻すアップローダーを登録"""
+    bucket_name = os.getenv("GCS_BUCKET")
+    if not WORKSPACE_WRITEBACK or not bucket_name or user_id in workspace_uploaders:
+        return
+    def keep_remote(relative_path: str) -> bool:
+        # lazyモードでキャッシュから破棄されただけのファイルはリモートに残す
+        lazy_workspace = get_lazy_workspace(user_id)
+        return lazy_workspace is not None and lazy_workspace.has(relative_path)
+
+    def is_unchanged(relative_path: str) -> bool:
+        # lazyモードでハイドレーションされたままのファイルはリモートと同一
+        lazy_workspace = get_lazy_workspace(user_id)
+        return lazy_workspace is not None and lazy_workspace.is_clean(relative_path)
+
+    uploader = WorkspaceUploader(
+        cs.get_bucket(bucket_name),
+        watcher.watch_path,
+        cs.user_workspace_prefix(user_id),
+        keep_remote=keep_remote,
+        is_unchanged=is_unchanged,
+    )
+    watcher.add_listener(uploader.on_change, move_sources=True)
+    uploader.start()
+    workspace_uploaders[user_id] = uploader
+    logger.info(f"Started workspace write-back for user {user_id}")
+
+
 def get_or_create_file_watcher(user_id: str) -> FileWatcher:
     """
     Get or create a FileWatcher for a specific user.
@@ -208,9 +256,18 @@ def get_or_create_file_watcher(user_id: str) -> FileWatcher:
         user_watch_dir = get_user_watch_dir(user_id)
         loop = asyncio.get_event_loop()
         watcher = FileWatcher(user_watch_dir, event_loop=loop)
+
+        def on_lazy_change(event_type: str, src_path: str, is_directory: bool):
+            """lazyモード: ローカルで削除されたファイルをマニフェストからも削除"""
+            lazy_workspace = get_lazy_workspace(user_id)
+            if lazy_workspace is not None:
+                lazy_workspace.on_change(event_type, src_path, is_directory)
+
+        watcher.add_listener(on_lazy_change, move_sources=True)
         watcher.start()
         file_watchers[user_id] = watcher
         logger.info(f"Started file watcher for user {user_id} at {user_watch_dir}")
+        _start_workspace_uploader(user_id, watcher)
     return file_watchers[user_id]
 
 @app.on_event("startup")
@@ -266,6 +323,21 @@ async def shutdown():
         logger.info("Closed httpx client")
         _httpx_client = None
 
+    # ハイドレーションジョブの受付を停止
+    workspace_registry.shutdown()
+    for lazy_workspace in lazy_workspaces.values():
+        lazy_workspace.shutdown()
+
+    # 書き戻し待ちの変更を期限内にフラッシュ
+    if workspace_uploaders:
+        flush_results = await asyncio.gather(*[
+            asyncio.to_thread(uploader.stop)
+            for uploader in workspace_uploaders.values()
+        ])
+        for user_id, flushed in zip(workspace_uploaders, flush_results):
+            if not flushed:
+                logger.warning(f"Workspace write-back for user {user_id} did not finish before the deadline")
+
     # すべてのfile_watchersを停止
     for user_id, watcher in file_watchers.items():
         try:
@@ -328,6 +400,36 @@ def sanitize_path(relative_path: str, base_dir: Path) -> Path:
     return full_path
 
 
+async def get_ready_user_watch_dir(user_id: str) -> Path:
+    """
+    ハイドレーション完了済みのユーザーディレクトリを取得
+
+    初回アクセス時のGCSダウンロードはバックグラウンドで1回だけ実行され、
+    同時リクエストは同じジョブを（イベントループをブロックせずに）待つ。
+
+    Args:
+        user_id: User ID
+
+    Returns:
+        Path to user's watch directory
+
+    Raises:
+        HTTPException: 503 if the workspace is still hydrating after WORKSPACE_HYDRATION_WAIT
+    """
+    try:
+        user_watch_dir = await workspace_registry.wait_ready(user_id, timeout=WORKSPACE_HYDRATION_WAIT)
+        # 書き戻しが有効な場合はWebSocket未接続でも変更を監視する
+        if WORKSPACE_WRITEBACK:
+            get_or_create_file_watcher(user_id)
+        return user_watch_dir
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=503,
+            detail="Workspace is hydrating. Poll /api/workspace/status and retry.",
+            headers={"Retry-After": "2"},
+        )
+
+
 @app.get("/health")
 async def health():
     """Health check endpoint"""
@@ -360,6 +462,83 @@ async def get_current_user(request: Request):
     }
 
 
+@app.get("/api/workspace/status")
+async def get_workspace_status(request: Request):
+    """
+    ワークスペースの準備状態を取得（UIのポーリング用）
+
+    Returns:
+        {
+            "user_id": str,
+            "status": "idle" | "hydrating" | "ready" | "failed"
+        }
+
+    状態を読むだけで、ハイドレーションは開始しない（"idle" は未要求）。
+    """
+    user_id = get_user_id_from_request(request)
+    return {
+        "user_id": user_id,
+        "status": workspace_registry.status(user_id),
+    }
+
+
+@app.get("/api/stats/http-cache")
+async def get_http_cache_stats():
+    """
+    fetch_url の HTTP キャッシュの統計（全ユーザー共通）を取得
+
+    Returns:
+        {
+            "enabled": bool,
+            "hits": int, "revalidated": int, "misses": int, "bypassed": int,
+            "stores": int, "evictions": int, "hit_rate": float,
+            "entries": int, "size_bytes": int, "max_bytes": int
+        }
+    """
+    from deepagents_cli.http_cache import get_http_cache
+
+    cache = get_http_cache()
+    if cache is None:
+        return {"enabled": False}
+    stats = await asyncio.to_thread(cache.stats)
+    return {"enabled": True, **stats}
+
+
+@app.get("/api/stats/threads/{thread_id}/telemetry")
+async def get_thread_telemetry(thread_id: str, request: Request, limit: int = 200):
+    """
+    スレッドのモデル呼び出し・ツール呼び出しごとの所要時間とトークン数を取得
+
+    Args:
+        thread_id: スレッドID
+        limit: 返すステップ記録の最大数（新しいものから）
+
+    Returns:
+        {
+            "thread_id": str,
+            "summary": {
+                "steps": int, "runs": int,
+                "model": {"calls", "total_ms", "ttft_ms_p50", "ttft_ms_p90",
+                          "input_tokens", "output_tokens", "cached_tokens",
+                          "cache_write_tokens", "cache_hits"},
+                "tools": {"calls", "total_ms", "by_name": {name: {"calls", "errors",
+                          "total_ms", "max_ms", "result_chars"}}}
+            },
+            "steps": [{"kind": "model" | "tool", "at": float, "ms": float, ...}]
+        }
+    """
+    from deepagents_cli.telemetry import read_telemetry, summarize
+
+    user_id = get_user_id_from_request(request)
+    current_user_id.set(user_id)
+    records = await asyncio.to_thread(read_telemetry, thread_id)
+    return {
+        "thread_id": thread_id,
+        "summary": summarize(records),
+        "steps": records[-limit:] if limit > 0 else [],
+    }
+
+
 @app.get("/api/files")
 async def list_files(request: Request, path: str = ""):
     """
@@ -389,10 +568,25 @@ async def list_files(request: Request, path: str = ""):
         # ユーザーIDを取得してコンテキストに設定
         user_id = get_user_id_from_request(request)
         current_user_id.set(user_id)
-        user_watch_dir = get_user_watch_dir(user_id)
+        user_watch_dir = await get_ready_user_watch_dir(user_id)
 
         target_dir = sanitize_path(path, user_watch_dir)
 
+        # lazyモード: オブジェクト一覧（マニフェスト）とローカルファイルをマージして返す
+        lazy_workspace = get_lazy_workspace(user_id)
+        if lazy_workspace is not None:
+            relative_dir = target_dir.relative_to(user_watch_dir).as_posix()
+            relative_dir = "" if relative_dir == "." else relative_dir
+            if not lazy_workspace.is_dir(relative_dir):
+                if target_dir.exists() or lazy_workspace.has(relative_dir):
+                    raise HTTPException(status_code=400, detail="Path is not a directory")
+                raise HTTPException(status_code=404, detail="Directory not found")
+            return {
+                "success": True,
+                "items": lazy_workspace.list_dir(relative_dir),
+                "current_path": str(target_dir.relative_to(user_watch_dir))
+            }
+
         if not target_dir.exists():
             raise HTTPException(status_code=404, detail="Directory not found")
 
@@ -419,6 +613,8 @@ async def list_files(request: Request, path: str = ""):
         }
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
@@ -450,10 +646,17 @@ async def read_file(request: Request, file_path: str, raw: bool = False):
         # ユーザーIDを取得してコンテキストに設定
         user_id = get_user_id_from_request(request)
         current_user_id.set(user_id)
-        user_watch_dir = get_user_watch_dir(user_id)
+        user_watch_dir = await get_ready_user_watch_dir(user_id)
 
         target_file = sanitize_path(file_path, user_watch_dir)
 
+        # lazyモード: 初回読み取り時にオブジェクトストレージから取得
+        lazy_workspace = get_lazy_workspace(user_id)
+        if lazy_workspace is not None:
+            await asyncio.to_thread(
+                lazy_workspace.ensure_local, target_file.relative_to(user_watch_dir).as_posix()
+            )
+
         # ファイルサイズ制限
         file_size = target_file.stat().st_size
         if file_size > MAX_FILE_SIZE:
@@ -574,7 +777,7 @@ async def update_file(http_request: Request, file_path: str, request: FileUpdate
         # ユーザーIDを取得してコンテキストに設定
         user_id = get_user_id_from_request(http_request)
         current_user_id.set(user_id)
-        user_watch_dir = get_user_watch_dir(user_id)
+        user_watch_dir = await get_ready_user_watch_dir(user_id)
 
         target_file = sanitize_path(file_path, user_watch_dir)
 
@@ -625,10 +828,24 @@ async def delete_file(request: Request, file_path: str):
         # ユーザーIDを取得してコンテキストに設定
         user_id = get_user_id_from_request(request)
         current_user_id.set(user_id)
-        user_watch_dir = get_user_watch_dir(user_id)
+        user_watch_dir = await get_ready_user_watch_dir(user_id)
 
         target_path = sanitize_path(file_path, user_watch_dir)
 
+        # lazyモード: 未取得（一覧のみ）のファイルはマニフェストとリモートから削除
+        lazy_workspace = get_lazy_workspace(user_id)
+        relative_path = target_path.relative_to(user_watch_dir).as_posix()
+        if lazy_workspace is not None and lazy_workspace.has(relative_path) and relative_path != ".":
+            lazy_workspace.forget(relative_path)
+            if user_id in workspace_uploaders:
+                workspace_uploaders[user_id].on_change("deleted", str(target_path), target_path.is_dir())
+            if not target_path.exists():
+                return {
+                    "success": True,
+                    "message": "File deleted successfully",
+                    "path": relative_path
+                }
+
         if not target_path.exists():
             raise HTTPException(status_code=404, detail="File or directory not found")
 
@@ -677,7 +894,7 @@ async def upload_files(
         # ユーザーIDを取得してコンテキストに設定
         user_id = get_user_id_from_request(request)
         current_user_id.set(user_id)
-        user_watch_dir = get_user_watch_dir(user_id)
+        user_watch_dir = await get_ready_user_watch_dir(user_id)
 
         target_dir = sanitize_path(path, user_watch_dir)
 
@@ -725,28 +942,49 @@ async def websocket_endpoint(websocket: WebSocket):
     - ユーザー専用のファイル監視を登録
     - 変更イベントをリアルタイム送信
 
-    送信メッセージ形式:
+    送信メッセージ形式（デフォルト: JSON、1イベント1フレーム）:
     {
         "event": "created" | "modified" | "deleted" | "moved",
         "path": str,
         "is_directory": bool
     }
+
+    Compactモード:
+    クライアントがサブプロトコル "file-events.msgpack.v1" または
+    "file-events.cbor.v1" を要求した場合、イベントをバッチ化し
+    パスプレフィックス辞書と整数イベントコードを使ったバイナリフレームで送信する。
+    形式は file_api.ws_protocol を参照。
     """
-    await websocket.accept()
+    subprotocol = ws_protocol.negotiate_subprotocol(websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=subprotocol)
 
     # ユーザーIDを取得してコンテキストに設定
     user_id = get_user_id_from_websocket(websocket)
     current_user_id.set(user_id)
-    logger.info(f"WebSocket client connected for user {user_id}")
+    logger.info(
+        f"WebSocket client connected for user {user_id} "
+        f"(encoding: {subprotocol or ws_protocol.JSON_ENCODING})"
+    )
 
+    # ハイドレーション完了まで待ってから監視を始める（ダウンロード中のファイルを通知しない）
+    user_watch_dir = await workspace_registry.wait_ready(user_id, timeout=None)
     # ユーザー専用のFileWatcherを取得または作成
     user_watcher = get_or_create_file_watcher(user_id)
-    user_watch_dir = get_user_watch_dir(user_id)
+
+    batcher: Optional[ws_protocol.EventBatcher] = None
+    if subprotocol:
+        batcher = ws_protocol.EventBatcher(
+            ws_protocol.CompactEventEncoder(subprotocol),
+            websocket.send_bytes,
+        )
 
     async def on_change(event_type: str, src_path: str, is_directory: bool):
         """ファイル変更時のコールバック"""
         try:
             relative_path = str(Path(src_path).relative_to(user_watch_dir))
+            if batcher is not None:
+                await batcher.add(event_type, relative_path, is_directory)
+                return
             await websocket.send_json({
                 "event": event_type,
                 "path": relative_path,
@@ -771,6 +1009,8 @@ async def websocket_endpoint(websocket: WebSocket):
     finally:
         # クライアント切断時にリスナー削除
         user_watcher.remove_listener(on_change)
+        if batcher is not None:
+            await batcher.close()
 
 # フロントエンド配信（本番環境用）
 STATIC_DIR = os.getenv("STATIC_DIR", "../static-build")
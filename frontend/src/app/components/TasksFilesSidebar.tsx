@@ -19,6 +19,21 @@ import type { TodoItem, FileItem } from "@/app/types/types";
 import { useChatContext } from "@/providers/ChatProvider";
 import { cn } from "@/lib/utils";
 import { FileViewDialog } from "@/app/components/FileViewDialog";
+import { FILE_API_URL } from "@/lib/config";
+
+// FILES_STATE_MODE=ref のとき state にはプレビューのみが入るため、全文はファイルAPIから取得する
+async function fetchFullContent(rawContent: unknown): Promise<string | null> {
+  if (typeof rawContent !== "object" || rawContent === null) return null;
+  const ref = rawContent as { truncated?: boolean; workspace_path?: string | null };
+  if (!ref.truncated || !ref.workspace_path) return null;
+  const encodedPath = ref.workspace_path
+    .split("/")
+    .map((segment) => encodeURIComponent(segment))
+    .join("/");
+  const response = await fetch(`${FILE_API_URL}/api/files/${encodedPath}?raw=true`);
+  if (!response.ok) return null;
+  return response.text();
+}
 
 export function FilesPopover({
   files,
@@ -70,9 +85,13 @@ export function FilesPopover({
               <button
                 key={filePath}
                 type="button"
-                onClick={() =>
-                  setSelectedFile({ path: filePath, content: fileContent })
-                }
+                onClick={async () => {
+                  setSelectedFile({ path: filePath, content: fileContent });
+                  const fullContent = await fetchFullContent(rawContent);
+                  if (fullContent !== null) {
+                    setSelectedFile({ path: filePath, content: fullContent });
+                  }
+                }}
                 className="cursor-pointer space-y-1 truncate rounded-md border border-border px-2 py-3 shadow-sm transition-colors"
                 style={{
                   backgroundColor: "var(--color-file-button)",
@@ -15,6 +15,7 @@ import { ToolCall, ActionRequest, ReviewConfig } from "@/app/types/types";
 import { cn } from "@/lib/utils";
 import { LoadExternalComponent } from "@langchain/langgraph-sdk/react-ui";
 import { ToolApprovalInterrupt } from "@/app/components/ToolApprovalInterrupt";
+import { useShellOutput } from "@/app/hooks/useShellOutput";
 
 interface ToolCallBoxProps {
   toolCall: ToolCall;
@@ -38,6 +39,7 @@ export const ToolCallBox = React.memo<ToolCallBoxProps>(
     onResume,
     isLoading,
   }) => {
+    const streamedOutput = useShellOutput(toolCall.id);
     const [isExpanded, setIsExpanded] = useState(
       () => !!uiComponent || !!actionRequest
     );
@@ -100,7 +102,10 @@ export const ToolCallBox = React.memo<ToolCallBoxProps>(
       }));
     }, []);
 
-    const hasContent = result || Object.keys(args).length > 0;
+    // Output streamed by the shell tool while the command is still running
+    const liveOutput = !result ? streamedOutput : undefined;
+
+    const hasContent = result || liveOutput || Object.keys(args).length > 0;
 
     return (
       <div
@@ -206,6 +211,16 @@ export const ToolCallBox = React.memo<ToolCallBoxProps>(
                     </div>
                   </div>
                 )}
+                {liveOutput && (
+                  <div className="mt-4">
+                    <h4 className="mb-1 text-xs font-semibold uppercase tracking-wider text-muted-foreground">
+                      Output
+                    </h4>
+                    <pre className="m-0 max-h-96 overflow-auto whitespace-pre-wrap break-all rounded-sm border border-border bg-muted/40 p-2 font-mono text-xs leading-7 text-foreground">
+                      {liveOutput}
+                    </pre>
+                  </div>
+                )}
                 {result && (
                   <div className="mt-4">
                     <h4 className="mb-1 text-xs font-semibold uppercase tracking-wider text-muted-foreground">
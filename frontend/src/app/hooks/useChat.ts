@@ -1,6 +1,6 @@
 "use client";
 
-import { useCallback } from "react";
+import { useCallback, useEffect, useState } from "react";
 import { useStream } from "@langchain/langgraph-sdk/react";
 import {
   type Message,
@@ -12,6 +12,7 @@ import type { UseStreamThread } from "@langchain/langgraph-sdk/react";
 import type { TodoItem } from "@/app/types/types";
 import { useClient } from "@/providers/ClientProvider";
 import { useQueryState } from "nuqs";
+import { ShellOutputStore } from "@/app/hooks/useShellOutput";
 
 export type StateType = {
   messages: Message[];
@@ -25,6 +26,23 @@ export type StateType = {
   ui?: any;
 };
 
+// Custom stream event emitted by the shell tool for each chunk of command output
+type ShellOutputEvent = {
+  type: "shell_output";
+  tool_call_id: string;
+  stream: "stdout" | "stderr";
+  data: string;
+};
+
+function isShellOutputEvent(data: unknown): data is ShellOutputEvent {
+  return (
+    typeof data === "object" &&
+    data !== null &&
+    (data as ShellOutputEvent).type === "shell_output" &&
+    typeof (data as ShellOutputEvent).tool_call_id === "string"
+  );
+}
+
 export function useChat({
   activeAssistant,
   onHistoryRevalidate,
@@ -36,6 +54,20 @@ export function useChat({
 }) {
   const [threadId, setThreadId] = useQueryState("threadId");
   const client = useClient();
+  // Live shell output keyed by tool call id (shown until the tool result arrives)
+  const [shellOutputs] = useState(() => new ShellOutputStore());
+
+  useEffect(() => {
+    shellOutputs.clear();
+  }, [threadId, shellOutputs]);
+
+  const onCustomEvent = useCallback(
+    (data: unknown) => {
+      if (!isShellOutputEvent(data)) return;
+      shellOutputs.append(data.tool_call_id, data.data);
+    },
+    [shellOutputs]
+  );
 
   const stream = useStream<StateType>({
     assistantId: activeAssistant?.assistant_id || "",
@@ -49,9 +81,17 @@ export function useChat({
     onFinish: onHistoryRevalidate,
     onError: onHistoryRevalidate,
     onCreated: onHistoryRevalidate,
+    onCustomEvent,
     experimental_thread: thread,
   });
 
+  useEffect(() => {
+    // The tool result replaces the live output
+    for (const message of stream.messages) {
+      if (message.type === "tool") shellOutputs.delete(message.tool_call_id);
+    }
+  }, [stream.messages, shellOutputs]);
+
   const sendMessage = useCallback(
     (content: string) => {
       const newMessage: Message = { id: uuidv4(), type: "human", content };
@@ -150,6 +190,7 @@ export function useChat({
     files: stream.values.files ?? {},
     email: stream.values.email,
     ui: stream.values.ui,
+    shellOutputs,
     setFiles,
     messages: stream.messages,
     isLoading: stream.isLoading,
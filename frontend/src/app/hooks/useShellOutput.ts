@@ -0,0 +1,78 @@
+"use client";
+
+import {
+  createContext,
+  useCallback,
+  useContext,
+  useSyncExternalStore,
+} from "react";
+
+// Characters of live output kept per tool call (older output is dropped)
+const MAX_LIVE_OUTPUT_CHARS = 32_000;
+
+/**
+ * Live shell output keyed by tool call id.
+ *
+ * Kept outside React state so that a new chunk only re-renders the tool box
+ * showing that tool call, not the whole chat.
+ */
+export class ShellOutputStore {
+  private outputs = new Map<string, string>();
+  private listeners = new Map<string, Set<() => void>>();
+
+  append(toolCallId: string, data: string) {
+    const next = (this.outputs.get(toolCallId) ?? "") + data;
+    this.outputs.set(
+      toolCallId,
+      next.length > MAX_LIVE_OUTPUT_CHARS
+        ? next.slice(-MAX_LIVE_OUTPUT_CHARS)
+        : next
+    );
+    this.notify(toolCallId);
+  }
+
+  delete(toolCallId: string) {
+    if (this.outputs.delete(toolCallId)) this.notify(toolCallId);
+  }
+
+  clear() {
+    const ids = [...this.outputs.keys()];
+    this.outputs.clear();
+    ids.forEach((id) => this.notify(id));
+  }
+
+  get(toolCallId: string): string | undefined {
+    return this.outputs.get(toolCallId);
+  }
+
+  subscribe(toolCallId: string, listener: () => void) {
+    const listeners = this.listeners.get(toolCallId) ?? new Set();
+    listeners.add(listener);
+    this.listeners.set(toolCallId, listeners);
+    return () => {
+      listeners.delete(listener);
+      if (listeners.size === 0) this.listeners.delete(toolCallId);
+    };
+  }
+
+  private notify(toolCallId: string) {
+    this.listeners.get(toolCallId)?.forEach((listener) => listener());
+  }
+}
+
+export const ShellOutputContext = createContext<ShellOutputStore | null>(null);
+
+/** Live output of one tool call (undefined if none was streamed). */
+export function useShellOutput(toolCallId: string | undefined) {
+  const store = useContext(ShellOutputContext);
+  const subscribe = useCallback(
+    (listener: () => void) =>
+      store && toolCallId ? store.subscribe(toolCallId, listener) : () => {},
+    [store, toolCallId]
+  );
+  return useSyncExternalStore(
+    subscribe,
+    () => (store && toolCallId ? store.get(toolCallId) : undefined),
+    () => undefined
+  );
+}
@@ -3,6 +3,7 @@
 import { ReactNode, createContext, useContext } from "react";
 import { Assistant } from "@langchain/langgraph-sdk";
 import { type StateType, useChat } from "@/app/hooks/useChat";
+import { ShellOutputContext } from "@/app/hooks/useShellOutput";
 import type { UseStreamThread } from "@langchain/langgraph-sdk/react";
 
 interface ChatProviderProps {
@@ -19,7 +20,13 @@ export function ChatProvider({
   thread,
 }: ChatProviderProps) {
   const chat = useChat({ activeAssistant, onHistoryRevalidate, thread });
-  return <ChatContext.Provider value={chat}>{children}</ChatContext.Provider>;
+  return (
+    <ChatContext.Provider value={chat}>
+      <ShellOutputContext.Provider value={chat.shellOutputs}>
+        {children}
+      </ShellOutputContext.Provider>
+    </ChatContext.Provider>
+  );
 }
 
 export type ChatContextType = ReturnType<typeof useChat>;